@@ -50,12 +50,31 @@ from flask_cors import CORS, cross_origin
 import paramiko
 import platform
 import json
+import math
 import re
 import os
-from pathlib import Path
 import time
+import atexit
 
 import api_config as conf
+from device_snapshot import DeviceSnapshot, PDUS, PROJECTORS, HOSTS
+from projector_sessions import ProjectorSessionManager
+from projector_volume import ProjectorVolumeEngine, ProjectorVolumeError
+from projector_state import ProjectorStateCache
+from fan_out import run_concurrently, summarise
+from projector_capabilities import ProjectorCapabilities, UnsupportedCommandError, PJ_V01
+from ssh_pool import SshPool
+from werkzeug.formparser import parse_form_data
+from session_ids import SessionIdCache
+from jobs import JobQueue, SUCCEEDED
+from host_agents import HostAgentServer, AgentUnavailable
+from sftp_upload import FAILED, VERIFY_HASH, VERIFY_MODES, safe_name, staging_stream_factory, upload_files
+from content_store import ContentStore
+from host_monitor import HostMonitor, DOWN, UP
+import wake_on_lan as wol
+from host_script import CHROME_PATH, NIRCMD, SHELL, WAIT, compile_steps, batch_command, batch_results
+from epson_projector.const import LATENCY_COMMAND, LATENCY_POWER, LATENCY_QUERY
+from epson_projector.latency import LatencyTracker
 
 import logging
 import sqlite3
@@ -108,13 +127,142 @@ CORS(app, supports_credentials=True)
 # Allow CORS for all routes under '/pdu/'
 CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
 
+# last-known device state, reloaded on restart so routes can answer before devices reconnect
+device_snapshot = DeviceSnapshot(conf.SNAPSHOT_PATH, conf.SNAPSHOT_INTERVAL)
+
+# flush the snapshot when gunicorn stops the worker (e.g. monit restart)
+atexit.register(device_snapshot.save)
+
+# observed latency per display, request timeouts are learned from it
+projector_latency = LatencyTracker(
+    limits={
+        LATENCY_QUERY: (conf.PROJECTOR_QUERY_TIMEOUT_MIN, conf.PROJECTOR_QUERY_TIMEOUT_MAX),
+        LATENCY_COMMAND: (conf.PROJECTOR_COMMAND_TIMEOUT_MIN, conf.PROJECTOR_COMMAND_TIMEOUT_MAX),
+        LATENCY_POWER: (conf.PROJECTOR_POWER_TIMEOUT_MIN, conf.PROJECTOR_POWER_TIMEOUT_MAX),
+    },
+    margin=conf.PROJECTOR_TIMEOUT_MARGIN,
+)
+escvp_latency = LatencyTracker(margin=conf.PROJECTOR_TIMEOUT_MARGIN)
+
+def save_projector_latency():
+    projector_latency.save(conf.PROJECTOR_LATENCY_PATH)
+    escvp_latency.save(conf.ESCVP_LATENCY_PATH)
+
+def save_projector_latency_periodically():
+    while True:
+        gevent.sleep(conf.SNAPSHOT_INTERVAL)
+        try:
+            save_projector_latency()
+        except Exception as e:
+            logger.error(f"save_projector_latency_periodically, failed: {e}")
+
+atexit.register(save_projector_latency)
+
+# keep-alive projector HTTP sessions, one per display, with reused digest auth
+projector_sessions = ProjectorSessionManager(
+    pool_size=conf.PROJECTOR_POOL_SIZE,
+    max_sessions=conf.PROJECTOR_MAX_SESSIONS,
+    idle_timeout=conf.PROJECTOR_SESSION_IDLE,
+    timeout=conf.PROJECTOR_HTTP_TIMEOUT,
+    latency=projector_latency,
+)
+
+# per-display closed-loop volume control over the projector sessions
+projector_volume = ProjectorVolumeEngine(
+    projector_sessions,
+    burst=conf.PROJECTOR_VOLUME_BURST,
+    trust_time=conf.PROJECTOR_VOLUME_TRUST,
+    timeout=conf.PROJECTOR_VOLUME_TIMEOUT,
+)
+
+# keep-alive ssh connections to the room hosts, shared by every host helper
+ssh_pool = SshPool(
+    max_connections=conf.SSH_POOL_MAX_CONNECTIONS,
+    idle_timeout=conf.SSH_IDLE_TIMEOUT,
+    keepalive=conf.SSH_KEEPALIVE,
+    connect_timeout=conf.SSH_CONNECT_TIMEOUT,
+    health_check_after=conf.SSH_HEALTH_CHECK_AFTER,
+)
+atexit.register(ssh_pool.close_all)
+
+# host agents dial in and run desktop commands in the user session, hosts without one use ssh/psexec
+host_agents = HostAgentServer(
+    conf.AGENT_TOKEN,
+    port=conf.AGENT_PORT,
+    heartbeat=conf.AGENT_HEARTBEAT,
+)
+atexit.register(host_agents.stop)
+
+# slow host operations run here in the background, the routes answer 202 with a job id
+host_jobs = JobQueue(
+    workers=conf.JOB_WORKERS,
+    per_host=conf.JOB_PER_HOST,
+    retention=conf.JOB_RETENTION,
+)
+
+# files uploaded once and sent to the hosts of a room, each host only gets what its manifest lacks
+content_store = ContentStore(conf.CONTENT_STORE_DIR)
+
 # =========================================================================
 #  Functions
 # =========================================================================
 
+# connect an ssh client to a host, recording host reachability in the device snapshot
+def ssh_connect(client, hostname, username, password):
+    try:
+        client.connect(hostname, username=username, password=password)
+    except Exception as e:
+        device_snapshot.update(HOSTS, hostname, reachable=False, error=str(e))
+        raise
+
+    device_snapshot.update(HOSTS, hostname, reachable=True, error=None, last_seen=time.time())
+
+# run a command through the host agent: None if the host has no agent connected (use ssh/psexec),
+# {'error': ...} if it failed, else the agent's result
+def agent_command(hostname, command, **args):
+    try:
+        return host_agents.call(hostname, command, args, timeout=conf.AGENT_COMMAND_TIMEOUT)
+    except AgentUnavailable:
+        return None
+    except Exception as e:
+        return {'error': str(e)}
+
+def list_monitored_hosts():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT host_address, room_code, username, password FROM hosts')
+    hosts = cursor.fetchall()
+    conn.close()
+    return hosts
+
+# the monitor's optional check, HOST_MONITOR_COMMAND over the pooled ssh connection must exit 0;
+# a rejected login means bad credentials, not a dead host, so it does not fail the check
+def check_host_command(hostname, username, password):
+    with ssh_pool.lease() as client:
+        try:
+            ssh_connect(client, hostname, username, password)
+        except paramiko.AuthenticationException as e:
+            logger.error(f"check_host_command, login to {hostname} rejected: {e}")
+            return
+        _, stdout, _ = client.exec_command(conf.HOST_MONITOR_COMMAND, timeout=conf.HOST_MONITOR_TIMEOUT)
+        exit_status = stdout.channel.recv_exit_status()
+        if exit_status != 0:
+            raise Exception(f'exited with {exit_status}')
+
+# probes every host's ssh port in the background, room actions skip hosts it has seen go down
+host_monitor = HostMonitor(
+    device_snapshot,
+    list_monitored_hosts,
+    check_command=check_host_command if conf.HOST_MONITOR_COMMAND else None,
+    port=conf.HOST_MONITOR_PORT,
+    interval=conf.HOST_MONITOR_INTERVAL,
+    timeout=conf.HOST_MONITOR_TIMEOUT,
+    concurrency=conf.HOST_MONITOR_CONCURRENCY,
+)
+
 # to display applications on the remote windows machine, we need to know the session
 # id for the in view desktop to interact with it.  We use qwinsta to obtain this id
-def get_session_id(client, username):
+def query_session_id(client, username):
     # Execute the qwinsta command to retrieve session information for the target user
     _, stdout, _ = client.exec_command(f'qwinsta {username}')
 
@@ -130,18 +278,32 @@ def get_session_id(client, username):
     else:
         return None
 
-def run_get_session_id(hostname, username, password, target_username):
-   # Create a new SSH client object
-    client = paramiko.SSHClient()
+# session ids per (host, user), so a desktop action does not pay for a qwinsta round trip
+session_ids = SessionIdCache(
+    ssh_pool,
+    query_session_id,
+    ttl=conf.SESSION_ID_TTL,
+    refresh_interval=conf.SESSION_ID_REFRESH_INTERVAL,
+    active_window=conf.SESSION_ID_ACTIVE_WINDOW,
+)
+
+# cached session id of the user on the host the client is connected to
+def get_session_id(client, username):
+    return session_ids.get(client, username)
 
-    # Automatically add the remote host key (not recommended for production use)
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+# psexec command line builder for session_ids.run_psexec, running arguments in the user's desktop session
+def psexec_command(username, password, arguments, detach=True):
+    return lambda session_id: f'psexec -accepteula -u {username} -p {password} {"-d " if detach else ""}-i {session_id} {arguments}'
+
+def run_get_session_id(hostname, username, password, target_username):
+    # Lease a pooled SSH connection, closing it returns it to the pool
+    client = ssh_pool.lease()
 
     # Use a context manager to ensure the client is closed when the function finishes
     with client:
         try:
             # Connect to the remote host
-            client.connect(hostname, username=username, password=password)
+            ssh_connect(client, hostname, username, password)
 
             # Execute the qwinsta command to retrieve session information for the target user
             _, stdout, _ = client.exec_command(f'qwinsta {username}')
@@ -153,6 +315,10 @@ def run_get_session_id(hostname, username, password, target_username):
                     session_id = line.split()[2]
                     break
 
+            # a fresh answer for the connecting user also refreshes the cache
+            if target_username == username:
+                session_ids.put(hostname, username, password, session_id)
+
             if session_id:
                 return session_id
             else:
@@ -163,17 +329,21 @@ def run_get_session_id(hostname, username, password, target_username):
 
 # mute/unmute windows pc using nircmd
 def run_mute_device(hostname, username, password, mute, platformInput=None):
-    # Create a new SSH client object
-    client = paramiko.SSHClient()
+    # a connected host agent sets it directly, whatever the platform
+    result = agent_command(hostname, 'volume', mute=str(mute).lower() == "true")
+    if result is not None:
+        if 'error' in result:
+            return result
+        return "mute command successful." if result['mute'] else "unmute command successful."
 
-    # Automatically add the remote host key (not recommended for production use)
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    # Lease a pooled SSH connection, closing it returns it to the pool
+    client = ssh_pool.lease()
 
     # Use a context manager to ensure the client is closed when the function finishes
     with client:
         try:
             # Connect to the remote host
-            client.connect(hostname, username=username, password=password)
+            ssh_connect(client, hostname, username, password)
 
             # set if mute/unmute
             mute = 1 if str(mute).lower() == "true" else 0
@@ -207,17 +377,14 @@ def run_mute_device(hostname, username, password, mute, platformInput=None):
 
 # reboot pc using via ssh
 def run_reboot_device(hostname, username, password, platformInput="windows"):
-    # Create a new SSH client object
-    client = paramiko.SSHClient()
-
-    # Automatically add the remote host key (not recommended for production use)
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    # Lease a pooled SSH connection, closing it returns it to the pool
+    client = ssh_pool.lease()
 
     # Use a context manager to ensure the client is closed when the function finishes
     with client:
         try:
             # Connect to the remote host
-            client.connect(hostname, username=username, password=password)
+            ssh_connect(client, hostname, username, password)
             
             # Determine the operating system of the remote computer
             if platformInput.lower().strip() == 'windows' or platformInput.lower().strip() == 'win':
@@ -231,26 +398,25 @@ def run_reboot_device(hostname, username, password, platformInput="windows"):
             # capture exit status
             exit_status = stdout.channel.recv_exit_status()
             if exit_status == 0: # THINK THIS WILL WORK???
+                # the host logs everyone off, cached session ids are stale from here
+                session_ids.invalidate(hostname)
                 return "Reboot command successful."
             else:
-                return f"Reboot command failed with exit status: {exit_status}"
+                return {'error': f"Reboot command failed with exit status: {exit_status}"}
 
         except Exception as e:
             return {'error': str(e)}
 
 
 def run_shutdown_device(hostname, username, password, platformInput="windows"):
-    # Create a new SSH client object
-    client = paramiko.SSHClient()
-
-    # Automatically add the remote host key (not recommended for production use)
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    # Lease a pooled SSH connection, closing it returns it to the pool
+    client = ssh_pool.lease()
 
     # Use a context manager to ensure the client is closed when the function finishes
     with client:
         try:
             # Connect to the remote host
-            client.connect(hostname, username=username, password=password)
+            ssh_connect(client, hostname, username, password)
             
             # Determine the operating system of the remote computer
             if platformInput.lower().strip() == 'windows' or platformInput.lower().strip() == 'win':
@@ -264,9 +430,11 @@ def run_shutdown_device(hostname, username, password, platformInput="windows"):
             # capture exit status
             exit_status = stdout.channel.recv_exit_status()
             if exit_status == 0: # THINK THIS WILL WORK???
+                # the host logs everyone off, cached session ids are stale from here
+                session_ids.invalidate(hostname)
                 return "Shutdown command successful."
             else:
-                return f"Shutdown command failed with exit status: {exit_status}"
+                return {'error': f"Shutdown command failed with exit status: {exit_status}"}
 
         except Exception as e:
             return {'error': str(e)}
@@ -274,22 +442,19 @@ def run_shutdown_device(hostname, username, password, platformInput="windows"):
 import re
 
 def run_youtube_script(hostname, username, password, youtube_url, loop=None, captions=None):
-    # Create an SSH client
-    client = paramiko.SSHClient()
-
-    # Automatically add the remote host key (not recommended for production use)
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    # Lease a pooled SSH connection, closing it returns it to the pool
+    client = ssh_pool.lease()
 
     # Use a context manager to ensure the client is closed when the function finishes
     with client:
         try:
             # Connect to the remote host
-            client.connect(hostname, username=username, password=password)
+            ssh_connect(client, hostname, username, password)
             session_id = get_session_id(client, username)
 
             if session_id:
                 command_arg = fr"cmd /c python C:\Users\{username}\Documents\browser-youtube.py"
-                command_full = f'psexec -accepteula -u {username} -p {password} -d -i {session_id} {command_arg} "{youtube_url}"'
+                command_full = f'{command_arg} "{youtube_url}"'
                 logger.info(f"testing =  run_youtube_script, command: {command_full}")
 
                 if loop:
@@ -302,17 +467,15 @@ def run_youtube_script(hostname, username, password, youtube_url, loop=None, cap
                     
                 command_full += fr" > C:\Users\{username}\Documents\youtube-pid.txt"
 
-                _, stdout, stderr = client.exec_command(command_full)
-
                 # Retrieve the output and error of the command
-                output = stdout.read().decode('utf-8')
-                error = stderr.read().decode('utf-8')
+                output, error = session_ids.run_psexec(client, username, session_id,
+                                                       psexec_command(username, password, command_full))
 
                 # Extract the PID from the error output
                 pid_match = re.search(r"process ID (\d+)", error)
                 
                 # Read the contents of the output file
-                with client.open_sftp().file(fr"C:\Users\{username}\Documents\youtube-pid.txt") as output_file:
+                with client.open_sftp() as sftp, sftp.file(fr"C:\Users\{username}\Documents\youtube-pid.txt") as output_file:
                     output = output_file.read().decode('utf-8')
                     logger.info("open youtube text file and get pid: ", output)
 
@@ -326,22 +489,19 @@ def run_youtube_script(hostname, username, password, youtube_url, loop=None, cap
             return {'error': str(e), 'pid': None}
 
 def run_youtube_script2(hostname, username, password, youtube_url, loop=None, captions=None):
-    # Create an SSH client
-    client = paramiko.SSHClient()
-
-    # Automatically add the remote host key (not recommended for production use)
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    # Lease a pooled SSH connection, closing it returns it to the pool
+    client = ssh_pool.lease()
 
     # Use a context manager to ensure the client is closed when the function finishes
     with client:
         try:
             # Connect to the remote host
-            client.connect(hostname, username=username, password=password)
+            ssh_connect(client, hostname, username, password)
             session_id = get_session_id(client, username)
 
             if session_id:
                 command_arg = fr"cmd /c python C:\Users\{username}\Documents\browser-youtube.py"
-                command_full = f'psexec -accepteula -u {username} -p {password} -d -i {session_id} {command_arg} "{youtube_url}"'
+                command_full = f'{command_arg} "{youtube_url}"'
                 logger.info(f"testing =  run_youtube_script, command: {command_full}")
 
                 if loop:
@@ -354,11 +514,9 @@ def run_youtube_script2(hostname, username, password, youtube_url, loop=None, ca
                     
                 command_full += fr" > C:\Users\{username}\Documents\youtube-pid.txt"
 
-                _, stdout, stderr = client.exec_command(command_full)
-
                 # Retrieve the output and error of the command
-                output = stdout.read().decode('utf-8')
-                error = stderr.read().decode('utf-8')
+                output, error = session_ids.run_psexec(client, username, session_id,
+                                                       psexec_command(username, password, command_full))
 
                 ## Extract the PID from the error output
                 #pid_match = re.search(r"process ID (\d+)", error)
@@ -427,20 +585,18 @@ def open_youtube(room_code, host_address):
     loop = data.get('loop')
     captions = data.get('captions')
 
-    # Call the function with explicit parameters
-    result = run_youtube_script2(
-    	hostname=host_address,
-    	username=username,
-    	password=password,
-    	youtube_url=url,
-    	loop=True if loop and loop.lower() == "true" else None,
-    	captions=True if captions and captions.lower() == "true" else None
-    )
+    # Call the function with explicit parameters, as a background job
+    def open_youtube_job(job):
+        return host_result(run_youtube_script2(
+            hostname=host_address,
+            username=username,
+            password=password,
+            youtube_url=url,
+            loop=True if loop and loop.lower() == "true" else None,
+            captions=True if captions and captions.lower() == "true" else None
+        ))
 
-    if result is None:
-        return jsonify({'error': 'Backend function failed'}), 500
-    else:
-        return jsonify({'response': result}), 200
+    return host_job_response('open_youtube', host_address, open_youtube_job)
 
 @app.route('/chrome_off/<string:room_code>/<string:host_address>', methods=['GET'])
 def chrome_off(room_code, host_address):
@@ -469,21 +625,23 @@ def chrome_off(room_code, host_address):
 
 # open powerpoint slide file/url on remote windows pc in google chrome
 def run_browser(hostname, username, password, url=None):
-    # Create an SSH client
-    client = paramiko.SSHClient()
+    # a connected host agent opens chrome in the user session without ssh/psexec
+    result = agent_command(hostname, 'launch', path=CHROME_PATH, args=['--kiosk', url])
+    if result is not None:
+        return result if 'error' in result else str(result['pid'])
 
-    # Automatically add the remote host key (not recommended for production use)
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    # Lease a pooled SSH connection, closing it returns it to the pool
+    client = ssh_pool.lease()
 
     # Use a context manager to ensure the client is closed when the function finishes
     with client:
         try:
             # Connect to the remote host
-            client.connect(hostname, username=username, password=password)
+            ssh_connect(client, hostname, username, password)
 
             # Set Chrome browser application path
             #edge = "C:\Program Files (x86)\Microsoft\Edge\Application\msedge.exe"
-            chrome = "C:\Program Files\Google\Chrome\Application\chrome.exe"
+            chrome = CHROME_PATH
             logger.info(f"the chrome location is: {chrome}")
 
             # Execute the qwinsta command to retrieve session information for the target user
@@ -494,17 +652,15 @@ def run_browser(hostname, username, password, url=None):
                 #command = f"psexec -accepteula -u {username} -p {password} -d -i {session_id} \"{chrome}\"  \"--kiosk --disable-pinch --no-user-gesture-required\" \"{url}\""
                 #command = f'psexec -accepteula -u {username} -p {password} -d -i {session_id} {edge} --kiosk --edge-kiosk-type=fullscreen "{url}\"'
                 #command = f'psexec -accepteula -u {username} -p {password} -d -i {session_id} \"{chrome}\" \"--kiosk --no-user-gesture-required\" \"{url}\"'
-                command = f'psexec -accepteula -u {username} -p {password} -d -i {session_id} "{chrome}" --kiosk "{url}"'
+                command = f'"{chrome}" --kiosk "{url}"'
 
                 logger.info(f"the command sent is: {command}")
 
                 logger.info(f"testing.... in run_browser, command: {command}")
-                
-                _, stdout, stderr = client.exec_command(command)
 
                 # Retrieve the output of the command
-                output = stdout.read().decode('utf-8')
-                error = stderr.read().decode('utf-8')
+                output, error = session_ids.run_psexec(client, username, session_id,
+                                                       psexec_command(username, password, command))
 
                 # Extract the PID from the error output
                 pid_match = re.search(r"process ID (\d+)", error)
@@ -521,15 +677,18 @@ def run_browser(hostname, username, password, url=None):
 
 # close process running on remote windows pc
 def kill_process(hostname, username, password, pid):
-    # Create an SSH client
-    client = paramiko.SSHClient()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    result = agent_command(hostname, 'kill', pid=pid)
+    if result is not None:
+        return result if 'error' in result else "process ended successfully."
+
+    # Lease a pooled SSH connection, closing it returns it to the pool
+    client = ssh_pool.lease()
 
     # Use a context manager to ensure the client is closed when the function finishes
     with client:
         try:
             # Connect to the remote host
-            client.connect(hostname, username=username, password=password)
+            ssh_connect(client, hostname, username, password)
 
             # Find the window ID of the "powerpoint-slide" window
             _, stdout, stderr = client.exec_command(f'taskkill /PID {pid} /F')
@@ -546,15 +705,18 @@ def kill_process(hostname, username, password, pid):
 
 # close process running on remote windows pc
 def kill_chrome(hostname, username, password):
-    # Create an SSH client
-    client = paramiko.SSHClient()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    result = agent_command(hostname, 'kill', image='chrome.exe')
+    if result is not None:
+        return result if 'error' in result else "process ended successfully."
+
+    # Lease a pooled SSH connection, closing it returns it to the pool
+    client = ssh_pool.lease()
 
     # Use a context manager to ensure the client is closed when the function finishes
     with client:
         try:
             # Connect to the remote host
-            client.connect(hostname, username=username, password=password)
+            ssh_connect(client, hostname, username, password)
 
             # Find the window ID of the "powerpoint-slide" windows
             _, stdout, stderr = client.exec_command(f'taskkill /IM chrome.exe /F')
@@ -564,7 +726,7 @@ def kill_chrome(hostname, username, password):
             if exit_status == 0: # THINK THIS WILL WORK???
                 return f"process ended successfully."
             else:
-                return f"process ending failed with exit status {exit_status}."
+                return {'error': f"process ending failed with exit status {exit_status}."}
 
         except Exception as e:
             return {'error': str(e)}
@@ -579,17 +741,14 @@ import logging
 logger = logging.getLogger(__name__)
 
 def sim_mouse_press(hostname, username, password):
-    # Create an SSH client
-    client = paramiko.SSHClient()
-
-    # Automatically add the remote host key (not recommended for production use)
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    # Lease a pooled SSH connection, closing it returns it to the pool
+    client = ssh_pool.lease()
 
     # Use a context manager to ensure the client is closed when the function finishes
     with client:
         try:
             # Connect to the remote host
-            client.connect(hostname, username=username, password=password)
+            ssh_connect(client, hostname, username, password)
             
             # Execute the qwinsta command to retrieve session information for the target user
             session_id = get_session_id(client, username)
@@ -602,15 +761,13 @@ def sim_mouse_press(hostname, username, password):
             Y = 50
 
             # Build the PsExec command to simulate a mouse click (hide taskbar)
-            command = f'psexec -accepteula -u {username} -p {password} -d -i {session_id} "{nircmd_path}" sendmouse click {X} {Y}'
+            command = f'"{nircmd_path}" sendmouse click {X} {Y}'
 
             logger.info(f"Sending mouse press command: {command}")
 
-            _, stdout, stderr = client.exec_command(command)
-
             # Retrieve the output of the command
-            #output = stdout.read().decode('utf-8')
-            output = stderr.read().decode('utf-8')
+            _, output = session_ids.run_psexec(client, username, session_id,
+                                               psexec_command(username, password, command))
             
             return output
         except Exception as e:
@@ -618,17 +775,14 @@ def sim_mouse_press(hostname, username, password):
 
 
 def run_application(hostname, username, password, application=None, arguments=None):
-     # Create an SSH client
-    client = paramiko.SSHClient()
-
-    # Automatically add the remote host key (not recommended for production use)
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+     # Lease a pooled SSH connection, closing it returns it to the pool
+    client = ssh_pool.lease()
 
    # Use a context manager to ensure the client is closed when the function finishes
     with client:
         try:
             # Connect to the remote host
-            client.connect(hostname, username=username, password=password)
+            ssh_connect(client, hostname, username, password)
             
             # Execute the qwinsta command to retrieve session information for the target user
             session_id = get_session_id(client, username)
@@ -639,18 +793,16 @@ def run_application(hostname, username, password, application=None, arguments=No
                 command = None
                 if arguments and video:
                     # If both arguments and video are present
-                    command = f'psexec -accepteula -u {username} -p {password} -d -i {session_id} "{application}" {arguments}'
+                    command = f'"{application}" {arguments}'
                 elif video:
                     # If only video is present
-                    command = f'psexec -accepteula -u {username} -p {password} -d -i {session_id} "{application}"'          
+                    command = f'"{application}"'          
                 
                 if command:
                     logger.info(f"testing.... in run_application, command created in runn_application: {command}")
-                    _, stdout, stderr = client.exec_command(command)
-
                     # Retrieve the output of the command
-                    output = stdout.read().decode('utf-8')
-                    error = stderr.read().decode('utf-8')
+                    output, error = session_ids.run_psexec(client, username, session_id,
+                                                           psexec_command(username, password, command))
 
                     # Extract the PID from the error output
                     pid_match = re.search(r"process ID (\d+)", error)
@@ -670,17 +822,20 @@ def run_application(hostname, username, password, application=None, arguments=No
 
 # run a program on remote windows pc - NEED TO TEST
 def run_vlc_application(hostname, username, password, application=None, arguments=None, video=None):
-    # Create an SSH client
-    client = paramiko.SSHClient()
+    # a connected host agent starts vlc in the user session without ssh/psexec
+    if application and video:
+        result = agent_command(hostname, 'launch', path=application, args=(arguments.split() if arguments else []) + [video])
+        if result is not None:
+            return result if 'error' in result else str(result['pid'])
 
-    # Automatically add the remote host key (not recommended for production use)
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    # Lease a pooled SSH connection, closing it returns it to the pool
+    client = ssh_pool.lease()
 
    # Use a context manager to ensure the client is closed when the function finishes
     with client:
         try:
             # Connect to the remote host
-            client.connect(hostname, username=username, password=password)
+            ssh_connect(client, hostname, username, password)
             
             # Execute the qwinsta command to retrieve session information for the target user
             session_id = get_session_id(client, username)
@@ -699,18 +854,16 @@ def run_vlc_application(hostname, username, password, application=None, argument
                 command = None
                 if arguments and video:
                     # If both arguments and video are present
-                    command = f'psexec -accepteula -u {username} -p {password} -d -i {session_id} "{application}" {arguments} {video}'
+                    command = f'"{application}" {arguments} {video}'
                 elif video:
                     # If only video is present
-                    command = f'psexec -accepteula -u {username} -p {password} -d -i {session_id} "{application}" {video}'                
+                    command = f'"{application}" {video}'                
                 
                 if command:
                     logger.info(f"testing.... in run_application, command created in runn_application: {command}")
-                    _, stdout, stderr = client.exec_command(command)
-
                     # Retrieve the output of the command
-                    output = stdout.read().decode('utf-8')
-                    error = stderr.read().decode('utf-8')
+                    output, error = session_ids.run_psexec(client, username, session_id,
+                                                           psexec_command(username, password, command))
 
                     # Extract the PID from the error output
                     pid_match = re.search(r"process ID (\d+)", error)
@@ -730,17 +883,19 @@ def run_vlc_application(hostname, username, password, application=None, argument
 
 # send nircmd commands to a remote PC
 def run_nircmd(hostname, username, password, cmd):
-    # Create a new SSH client object
-    client = paramiko.SSHClient()
+    # a connected host agent runs nircmd in the user session without ssh/psexec
+    result = agent_command(hostname, 'nircmd', args=cmd)
+    if result is not None:
+        return result if 'error' in result else result['output']
 
-    # Automatically add the remote host key (not recommended for production use)
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    # Lease a pooled SSH connection, closing it returns it to the pool
+    client = ssh_pool.lease()
 
     # Use a context manager to ensure the client is closed when the function finishes
     with client:
         try:
             # Connect to the remote host
-            client.connect(hostname, username=username, password=password)
+            ssh_connect(client, hostname, username, password)
 
             # Execute the qwinsta command to retrieve session information for the target user
             session_id = get_session_id(client, username)
@@ -749,13 +904,12 @@ def run_nircmd(hostname, username, password, cmd):
             nircmd_path = r'C:\NirCmd\nircmd.exe'
 
             # Build the PsExec command to simulate a mouse click (hide taskbar)
-            command = f'psexec -accepteula -u {username} -p {password} -d -i {session_id} "{nircmd_path}" {cmd}'
+            command = f'"{nircmd_path}" {cmd}'
 
             logger.info(f"Sending mouse press command: {command}")
 
-            _, stdout, stderr = client.exec_command(command)
-
-            output = stderr.read().decode('utf-8')
+            _, output = session_ids.run_psexec(client, username, session_id,
+                                               psexec_command(username, password, command))
             
             return output
         except Exception as e:
@@ -900,10 +1054,17 @@ def init_db():
             username VARCHAR(255),
             password VARCHAR(255),
             room_code VARCHAR(255),
+            capabilities TEXT,
             FOREIGN KEY (room_code) REFERENCES rooms (room_code)
         )
     ''')
 
+    # displays tables created before capability detection need the column added
+    cursor.execute("SHOW COLUMNS FROM displays LIKE 'capabilities'")
+    if not cursor.fetchone():
+        logger.info("testing.... init_db, adding displays.capabilities column..")
+        cursor.execute('ALTER TABLE displays ADD COLUMN capabilities TEXT')
+
     print("initializing table pdus...")
     logger.info("testing.... init_db, initializing table pdus..")
     # Create a table for pdus
@@ -1192,6 +1353,41 @@ def get_room(room_code):
 
     return jsonify({'room_info': room_info}), 200
 
+# last-known state of every device in a room from the device snapshot - entries marked
+# stale were loaded at startup and have not been refreshed by a live request yet
+@app.route('/device_state/<string:room_code>', methods=['GET'])
+def get_device_state(room_code):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT room_code FROM rooms WHERE room_code = %s", (room_code,))
+    room = cursor.fetchone()
+
+    if room is None:
+        conn.close()
+        return jsonify({'message': f'Room with room_code {room_code} not found.'}), 404
+
+    cursor.execute("SELECT host_address FROM hosts WHERE room_code = %s", (room_code,))
+    host_addresses = [host[0] for host in cursor.fetchall()]
+
+    cursor.execute("SELECT display_address FROM displays WHERE room_code = %s", (room_code,))
+    display_addresses = [display[0] for display in cursor.fetchall()]
+
+    cursor.execute("SELECT pdu_address FROM pdus WHERE room_code = %s", (room_code,))
+    pdu_addresses = [pdu[0] for pdu in cursor.fetchall()]
+
+    conn.close()
+
+    device_state = {
+        'room_code':    room_code,
+        'hosts':        {address: device_snapshot.get(HOSTS, address) for address in host_addresses},
+        'displays':     {address: device_snapshot.get(PROJECTORS, address) for address in display_addresses},
+        'pdus':         {address: device_snapshot.get(PDUS, address) for address in pdu_addresses},
+        'pdus_reconnecting': pdu_connect_lock.locked()
+    }
+
+    return jsonify({'device_state': device_state}), 200
+
 # Route to add a new room
 @app.route('/add_room', methods=['POST'])
 def add_room():
@@ -1304,6 +1500,11 @@ def remove_room(room_code):
     conn.commit()
     conn.close()
 
+    # forget the room's last-known device state
+    for section in (PDUS, PROJECTORS):
+        for address in device_snapshot.get_section(section, room_code):
+            device_snapshot.remove(section, address)
+
     # Now, remove the devices from app.config
     devices = app.config.get('pdu_data', [])
 
@@ -1396,6 +1597,11 @@ def remove_host(room_code, host_address):
     conn.commit()
     conn.close()
 
+    device_snapshot.remove(HOSTS, host_address)
+    session_ids.invalidate(host_address)
+    content_store.forget(host_address)
+    ssh_pool.close(host_address)
+
     return jsonify({'message': 'Host removed successfully'}), 200
 
 @app.route('/update_host_config/<string:room_code>/<string:host_address>', methods=['PUT'])
@@ -1615,11 +1821,22 @@ def remove_display(room_code, display_address):
     conn.commit()
     conn.close()
 
+    device_snapshot.remove(PROJECTORS, display_address)
+    projector_sessions.close(display_address)
+    projector_volume.remove(display_address)
+    projector_capabilities.forget(display_address)
+    projector_latency.forget(display_address)
+    escvp_latency.forget(display_address)
+
     return jsonify({'message': 'Display removed successfully'}), 200
 
-import aiohttp
-#import asyncio
-from epson_projector.main_non_async import Projector 
+from epson_projector.const import EPSON_KEY_COMMANDS, HTTP, TCP, SERIAL, POWER_WARMING, POWER_COOLING
+from projector_loop import ProjectorLoop, ProjectorLoopError
+
+# asyncio epson_projector library, run in its own loop thread with shared sessions
+projector_loop = ProjectorLoop(timeout=conf.PROJECTOR_LOOP_TIMEOUT, timeout_scale=conf.PROJECTOR_TIMEOUT_SCALE,
+                               latency=escvp_latency)
+atexit.register(projector_loop.stop)
 
 from flask import jsonify
 
@@ -1628,6 +1845,78 @@ import urllib3
 # Disable SSL certificate verification warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# when a live projector request fails before the display has been refreshed since a
+# restart, answer with the last-known value from the snapshot marked as stale
+def stale_projector_response(display_address, field):
+    last_known = device_snapshot.get(PROJECTORS, display_address)
+    if last_known is None or not last_known['stale'] or last_known.get(field) is None:
+        return None
+
+    return json.dumps({field: last_known[field], 'stale': True, 'updated': last_known['updated']}), 200
+
+
+# every display with its credentials, for the background projector state poller
+# displays known not to have the pj api are left out, polling them would only time out
+def list_projector_displays():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT display_address, room_code, username, password, capabilities FROM displays')
+    rows = cursor.fetchall()
+    conn.close()
+
+    displays = []
+    for display_address, room_code, username, password, capabilities in rows:
+        if capabilities and PJ_V01 not in json.loads(capabilities).get('families', []):
+            continue
+        displays.append((display_address, room_code, username, password))
+    return displays
+
+
+# polled projector state - GET routes answer from here unless ?fresh=1
+projector_state = ProjectorStateCache(
+    projector_sessions,
+    device_snapshot,
+    list_projector_displays,
+    interval=conf.PROJECTOR_POLL_INTERVAL,
+    max_age=conf.PROJECTOR_STATE_MAX_AGE,
+    refresh_delay=conf.PROJECTOR_REFRESH_DELAY,
+    concurrency=conf.PROJECTOR_POLL_CONCURRENCY,
+)
+
+
+# returns a cached response for a projector GET route, or None if the device should be queried
+def cached_projector_response(display_address, field):
+    if request.args.get('fresh', '').lower() in ('1', 'true', 'yes'):
+        return None
+
+    cached = projector_state.get(display_address, field)
+    if cached is None:
+        return None
+
+    return json.dumps({field: cached[field], 'cached': True, 'updated': cached['updated']}), 200
+
+
+# detected api families/sources, stored as json in displays.capabilities
+def load_display_capabilities(display_address):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT capabilities FROM displays WHERE display_address = %s', (display_address,))
+    row = cursor.fetchone()
+    conn.close()
+
+    if not row or not row[0]:
+        return None
+    return json.loads(row[0])
+
+def store_display_capabilities(display_address, capabilities):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('UPDATE displays SET capabilities = %s WHERE display_address = %s', (json.dumps(capabilities), display_address))
+    conn.commit()
+    conn.close()
+
+projector_capabilities = ProjectorCapabilities(projector_sessions, load_display_capabilities, store_display_capabilities)
+
 
 ### this is the pj solution using digest auth for epson projects!
 ### SEE BELOW LIST FOR MORE COMMANDS
@@ -1663,7 +1952,10 @@ def select_projector_source(room_code, display_address):
     data = request.get_json()
     source = data.get("source")
     
-    ## maybe check if source is in display sources?
+    # reject sources the display does not have, if its source list is already known
+    capabilities = projector_capabilities.known(display_address)
+    if capabilities and capabilities.get('sources') and source not in capabilities['sources']:
+        return jsonify({'error': f"Invalid source: {source}. Valid sources are: {', '.join(capabilities['sources'])}"}), 400
 
     # build url
     url = f'http://{display_address}/lighting/api/v01/pj/source'
@@ -1675,9 +1967,11 @@ def select_projector_source(room_code, display_address):
 
     try:
         # Send a GET request with the payload
-        response = requests.put(url, data=json.dumps(payload), auth=HTTPDigestAuth(username, password), verify=False, headers={'Content-Type': 'application/json'})
+        response = projector_sessions.put(display_address, username, password, url, data=json.dumps(payload), headers={'Content-Type': 'application/json'})
 
         if response.status_code == 200:
+            projector_state.record(display_address, room_code, source=source)
+            projector_state.refresh_soon(display_address, room_code, username, password)
             return response.text, 200
         elif response.status_code == 401:
             return jsonify({'error': 'Authentication failed'}), 401
@@ -1715,19 +2009,28 @@ def get_projector_source(room_code, display_address):
     username, password = display_details
     conn.close() 
 
+    cached_response = cached_projector_response(display_address, 'source')
+    if cached_response:
+        return cached_response
+
     # build url
     url = f'http://{display_address}/lighting/api/v01/pj/source'
 
     try:
-        response = requests.get(url, auth=HTTPDigestAuth(username, password), verify=False)
+        response = projector_sessions.get(display_address, username, password, url)
 
         if response.status_code == 200:
+            projector_state.record(display_address, room_code, source=response.json().get('source'))
             return response.text, 200
         elif response.status_code == 401:
             return jsonify({'error': 'Authentication failed'}), 401
         else:
             return jsonify({'error': 'Failed'}), 500
     except Exception as e:
+        projector_state.record_error(display_address, room_code, e)
+        stale_response = stale_projector_response(display_address, 'source')
+        if stale_response:
+            return stale_response
         return jsonify({'error': str(e)}), 500
 
 # Get sources:
@@ -1769,7 +2072,7 @@ def get_projector_sources(room_code, display_address):
     url = f'http://{display_address}/lighting/api/v01/pj/sources'
 
     try:
-        response = requests.get(url, auth=HTTPDigestAuth(username, password), verify=False)
+        response = projector_sessions.get(display_address, username, password, url)
 
         if response.status_code == 200:
             return response.text, 200
@@ -1822,9 +2125,11 @@ def set_projector_power(room_code, display_address):
 
     try:
         # Send a GET request with the payload
-        response = requests.put(url, data=json.dumps(payload), auth=HTTPDigestAuth(username, password), verify=False, headers={'Content-Type': 'application/json'})
+        response = projector_sessions.put(display_address, username, password, url, data=json.dumps(payload), headers={'Content-Type': 'application/json'})
 
         if response.status_code == 200:
+            projector_state.record(display_address, room_code, power=power)
+            projector_state.refresh_soon(display_address, room_code, username, password)
             return response.text, 200
         elif response.status_code == 401:
             return jsonify({'error': 'Authentication failed'}), 401
@@ -1863,19 +2168,28 @@ def get_projector_power(room_code, display_address):
     username, password = display_details
     conn.close() 
 
+    cached_response = cached_projector_response(display_address, 'power')
+    if cached_response:
+        return cached_response
+
     # build url
     url = f'http://{display_address}/lighting/api/v01/pj/power'
 
     try:
-        response = requests.get(url, auth=HTTPDigestAuth(username, password), verify=False)
+        response = projector_sessions.get(display_address, username, password, url)
 
         if response.status_code == 200:
+            projector_state.record(display_address, room_code, power=response.json().get('power'))
             return response.text, 200
         elif response.status_code == 401:
             return jsonify({'error': 'Authentication failed'}), 401
         else:
             return jsonify({'error': 'Failed'}), 500
     except Exception as e:
+        projector_state.record_error(display_address, room_code, e)
+        stale_response = stale_projector_response(display_address, 'power')
+        if stale_response:
+            return stale_response
         return jsonify({'error': str(e)}), 500
 
 # ## returns the current state of mute?
@@ -1907,19 +2221,25 @@ def get_projector_mute(room_code, display_address):
     username, password = display_details
     conn.close() 
 
+    cached_response = cached_projector_response(display_address, 'mute')
+    if cached_response:
+        return cached_response
+
     # build url
     url = f'http://{display_address}/lighting/api/v01/pj/mute'
 
     try:
-        response = requests.get(url, auth=HTTPDigestAuth(username, password), verify=False)
+        response = projector_sessions.get(display_address, username, password, url)
 
         if response.status_code == 200:
+            projector_state.record(display_address, room_code, mute=response.json().get('mute'))
             return response.text, 200
         elif response.status_code == 401:
             return jsonify({'error': 'Authentication failed'}), 401
         else:
             return jsonify({'error': 'Failed'}), 500
     except Exception as e:
+        projector_state.record_error(display_address, room_code, e)
         return jsonify({'error': str(e)}), 500
 
 
@@ -1968,10 +2288,11 @@ def set_projector_mute(room_code, display_address):
 
     try:
         # Send a GET request with the payload
-        response = requests.put(url, data=json.dumps(payload), auth=HTTPDigestAuth(username, password), verify=False, headers={'Content-Type': 'application/json'})
+        response = projector_sessions.put(display_address, username, password, url, data=json.dumps(payload), headers={'Content-Type': 'application/json'})
         logger.info(f'set_projector_mute, response: {response}')
 
         if response.status_code == 200:
+            projector_state.refresh_soon(display_address, room_code, username, password)
             return response.text, 200
         elif response.status_code == 401:
             return jsonify({'error': 'Authentication failed'}), 401
@@ -2022,9 +2343,11 @@ def change_projector_volume(room_code, display_address):
 
     try:
         # Send a GET request with the payload
-        response = requests.put(url, data=json.dumps(payload), auth=HTTPDigestAuth(username, password), verify=False, headers={'Content-Type': 'application/json'})
+        response = projector_sessions.put(display_address, username, password, url, data=json.dumps(payload), headers={'Content-Type': 'application/json'})
 
         if response.status_code == 200:
+            projector_volume.forget(display_address)
+            projector_state.refresh_soon(display_address, room_code, username, password)
             return response.text, 200
         elif response.status_code == 401:
             return jsonify({'error': 'Authentication failed'}), 401
@@ -2058,98 +2381,32 @@ def set_projector_volume(room_code, display_address):
     username, password = display_details
     conn.close()
     
-    data = request.get_json()
-    desired_volume_level = data.get("volume_level")
-    if desired_volume_level > 20:
-        desired_volume_level = 20
-    elif desired_volume_level < 0:
-        desired_volume_level = 20
-    
-    # get current volume
-    current_volume = None
-    url = f'http://{display_address}/lighting/api/v01/pj/volume'
+    data = request.get_json(silent=True) or {}
+    if data.get("volume_level") is None:
+        return jsonify({'error': 'volume_level is required'}), 400
     try:
-        response = requests.get(url, auth=HTTPDigestAuth(username, password), verify=False)
-        if response.status_code == 200:
-            # Parse the JSON response
-            response_data = json.loads(response.text)
+        desired_volume_level = json_number(data, 'volume_level', None, cast=int)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-            # Extract the value of the "volume" field
-            current_volume = response_data.get("volume")
-        elif response.status_code == 401:
-            return jsonify({'error': 'Authentication failed'}), 401
-        else:
-            return jsonify({'error': 'Failed'}), 500
+    # the volume engine steps the projector to the target and verifies it, a newer
+    # request for the same display takes over from this one (last-writer-wins)
+    try:
+        result = projector_volume.set_volume(display_address, username, password, desired_volume_level)
+    except ProjectorVolumeError as e:
+        return jsonify({'error': str(e)}), e.status_code
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-        
-    # Step 1: Calculate the difference between `desired_volume_level` and `current_volume`
-    volume_difference = desired_volume_level - current_volume
-    logger.info(f'set_projector_volume, volume_difference = {volume_difference}')
-    
-    if volume_difference == 0:
-        return jsonify({'message': 'Volume already at that equivalent level'}), 200
-
-    # Define a function to send volume control commands
-    def send_volume_command(command, volume_difference, max_consecutive_uppers=20):
-        # Build URL
-        url = f'http://{display_address}/lighting/api/v01/pj/volume'
-
-        # Build the payload as a dictionary
-        payload = {
-            "volume": command
-        }
 
-        # Send a PUT request with the payload
-        for _ in range(volume_difference):
-            #time.sleep(sleep_duration)
-            try:
-                response = requests.put(url, data=json.dumps(payload), auth=HTTPDigestAuth(username, password), verify=False, headers={'Content-Type': 'application/json'})
-            except Exception as e:
-                logger.info(f'send_volume_command, Exception: {e}')
-                return False
+    logger.info(f'set_projector_volume, {display_address} result = {result}')
+    projector_state.record(display_address, room_code, volume=result['volume'])
 
-            logger.info(f'send_volume_command, response: {response.text}')
-            
-            # If the response is 200 but contains {"limit":"upper"}, adjust sleep duration
-            if '{"limit":"upper"}' in response.text:
-                return True
-
-        return True
-
-    # Apply the volume control commands
-    if volume_difference > 0:
-        logger.info(f'set_projector_volume, volume_difference > 0 = {volume_difference > 0}')
-        # Increase volume
-        if not send_volume_command("INC", volume_difference):
-            return jsonify({'error': 'Failed to increase volume'}), 500
-    elif volume_difference < 0:
-        logger.info(f'set_projector_volume, volume_difference < 0 = {volume_difference < 0}')
-        # Decrease volume
-        if not send_volume_command("DEC", -volume_difference):
-            return jsonify({'error': 'Failed to decrease volume'}), 500
-
-    # Step 3: Confirm `current_volume` is equal to `desired_volume_level`
-    # Get the updated current volume
-    url = f'http://{display_address}/lighting/api/v01/pj/volume'
-    try:
-        response = requests.get(url, auth=HTTPDigestAuth(username, password), verify=False)
-        if response.status_code == 200:
-            response_data = json.loads(response.text)
-            current_volume = response_data.get("volume")
-            logger.info(f'set_projector_volume, after loop current_volume = {current_volume}')
-        else:
-            return jsonify({'error': 'Failed to confirm volume change'}), 500
-    except Exception as e:
-        return jsonify({'error': 'Failed to confirm volume change'}), 500
-
-    # Check if the current volume matches the desired volume
-    logger.info(f'set_projector_volume, current_volume = {current_volume}')
-    logger.info(f'set_projector_volume, desired_volume_level = {desired_volume_level}')
-    if current_volume == desired_volume_level:
-        return jsonify({'message': 'Volume changed successfully'}), 200
+    if result['superseded']:
+        return jsonify({'message': 'Volume change superseded by a newer request', 'volume': result['volume']}), 200
+    elif result['volume'] == result['target']:
+        return jsonify({'message': 'Volume changed successfully', 'volume': result['volume']}), 200
     else:
-        return jsonify({'error': 'Volume change confirmation failed'}), 500
+        return jsonify({'error': 'Volume change confirmation failed', 'volume': result['volume']}), 500
 
 
 # # get current volume
@@ -2181,19 +2438,26 @@ def get_projector_volume(room_code, display_address):
     username, password = display_details
     conn.close() 
 
+    cached_response = cached_projector_response(display_address, 'volume')
+    if cached_response:
+        return cached_response
+
     # build url
     url = f'http://{display_address}/lighting/api/v01/pj/volume'
 
     try:
-        response = requests.get(url, auth=HTTPDigestAuth(username, password), verify=False)
+        response = projector_sessions.get(display_address, username, password, url)
 
         if response.status_code == 200:
+            projector_state.record(display_address, room_code, volume=response.json().get('volume'))
+            projector_volume.observe(display_address, response.json().get('volume'))
             return response.text, 200
         elif response.status_code == 401:
             return jsonify({'error': 'Authentication failed'}), 401
         else:
             return jsonify({'error': 'Failed'}), 500
     except Exception as e:
+        projector_state.record_error(display_address, room_code, e)
         return jsonify({'error': str(e)}), 500
 
 
@@ -2226,19 +2490,28 @@ def get_projector_state(room_code, display_address):
     username, password = display_details
     conn.close() 
 
+    cached_response = cached_projector_response(display_address, 'power')
+    if cached_response:
+        return cached_response
+
     # build url
     url = f'http://{display_address}/lighting/api/v01/pj/power'
 
     try:
-        response = requests.get(url, auth=HTTPDigestAuth(username, password), verify=False)
+        response = projector_sessions.get(display_address, username, password, url)
 
         if response.status_code == 200:
+            projector_state.record(display_address, room_code, power=response.json().get('power'))
             return response.text, 200
         elif response.status_code == 401:
             return jsonify({'error': 'Authentication failed'}), 401
         else:
             return jsonify({'error': 'Failed'}), 500
     except Exception as e:
+        projector_state.record_error(display_address, room_code, e)
+        stale_response = stale_projector_response(display_address, 'power')
+        if stale_response:
+            return stale_response
         return jsonify({'error': str(e)}), 500
 
 # @app.route('/turn_on_projector/<string:room_code>/<string:display_address>', methods=['post'])
@@ -2457,7 +2730,6 @@ def cycle_port():
 # ================================= TESTING ==========================================
 
 import requests
-from requests.auth import HTTPDigestAuth
 
 @app.route('/turn_off_projector/<string:room_code>/<string:display_address>', methods=['POST'])
 def turn_off_projector(room_code, display_address):
@@ -2494,9 +2766,10 @@ def turn_off_projector(room_code, display_address):
 
     try:
         #response = requests.get(url, auth=(username, password))
-        response = requests.get(url, auth=HTTPDigestAuth(username, password))
+        response = projector_sessions.get(display_address, username, password, url)
 
         if response.status_code == 200:
+            projector_state.refresh_soon(display_address, room_code, username, password)
             return jsonify({'message': 'Projector turned off successfully'}), 200
         elif response.status_code == 401:
             return jsonify({'error': 'Authentication failed'}), 401
@@ -2535,9 +2808,10 @@ def turn_on_projector(room_code, display_address):
 
     try:
         #response = requests.get(url, auth=(username, password))
-        response = requests.get(url, auth=HTTPDigestAuth(username, password))
+        response = projector_sessions.get(display_address, username, password, url)
 
         if response.status_code == 200:
+            projector_state.refresh_soon(display_address, room_code, username, password)
             return jsonify({'message': 'Projector turned on successfully'}), 200
         elif response.status_code == 401:
             return jsonify({'error': 'Authentication failed'}), 401
@@ -2590,6 +2864,34 @@ api_v02 = {
     }
 }
 
+# validate a v02 command request body, returns (request_type, endpoint_url, payload)
+def build_api_v02_request(data):
+    command = data.get("command")
+
+    details = api_v02.get(command)
+    if not details:
+        raise ValueError(f"Invalid command: {command}")
+
+    request_body = details["request_body"]
+    validation_options = details["request_body_options"]
+
+    # Remove "command" (and room-wide dispatch options) from user_input if they exist
+    user_input = {key: value for key, value in data.items() if key not in ("command", "displays", "deadline")}
+
+    for param, value in user_input.items():
+        if param in request_body:
+            valid_values = validation_options.get(param)
+            if valid_values is not None and value not in valid_values:
+                raise ValueError(f"Invalid value for {param}: {value}. Valid values are: {', '.join(valid_values)}")
+        else:
+            raise ValueError(f"Invalid parameter: {param}")
+
+    # Build the JSON payload based on command and user input
+    payload = {}
+    payload.update(user_input)  # Merge with user input
+
+    return details.get("request_type"), details["endpoint_url"], payload
+
 @app.route('/projector_api/<string:room_code>/<string:display_address>', methods=['POST'])
 def projector_api(room_code, display_address):
     conn = get_db_connection()
@@ -2615,56 +2917,30 @@ def projector_api(room_code, display_address):
     conn.close()  
 
     try:
-        data = request.get_json()
-        command = data.get("command")
-
-        details = api_v02.get(command)
-        if not details:
-            raise ValueError(f"Invalid command: {command}")
-
-        request_body = details["request_body"]
-        validation_options = details["request_body_options"]
-
-        # Remove "command" from user_input if it exists
-        user_input = {key: value for key, value in data.items() if key != "command"}
-
-        for param, value in user_input.items():
-            if param in request_body:
-                valid_values = validation_options.get(param)
-                if valid_values is not None and value not in valid_values:
-                    raise ValueError(f"Invalid value for {param}: {value}. Valid values are: {', '.join(valid_values)}")
-            else:
-                raise ValueError(f"Invalid parameter: {param}")
+        request_type, endpoint_url, payload = build_api_v02_request(request.get_json())
     except Exception as e:
             return jsonify({'error': str(e)}), 500
         
-    # Now you can proceed with building and making the API call with the validated data
-    request_type = details.get("request_type")  # Default to GET if request type not specified
-    endpoint_url = details["endpoint_url"]
-        
-    # Build the JSON payload based on command and user input
-    payload = {}
-    payload.update(user_input)  # Merge with user input
-        
     # build request with display credentials
     url = f'http://{display_address}{endpoint_url}'
     
     try:
         if request_type == "GET":
-            response = requests.get(url, auth=HTTPDigestAuth(username, password))
+            response = projector_sessions.get(display_address, username, password, url)
         elif request_type == "POST":
             # Make a POST request with the payload as data
-            response = requests.post(url, json=payload, auth=HTTPDigestAuth(username, password))
+            response = projector_sessions.post(display_address, username, password, url, json=payload)
         elif request_type == "PUT":
             # Make a PUT request with the payload as data
-            response = requests.put(url, json=payload, auth=HTTPDigestAuth(username, password))
+            response = projector_sessions.put(display_address, username, password, url, json=payload)
         elif request_type == "DELETE":
             # Make a DELETE request
-            response = requests.delete(url, auth=HTTPDigestAuth(username, password))
+            response = projector_sessions.delete(display_address, username, password, url)
         else:
             return jsonify({'error': 'Invalid request type'}), 400
 
         if response.status_code == 200:
+            projector_state.refresh_soon(display_address, room_code, username, password)
             return jsonify({"message": "API call successful"}), 200
         elif response.status_code == 401:
             return jsonify({'error': 'Authentication failed'}), 401
@@ -2676,12 +2952,1017 @@ def projector_api(room_code, display_address):
 
 
 
+# =========================================================================
+#  Room-wide projector commands
+#  each route resolves the room's displays once and sends to all of them at once,
+#  optional json keys: "displays" - only these display addresses, "deadline" - seconds per display
+# =========================================================================
+
+# {display_address: (username, password)} for a room, None if the room does not exist
+def get_room_displays(room_code, display_addresses=None):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('SELECT room_code FROM rooms WHERE room_code = %s', (room_code,))
+    if not cursor.fetchone():
+        conn.close()
+        return None
+
+    cursor.execute('SELECT display_address, username, password FROM displays WHERE room_code = %s', (room_code,))
+    displays = {display_address: (username, password) for display_address, username, password in cursor.fetchall()}
+    conn.close()
+
+    if display_addresses:
+        displays = {address: credentials for address, credentials in displays.items() if address in display_addresses}
+
+    return displays
+
+# send one request to a projector, raises unless the projector accepted it
+def send_projector_command(display_address, username, password, method, endpoint_url, **kwargs):
+    url = f'http://{display_address}{endpoint_url}'
+    response = projector_sessions.request(method, display_address, username, password, url, **kwargs)
+
+    if response.status_code == 401:
+        raise Exception('Authentication failed')
+    elif response.status_code != 200:
+        raise Exception(f'Projector returned {response.status_code}')
+
+    try:
+        return response.json()
+    except ValueError:
+        return response.text
+
+# a number from the request json (or its default), ValueError naming the key if it is not one within the bounds
+def json_number(data, key, default, cast=float, minimum=None, maximum=None):
+    value = data.get(key, default)
+    try:
+        if isinstance(value, bool):
+            raise ValueError
+        number = cast(value)
+        if not math.isfinite(number) or number != float(value):
+            raise ValueError
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f'{key} must be {"an integer" if cast is int else "a number"}')
+
+    if (minimum is not None and number < minimum) or (maximum is not None and number > maximum):
+        bounds = f'at least {minimum}' if maximum is None else f'between {minimum} and {maximum}'
+        raise ValueError(f'{key} must be {bounds}')
+    return number
+
+# run action(display_address, username, password) on every display in the room
+def room_projector_command(room_code, data, action):
+    try:
+        deadline = json_number(data, 'deadline', conf.ROOM_COMMAND_DEADLINE, minimum=1)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    displays = get_room_displays(room_code, data.get('displays'))
+    if displays is None:
+        return jsonify({'error': 'Room not found'}), 404
+
+    outcomes = run_concurrently(displays, action, deadline, conf.ROOM_COMMAND_CONCURRENCY)
+
+    body, status = summarise(outcomes, room_code=room_code)
+    return jsonify(body), status
+
+# send a generic command to every display, through whichever api each one has
+def room_projector_put(room_code, field, value, data):
+    def action(display_address, username, password):
+        capabilities = projector_capabilities.get(display_address, username, password)
+        method, endpoint_url, kwargs = projector_capabilities.build_request(capabilities, field, value)
+        result = send_projector_command(display_address, username, password, method, endpoint_url, **kwargs)
+        projector_state.record(display_address, room_code, **{field: value})
+        projector_state.refresh_soon(display_address, room_code, username, password)
+        return result
+
+    return room_projector_command(room_code, data, action)
+
+@app.route('/room_projector_power/<string:room_code>', methods=['PUT'])
+def room_projector_power(room_code):
+    data = request.get_json() or {}
+    power = data.get("power")
+    if power is None:
+        return jsonify({'error': 'power is required'}), 400
+
+    return room_projector_put(room_code, 'power', power, data)
+
+@app.route('/room_projector_source/<string:room_code>', methods=['PUT'])
+def room_projector_source(room_code):
+    data = request.get_json() or {}
+    source = data.get("source")
+    if source is None:
+        return jsonify({'error': 'source is required'}), 400
+
+    return room_projector_put(room_code, 'source', source, data)
+
+@app.route('/room_projector_mute/<string:room_code>', methods=['PUT'])
+def room_projector_mute(room_code):
+    data = request.get_json() or {}
+    mute = data.get("mute")
+    if mute is None:
+        return jsonify({'error': 'mute is required'}), 400
+
+    return room_projector_put(room_code, 'mute', mute, data)
+
+@app.route('/room_projector_volume/<string:room_code>', methods=['PUT'])
+def room_projector_volume(room_code):
+    data = request.get_json(silent=True) or {}
+    if data.get("volume_level") is None:
+        return jsonify({'error': 'volume_level is required'}), 400
+    try:
+        volume_level = json_number(data, 'volume_level', None, cast=int)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # each display converges on the level through its own volume controller
+    def action(display_address, username, password):
+        result = projector_volume.set_volume(display_address, username, password, volume_level)
+        projector_state.record(display_address, room_code, volume=result['volume'])
+        if not result['superseded'] and result['volume'] != result['target']:
+            raise Exception(f"Volume change confirmation failed, volume is {result['volume']}")
+        return result
+
+    # stepping the volume takes longer than a single command
+    data.setdefault('deadline', conf.PROJECTOR_VOLUME_TIMEOUT)
+    return room_projector_command(room_code, data, action)
+
+@app.route('/room_projector_api/<string:room_code>', methods=['POST'])
+def room_projector_api(room_code):
+    data = request.get_json() or {}
+    try:
+        request_type, endpoint_url, payload = build_api_v02_request(data)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+    if request_type in ("POST", "PUT"):
+        kwargs = {'json': payload}
+    elif request_type in ("GET", "DELETE"):
+        kwargs = {}
+    else:
+        return jsonify({'error': 'Invalid request type'}), 400
+
+    def action(display_address, username, password):
+        result = send_projector_command(display_address, username, password, request_type, endpoint_url, **kwargs)
+        projector_state.refresh_soon(display_address, room_code, username, password)
+        return result
+
+    return room_projector_command(room_code, data, action)
+
+
+
+# =========================================================================
+#  Background jobs
+#  open_youtube, open_browser, open_vlc_video, connect_samba_share and upload_images
+#  answer 202 with a job id, GET /jobs/<job_id> reports status, progress and result;
+#  add ?wait=1 to wait up to JOB_WAIT_TIMEOUT seconds and answer as before
+# =========================================================================
+
+# the host helpers return {'error': ...} (or None) instead of raising, turn that into a failed outcome
+def host_result(result):
+    if result is None:
+        raise Exception('Backend function failed')
+    if isinstance(result, dict) and result.get('error'):
+        raise Exception(result['error'])
+    return result
+
+# submit function(job) for a host and answer with the job, or its result if the caller waits
+def host_job_response(kind, host_address, function):
+    job = host_jobs.submit(kind, host_address, function)
+
+    if request.args.get('wait', '').lower() in ('1', 'true', 'yes') and job.wait(conf.JOB_WAIT_TIMEOUT):
+        if job.status == SUCCEEDED:
+            return jsonify({'response': job.result, 'job_id': job.id}), 200
+        return jsonify({'error': job.error, 'job_id': job.id}), 500
+
+    return jsonify(job.as_dict()), 202, {'Location': f'/jobs/{job.id}'}
+
+@app.route('/jobs/<string:job_id>', methods=['GET'])
+def get_job(job_id):
+    job = host_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    return jsonify(job.as_dict()), 200
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    jobs = host_jobs.list(host=request.args.get('host'), status=request.args.get('status'))
+    return jsonify({'jobs': [job.as_dict() for job in jobs], 'queue': host_jobs.stats()}), 200
+
+
+
+# =========================================================================
+#  Host agents
+#  hosts running host-setup/host_agent.py keep a connection open to the api,
+#  desktop helpers use it when it is there and fall back to ssh/psexec otherwise
+# =========================================================================
+
+@app.route('/host_agents', methods=['GET'])
+def list_host_agents():
+    return jsonify({'agents': host_agents.status()}), 200
+
+# send a typed command (ping, launch, kill, nircmd, volume, media) to a host's agent
+@app.route('/host_agent_command/<string:room_code>/<string:host_address>', methods=['POST'])
+def host_agent_command(room_code, host_address):
+    data = request.get_json() or {}
+    command = data.get('command')
+    if not command:
+        return jsonify({'error': 'Missing required field(s)'}), 400
+
+    hosts = get_room_hosts(room_code, [host_address])
+    if hosts is None:
+        return jsonify({'error': 'Room not found'}), 404
+    elif not hosts:
+        return jsonify({'error': 'Host not found in the specified room'}), 404
+
+    started = time.time()
+    try:
+        result = host_agents.call(host_address, command, data.get('args'), timeout=conf.AGENT_COMMAND_TIMEOUT)
+    except AgentUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify({'response': result, 'elapsed': round(time.time() - started, 3)}), 200
+
+
+
+# =========================================================================
+#  Host scripts
+#  an ordered list of desktop actions run on one host over one ssh session,
+#  consecutive nircmd/shell steps compiled into one remote execution each
+# =========================================================================
+
+# psexec in the script's session, later batches use the id a retry looked up
+def run_script_psexec(client, username, session, command):
+    def tracked(session_id):
+        session['id'] = session_id
+        return command(session_id)
+
+    return session_ids.run_psexec(client, username, session['id'], tracked)
+
+# run one compiled batch over the leased client, returns ([ok per step], detail)
+def run_script_batch(client, username, password, batch, session):
+    if batch.kind == WAIT:
+        time.sleep(batch.steps[0].payload)
+        return [True], None
+
+    if batch.kind == SHELL:
+        _, stdout, stderr = client.exec_command(batch_command(batch))
+        exit_status = stdout.channel.recv_exit_status()
+        return batch_results(batch, exit_status), stderr.read().decode('utf-8').strip() or None
+
+    # nircmd and launch steps run in the user's desktop session
+    if 'id' not in session:
+        session['id'] = get_session_id(client, username)
+    if not session['id']:
+        raise Exception(f"No active session found for {username}.")
+
+    if batch.kind == NIRCMD:
+        # psexec waits for cmd and reports its exit code, which carries a bit per failed step
+        _, error = run_script_psexec(client, username, session,
+                                     psexec_command(username, password, batch_command(batch), detach=False))
+
+        code_match = re.search(r"error code (-?\d+)", error)
+        if not code_match:
+            raise Exception(error.strip() or 'psexec did not report an exit code')
+        return batch_results(batch, int(code_match.group(1))), None
+
+    path, arguments = batch.steps[0].payload
+    quoted = ' '.join(f'"{argument}"' for argument in arguments)
+    _, error = run_script_psexec(client, username, session, psexec_command(username, password, f'"{path}" {quoted}'))
+
+    pid_match = re.search(r"process ID (\d+)", error)
+    if not pid_match:
+        return [False], error.strip() or 'psexec did not report a process id'
+    return [True], {'pid': pid_match.group(1)}
+
+# run the steps one by one through the host agent, each answers in milliseconds
+def run_script_on_agent(hostname, batches, stop_on_error):
+    results = []
+    failed = False
+    for batch in batches:
+        for step in batch.steps:
+            started = time.time()
+            outcome = {'step': step.index, 'action': step.action}
+            if failed and stop_on_error:
+                outcome.update(ok=False, skipped=True)
+                results.append(outcome)
+                continue
+
+            try:
+                if step.kind == WAIT:
+                    time.sleep(step.payload)
+                detail = None
+                for command, args in step.agent_commands:
+                    detail = host_agents.call(hostname, command, args, timeout=conf.AGENT_COMMAND_TIMEOUT)
+                outcome.update(ok=True, result=detail)
+            except Exception as e:
+                outcome.update(ok=False, error=str(e))
+                failed = True
+
+            outcome['elapsed'] = round(time.time() - started, 3)
+            results.append(outcome)
+    return results, len([step for batch in batches for step in batch.steps if step.agent_commands])
+
+# run a host script, returns (per-step results, number of remote executions)
+def run_host_script(hostname, username, password, batches, stop_on_error=True):
+    if host_agents.get(hostname) is not None:
+        return run_script_on_agent(hostname, batches, stop_on_error)
+
+    results = []
+    executions = 0
+    failed = False
+    session = {}
+
+    # Lease a pooled SSH connection, closing it returns it to the pool
+    with ssh_pool.lease() as client:
+        ssh_connect(client, hostname, username, password)
+
+        for number, batch in enumerate(batches):
+            started = time.time()
+            if failed and stop_on_error:
+                oks, detail, error = [False] * len(batch.steps), None, 'skipped'
+            else:
+                try:
+                    oks, detail = run_script_batch(client, username, password, batch, session)
+                    error = None
+                except Exception as e:
+                    oks, detail, error = [False] * len(batch.steps), None, str(e)
+                if batch.kind != WAIT:
+                    executions += 1
+            elapsed = round(time.time() - started, 3)
+
+            # steps of one batch ran in the same remote execution and share its timing
+            for step, ok in zip(batch.steps, oks):
+                outcome = {'step': step.index, 'action': step.action, 'ok': ok, 'batch': number, 'elapsed': elapsed}
+                if error == 'skipped':
+                    outcome['skipped'] = True
+                elif error:
+                    outcome['error'] = error
+                elif detail is not None:
+                    outcome['result' if ok else 'error'] = detail
+                results.append(outcome)
+
+            if not all(oks):
+                failed = True
+
+    return results, executions
+
+@app.route('/host_script/<string:room_code>/<string:host_address>', methods=['POST'])
+def host_script(room_code, host_address):
+    data = request.get_json() or {}
+    steps = data.get('steps')
+    if not isinstance(steps, list) or not steps:
+        return jsonify({'error': 'steps must be a non-empty list'}), 400
+
+    try:
+        batches = compile_steps(steps)
+    except (ValueError, AttributeError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    hosts = get_room_hosts(room_code, [host_address])
+    if hosts is None:
+        return jsonify({'error': 'Room not found'}), 404
+    elif not hosts:
+        return jsonify({'error': 'Host not found in the specified room'}), 404
+
+    username, password, _ = hosts[host_address]
+    stop_on_error = str(data.get('stop_on_error', True)).lower() != 'false'
+
+    started = time.time()
+    try:
+        results, executions = run_host_script(host_address, username, password, batches, stop_on_error)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    succeeded = sum(1 for outcome in results if outcome['ok'])
+    return jsonify({
+        'host_address': host_address,
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'executions': executions,
+        'elapsed': round(time.time() - started, 3),
+        'steps': results,
+    }), 200 if succeeded == len(results) else 207
+
+
+
+# =========================================================================
+#  Room-wide host actions
+#  each route resolves the room's hosts once and runs the action over ssh on all
+#  of them at once, optional json keys: "hosts" - only these host addresses,
+#  "deadline" - seconds per host, "include_down" - also try hosts the monitor has down
+# =========================================================================
+
+# {host_address: (username, password, platform)} for a room, None if the room does not exist
+def get_room_hosts(room_code, host_addresses=None):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('SELECT room_code FROM rooms WHERE room_code = %s', (room_code,))
+    if not cursor.fetchone():
+        conn.close()
+        return None
+
+    cursor.execute('SELECT host_address, username, password, platform FROM hosts WHERE room_code = %s', (room_code,))
+    hosts = {host_address: (username, password, platform) for host_address, username, password, platform in cursor.fetchall()}
+    conn.close()
+
+    if host_addresses:
+        hosts = {address: details for address, details in hosts.items() if address in host_addresses}
+
+    return hosts
+
+# run action(host_address, username, password, platform) on every host in the room
+def room_host_command(room_code, action):
+    data = request.get_json(silent=True) or {}
+    try:
+        deadline = json_number(data, 'deadline', conf.ROOM_HOST_DEADLINE, minimum=1)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    hosts = get_room_hosts(room_code, data.get('hosts'))
+    if hosts is None:
+        return jsonify({'error': 'Room not found'}), 404
+
+    # hosts the monitor has seen down fail straight away rather than after an ssh timeout
+    skipped = {}
+    if str(data.get('include_down', False)).lower() not in ('1', 'true', 'yes'):
+        for host_address in [address for address in hosts if host_monitor.is_down(address)]:
+            del hosts[host_address]
+            skipped[host_address] = {'ok': False, 'error': 'Host unreachable', 'skipped': True, 'elapsed': 0,
+                                     'last_seen': host_monitor.status(host_address).get('last_seen')}
+
+    outcomes = run_concurrently(hosts, action, deadline, conf.ROOM_HOST_CONCURRENCY)
+    outcomes.update(skipped)
+
+    body, status = summarise(outcomes, room_code=room_code)
+    return jsonify(body), status
+
+# run a nircmd command on every host in the room
+def room_nircmd(room_code, command):
+    def action(host_address, username, password, platform):
+        return host_result(run_nircmd(host_address, username, password, command))
+
+    return room_host_command(room_code, action)
+
+@app.route('/room_reboot/<string:room_code>', methods=['POST'])
+def room_reboot(room_code):
+    def action(host_address, username, password, platform):
+        return host_result(run_reboot_device(host_address, username, password, platform))
+
+    return room_host_command(room_code, action)
+
+@app.route('/room_shutdown/<string:room_code>', methods=['POST'])
+def room_shutdown(room_code):
+    def action(host_address, username, password, platform):
+        return host_result(run_shutdown_device(host_address, username, password, platform))
+
+    return room_host_command(room_code, action)
+
+@app.route('/room_monitor_off/<string:room_code>', methods=['POST'])
+def room_monitor_off(room_code):
+    return room_nircmd(room_code, "monitor off")
+
+@app.route('/room_monitor_on/<string:room_code>', methods=['POST'])
+def room_monitor_on(room_code):
+    def action(host_address, username, password, platform):
+        host_result(run_nircmd(host_address, username, password, "monitor on"))
+
+        # Simulate mouse clicks to keep the monitor on
+        time.sleep(3)
+        host_result(sim_mouse_press(host_address, username, password))
+        return "Monitor should be back on"
+
+    return room_host_command(room_code, action)
+
+@app.route('/room_hide_taskbar/<string:room_code>', methods=['POST'])
+def room_hide_taskbar(room_code):
+    return room_nircmd(room_code, "win hide class Shell_TrayWnd")
+
+@app.route('/room_send_nircmd/<string:room_code>', methods=['POST'])
+def room_send_nircmd(room_code):
+    data = request.get_json(silent=True) or {}
+    command = data.get('command')
+    if not command:
+        return jsonify({'error': 'Missing required field(s)'}), 400
+
+    return room_nircmd(room_code, command)
+
+@app.route('/room_chrome_off/<string:room_code>', methods=['POST'])
+def room_chrome_off(room_code):
+    def action(host_address, username, password, platform):
+        return host_result(kill_chrome(host_address, username, password))
+
+    return room_host_command(room_code, action)
+
+# wake every host in the room: magic packet bursts to all of them at once, then watch their ssh
+# ports as a background job, the result has each host's state and seconds until it was ready.
+# optional json keys: "hosts", "prefix" - subnet prefix for hosts outside WOL_SUBNETS,
+# "repeats", "timeout" - seconds to wait for the hosts
+@app.route('/room_wake/<string:room_code>', methods=['POST'])
+def room_wake(room_code):
+    data = request.get_json(silent=True) or {}
+    try:
+        prefix = json_number(data, 'prefix', conf.WOL_DEFAULT_PREFIX, int, 0, 32)
+        repeats = json_number(data, 'repeats', conf.WOL_REPEATS, int, 1, 100)
+        timeout = json_number(data, 'timeout', conf.WOL_READY_TIMEOUT, minimum=0)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT room_code FROM rooms WHERE room_code = %s', (room_code,))
+    if not cursor.fetchone():
+        conn.close()
+        return jsonify({'error': 'Room not found'}), 404
+
+    cursor.execute('SELECT host_address, host_mac, username, password FROM hosts WHERE room_code = %s', (room_code,))
+    rows = cursor.fetchall()
+    conn.close()
+
+    if data.get('hosts'):
+        rows = [row for row in rows if row[0] in data['hosts']]
+
+    # packets and broadcast addresses up front, hosts without a usable mac are reported and left out
+    targets, credentials, invalid = [], {}, {}
+    for host_address, host_mac, username, password in rows:
+        try:
+            targets.append(wol.WakeTarget(host_address, host_mac, wol_subnets, prefix))
+            credentials[host_address] = (username, password)
+        except (ValueError, TypeError) as e:
+            invalid[host_address] = {'state': wol.FAILED, 'error': str(e)}
+
+    def room_wake_job(job):
+        started = time.time()
+
+        def report(targets):
+            hosts = {target.host_address: target.as_dict() for target in targets}
+            hosts.update(invalid)
+            job.update({'hosts': hosts, 'ready': sum(1 for target in targets if target.state == wol.READY),
+                        'total': len(hosts)})
+
+        wol.send_bursts(targets, repeats, conf.WOL_REPEAT_INTERVAL, conf.WOL_PORT)
+        report(targets)
+
+        def probe(target):
+            username, password = credentials[target.host_address]
+            return host_monitor.probe(target.host_address, room_code, username, password)['state'] == UP
+
+        wol.wait_until_ready(targets, probe, timeout, conf.WOL_READY_POLL_INTERVAL, started, report)
+        report(targets)
+
+        return dict(job.progress, room_code=room_code, elapsed=round(time.time() - started, 1))
+
+    return host_job_response('room_wake', room_code, room_wake_job)
+
+
+
+# =========================================================================
+#  Host status - reachability of the room hosts from the background monitor
+#  state is up, down or unknown (not probed for two intervals); ?fresh=1 probes now
+# =========================================================================
+
+@app.route('/host_status/<string:room_code>/<string:host_address>', methods=['GET'])
+def host_status(room_code, host_address):
+    hosts = get_room_hosts(room_code, [host_address])
+    if hosts is None:
+        return jsonify({'error': 'Room not found'}), 404
+    elif not hosts:
+        return jsonify({'error': 'Host not found in the specified room'}), 404
+
+    if request.args.get('fresh', '').lower() in ('1', 'true', 'yes'):
+        username, password, _ = hosts[host_address]
+        return jsonify(host_monitor.probe(host_address, room_code, username, password)), 200
+
+    return jsonify(host_monitor.status(host_address)), 200
+
+@app.route('/host_status/<string:room_code>', methods=['GET'])
+def room_host_status(room_code):
+    hosts = get_room_hosts(room_code)
+    if hosts is None:
+        return jsonify({'error': 'Room not found'}), 404
+
+    if request.args.get('fresh', '').lower() in ('1', 'true', 'yes'):
+        statuses = host_monitor.probe_hosts([(host_address, room_code, username, password)
+                                             for host_address, (username, password, _) in hosts.items()])
+    else:
+        statuses = {host_address: host_monitor.status(host_address) for host_address in hosts}
+
+    states = [status['state'] for status in statuses.values()]
+    return jsonify({
+        'room_code': room_code,
+        'up': states.count(UP),
+        'down': states.count(DOWN),
+        'unknown': len(states) - states.count(UP) - states.count(DOWN),
+        'hosts': statuses,
+    }), 200
+
+
+
+# =========================================================================
+#  Content distribution
+#  files are uploaded once to the content store, then sent to every host of a room
+#  at once; each host's manifest lists what it already has, so only missing files go
+# =========================================================================
+
+@app.route('/content', methods=['POST'])
+def upload_content():
+    # multipart 'files' parts are spooled to disk, hashed on the way, and moved into the store
+    staged = []
+    _, _, files = parse_form_data(
+        request.environ, stream_factory=staging_stream_factory(content_store.staging_dir, staged))
+
+    stored = []
+    try:
+        for file in files.getlist('files'):
+            stored.append(content_store.add(file.stream.local_file(safe_name(file.filename))))
+    finally:
+        # anything not moved into the store (other fields, a failed move)
+        for staged_file in staged:
+            staged_file.discard()
+
+    if not stored:
+        return jsonify({'error': 'No files uploaded'}), 400
+
+    return jsonify({'content': stored}), 201
+
+@app.route('/content', methods=['GET'])
+def list_content():
+    return jsonify({'content': content_store.list()}), 200
+
+@app.route('/content/<string:sha256>', methods=['DELETE'])
+def delete_content(sha256):
+    item = content_store.remove(sha256.lower())
+    if item is None:
+        return jsonify({'error': 'Content not found'}), 404
+
+    return jsonify({'message': 'Content removed successfully', 'content': item}), 200
+
+# send stored content to every host in the room, json keys: "content" - sha256s or names,
+# optional "directory" - on the hosts ({username} is filled in), "hosts", "deadline",
+# "recheck" - ignore the manifests and check the files on the hosts
+@app.route('/room_content/<string:room_code>', methods=['POST'])
+def distribute_room_content(room_code):
+    data = request.get_json(silent=True) or {}
+
+    references = data.get('content')
+    if not references:
+        return jsonify({'error': 'Missing required field(s)'}), 400
+    try:
+        deadline = json_number(data, 'deadline', conf.CONTENT_HOST_DEADLINE, minimum=1)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if isinstance(references, str):
+        references = [references]
+
+    items = []
+    for reference in references:
+        item = content_store.get(reference)
+        if item is None:
+            return jsonify({'error': f'Content not found: {reference}'}), 404
+        items.append(item)
+
+    hosts = get_room_hosts(room_code, data.get('hosts'))
+    if hosts is None:
+        return jsonify({'error': 'Room not found'}), 404
+
+    directory_template = data.get('directory') or conf.CONTENT_HOST_DIRECTORY
+    recheck = str(data.get('recheck', False)).lower() in ('1', 'true', 'yes')
+    files = [content_store.local_file(item) for item in items]
+
+    def room_content_job(job):
+        progress = {}
+
+        def action(host_address, username, password, platform):
+            directory = directory_template.replace('{username}', username)
+            missing = files if recheck else content_store.missing(host_address, files, directory)
+            present = [{'file': local.name, 'size': local.size, 'sha256': local.sha256, 'status': 'present'}
+                       for local in files if local not in missing]
+
+            results = []
+            if missing:
+                def update(host_progress):
+                    progress[host_address] = host_progress
+                    job.update(progress)
+
+                with ssh_pool.lease() as ssh:
+                    ssh_connect(ssh, host_address, username, password)
+                    results = upload_files(ssh, missing, directory,
+                                           concurrency=conf.UPLOAD_CONCURRENCY, chunk_size=conf.UPLOAD_CHUNK_SIZE,
+                                           verify=VERIFY_HASH, callback=update)
+                content_store.record(host_address, directory, results)
+
+            failed = [result for result in results if result['status'] == FAILED]
+            if failed:
+                raise Exception(f"{len(failed)} of {len(files)} files failed: " +
+                                ', '.join(f"{result['file']} ({result['error']})" for result in failed))
+
+            return {'directory': directory, 'files': present + results}
+
+        outcomes = run_concurrently(hosts, action, deadline, conf.CONTENT_HOST_CONCURRENCY)
+        body, _ = summarise(outcomes, room_code=room_code)
+        return body
+
+    return host_job_response('room_content', room_code, room_content_job)
+
+# what each host in the room has been sent, from the manifests
+@app.route('/room_content/<string:room_code>', methods=['GET'])
+def room_content(room_code):
+    hosts = get_room_hosts(room_code)
+    if hosts is None:
+        return jsonify({'error': 'Room not found'}), 404
+
+    return jsonify({'room_code': room_code,
+                    'hosts': {host_address: content_store.manifest(host_address) for host_address in hosts}}), 200
+
+
+
+# =========================================================================
+#  Display status - power, source, volume and mute in one document
+#  fields come from the projector state cache, anything missing or expired (or
+#  everything with ?fresh=1) is read from the projector concurrently
+# =========================================================================
+
+@app.route('/display_status/<string:room_code>/<string:display_address>', methods=['GET'])
+def display_status(room_code, display_address):
+    displays = get_room_displays(room_code, [display_address])
+    if displays is None:
+        return jsonify({'error': 'Room not found'}), 404
+    elif not displays:
+        return jsonify({'error': 'Display not found in the specified room'}), 404
+
+    username, password = displays[display_address]
+    fresh = request.args.get('fresh', '').lower() in ('1', 'true', 'yes')
+
+    try:
+        status = projector_state.status(display_address, room_code, username, password, fresh)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify(status), 200
+
+@app.route('/display_status/<string:room_code>', methods=['GET'])
+def room_display_status(room_code):
+    displays = get_room_displays(room_code)
+    if displays is None:
+        return jsonify({'error': 'Room not found'}), 404
+
+    fresh = request.args.get('fresh', '').lower() in ('1', 'true', 'yes')
+
+    def action(display_address, username, password):
+        return projector_state.status(display_address, room_code, username, password, fresh)
+
+    outcomes = run_concurrently(displays, action, conf.ROOM_COMMAND_DEADLINE, conf.ROOM_COMMAND_CONCURRENCY)
+
+    # a display that failed outright still gets an entry, so the page can render every card
+    statuses = {}
+    for display_address, outcome in outcomes.items():
+        if outcome['ok']:
+            statuses[display_address] = outcome['result']
+        else:
+            statuses[display_address] = {'display_address': display_address, 'room_code': room_code,
+                                         'reachable': False, 'errors': {'display': outcome['error']}}
+
+    return jsonify({'room_code': room_code, 'displays': statuses}), 200
+
+# observed latency and the learned timeouts for a display, per request class
+@app.route('/display_latency/<string:room_code>/<string:display_address>', methods=['GET'])
+def display_latency(room_code, display_address):
+    displays = get_room_displays(room_code, [display_address])
+    if displays is None:
+        return jsonify({'error': 'Room not found'}), 404
+    elif not displays:
+        return jsonify({'error': 'Display not found in the specified room'}), 404
+
+    return jsonify({
+        'display_address': display_address,
+        'http': projector_latency.stats(display_address),
+        'escvp': escvp_latency.stats(display_address),
+    }), 200
+
+
+
+# =========================================================================
+#  ESC/VP21 projector access through the epson_projector library
+#  "type" selects the transport: http (cgi-bin json_query/directsend), tcp (ESC/VP.net) or serial
+# =========================================================================
+
+# returns an error response for a bad projector type or command, None if the request is ok
+def check_escvp_request(type, command):
+    if type not in (HTTP, TCP, SERIAL):
+        return jsonify({'error': f'Invalid type: {type}'}), 400
+    if not command:
+        return jsonify({'error': 'command is required'}), 400
+    if type == HTTP and command not in EPSON_KEY_COMMANDS:
+        return jsonify({'error': f'Invalid command: {command}'}), 400
+    return None
+
+@app.route('/projector_property/<string:room_code>/<string:display_address>/<string:command>', methods=['GET'])
+def get_projector_property(room_code, display_address, command):
+    displays = get_room_displays(room_code, [display_address])
+    if displays is None:
+        return jsonify({'error': 'Room not found'}), 404
+    elif not displays:
+        return jsonify({'error': 'Display not found in the specified room'}), 404
+
+    type = request.args.get('type', HTTP)
+    error_response = check_escvp_request(type, command)
+    if error_response:
+        return error_response
+
+    try:
+        value = projector_loop.get_property(display_address, command, type)
+    except ProjectorLoopError as e:
+        return jsonify({'error': str(e)}), 504
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify({'command': command, 'value': value}), 200
+
+@app.route('/projector_properties/<string:room_code>/<string:display_address>', methods=['GET'])
+def get_projector_properties(room_code, display_address):
+    displays = get_room_displays(room_code, [display_address])
+    if displays is None:
+        return jsonify({'error': 'Room not found'}), 404
+    elif not displays:
+        return jsonify({'error': 'Display not found in the specified room'}), 404
+
+    type = request.args.get('type', HTTP)
+    default_commands = 'PWR,SOURCE,CMODE,VOLUME' if type == HTTP else 'PWR,SOURCE,CMODE,VOL,MUTE'
+    commands = [command for command in request.args.get('commands', default_commands).split(',') if command]
+    if not commands:
+        return jsonify({'error': 'commands is required'}), 400
+    for command in commands:
+        error_response = check_escvp_request(type, command)
+        if error_response:
+            return error_response
+
+    try:
+        snapshot = projector_loop.get_properties(display_address, commands, type)
+    except ProjectorLoopError as e:
+        return jsonify({'error': str(e)}), 504
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify(dict(snapshot, display_address=display_address, type=type)), 200
+
+@app.route('/projector_command/<string:room_code>/<string:display_address>', methods=['POST'])
+def send_projector_escvp_command(room_code, display_address):
+    displays = get_room_displays(room_code, [display_address])
+    if displays is None:
+        return jsonify({'error': 'Room not found'}), 404
+    elif not displays:
+        return jsonify({'error': 'Display not found in the specified room'}), 404
+
+    data = request.get_json() or {}
+    type = data.get('type', HTTP)
+    command = data.get('command')
+    error_response = check_escvp_request(type, command)
+    if error_response:
+        return error_response
+
+    try:
+        # mid warm-up/cool-down the projector rejects commands, and behind a long lock window (e.g.
+        # PWR ON) the command would still be sent after this request gave up - queue it either way
+        power = projector_loop.power_state(display_address, type)
+        if power['state'] in (POWER_WARMING, POWER_COOLING) or power['wait'] >= projector_loop.timeout:
+            queue_depth = projector_loop.queue_command(display_address, command, type)
+            return jsonify({'message': 'Command queued until the projector is ready', 'power': power['state'],
+                            'eta': power['eta'] if power['eta'] is not None else power['wait'],
+                            'queue_depth': queue_depth}), 202
+
+        # a shorter wait is covered by the deadline, so a 504 means the projector did not answer
+        response = projector_loop.send_command(display_address, command, type,
+                                               timeout=projector_loop.timeout + power['wait'])
+    except ProjectorLoopError as e:
+        return jsonify({'error': str(e)}), 504
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    if response is False or response is None:
+        return jsonify({'error': 'Command failed'}), 500
+    return jsonify({'message': 'Command sent successfully', 'queue_depth': projector_loop.queue_depth(display_address, type)}), 200
+
+# predicted power state (off, warming, on, cooling, unknown) and seconds left in a transition
+@app.route('/projector_power_state/<string:room_code>/<string:display_address>', methods=['GET'])
+def get_projector_power_state(room_code, display_address):
+    displays = get_room_displays(room_code, [display_address])
+    if displays is None:
+        return jsonify({'error': 'Room not found'}), 404
+    elif not displays:
+        return jsonify({'error': 'Display not found in the specified room'}), 404
+
+    type = request.args.get('type', HTTP)
+    if type not in (HTTP, TCP, SERIAL):
+        return jsonify({'error': f'Invalid type: {type}'}), 400
+
+    try:
+        power = projector_loop.power_state(display_address, type)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify(dict(power, display_address=display_address, type=type)), 200
+
+@app.route('/room_projector_property/<string:room_code>/<string:command>', methods=['GET'])
+def get_room_projector_property(room_code, command):
+    displays = get_room_displays(room_code)
+    if displays is None:
+        return jsonify({'error': 'Room not found'}), 404
+
+    type = request.args.get('type', HTTP)
+    error_response = check_escvp_request(type, command)
+    if error_response:
+        return error_response
+
+    # every display is queried at once on the loop, each with its own deadline
+    values = projector_loop.get_property_many(displays, command, type, conf.ROOM_COMMAND_DEADLINE)
+
+    results = {}
+    for display_address, value in values.items():
+        if isinstance(value, Exception):
+            results[display_address] = {'ok': False, 'error': str(value)}
+        else:
+            results[display_address] = {'ok': True, 'value': value}
+
+    return jsonify({'room_code': room_code, 'command': command, 'results': results}), 200
+
+
+
+# =========================================================================
+#  Display capabilities and generic commands
+#  which api families a display has is probed once and kept with the display record,
+#  generic commands are then sent straight to an endpoint the display supports
+# =========================================================================
+
+@app.route('/display_capabilities/<string:room_code>/<string:display_address>', methods=['GET'])
+def get_display_capabilities(room_code, display_address):
+    displays = get_room_displays(room_code, [display_address])
+    if displays is None:
+        return jsonify({'error': 'Room not found'}), 404
+    elif not displays:
+        return jsonify({'error': 'Display not found in the specified room'}), 404
+
+    username, password = displays[display_address]
+    refresh = request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+
+    try:
+        capabilities = projector_capabilities.get(display_address, username, password, refresh)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify(capabilities), 200
+
+@app.route('/display_command/<string:room_code>/<string:display_address>', methods=['PUT'])
+def display_command(room_code, display_address):
+    displays = get_room_displays(room_code, [display_address])
+    if displays is None:
+        return jsonify({'error': 'Room not found'}), 404
+    elif not displays:
+        return jsonify({'error': 'Display not found in the specified room'}), 404
+
+    username, password = displays[display_address]
+
+    data = request.get_json() or {}
+    command = data.get('command')
+    value = data.get('value')
+    if command is None or value is None:
+        return jsonify({'error': 'command and value are required'}), 400
+
+    try:
+        capabilities = projector_capabilities.get(display_address, username, password)
+        method, endpoint_url, kwargs = projector_capabilities.build_request(capabilities, command, value)
+    except (UnsupportedCommandError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    try:
+        result = send_projector_command(display_address, username, password, method, endpoint_url, **kwargs)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    projector_state.refresh_soon(display_address, room_code, username, password)
+    return jsonify({'message': 'Command sent successfully', 'endpoint': endpoint_url, 'response': result}), 200
+
+
+
 current_directory = os.path.dirname(os.path.abspath(__file__))
 chrome_driver_path = os.path.join(current_directory, 'chromedriver')
 
 # Initialize an empty list to store host data
 app.config['pdu_data'] = None
 
+# held while the PDU webdrivers are being (re)connected, so a request arriving
+# mid-reconnect waits for that result instead of launching a second set of drivers
+import threading
+pdu_connect_lock = threading.Lock()
+
+# record a connected PDU's outlet states in the device snapshot
+def snapshot_pdu(pdu, **values):
+    device_snapshot.update(PDUS, pdu.hostAddress, room_code=pdu.room_code, outlet_states=dict(pdu.outlet_states), **values)
+
 # Helper function to create and cache devices
 def get_or_create_devices():
     pdu_data = app.config.get('pdu_data')
@@ -2689,6 +3970,15 @@ def get_or_create_devices():
     if pdu_data is not None and len(pdu_data) > 0:
         return pdu_data
 
+    with pdu_connect_lock:
+        # another request may have finished connecting while we waited
+        pdu_data = app.config.get('pdu_data')
+        if pdu_data is not None and len(pdu_data) > 0:
+            return pdu_data
+
+        return connect_devices()
+
+def connect_devices():
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -2738,6 +4028,7 @@ def get_or_create_devices():
         try:
             new_pdu.connect()
             devices.append(new_pdu)
+            snapshot_pdu(new_pdu)
         except Exception as e:
             pass
 
@@ -2751,13 +4042,39 @@ def get_or_create_devices():
 @app.before_first_request
 def before_first_request():
     print("on first run...")
+
+    # load last-known device state so routes can answer while devices reconnect
+    logger.info("testing.... on first run, load device snapshot..")
+    device_snapshot.load()
+    device_snapshot.start()
+
     logger.info("testing.... on first run, init db..")
     init_db()
     
-    # load and init any pdus form db
-    logger.info("testing.... on first run, load init pdus...")
-    app.config['pdu_data'] = get_or_create_devices()
-    logger.info(f"load_pdu.... app.config[pdu_data] is: {app.config['pdu_data']}") 
+    # load and init any pdus form db - in the background, routes serve the snapshot meanwhile
+    logger.info("testing.... on first run, load init pdus in background...")
+    gevent.spawn(get_or_create_devices)
+
+    # keep projector power/source/volume/mute cached for the GET routes
+    logger.info("testing.... on first run, start projector state poller...")
+    projector_state.start()
+
+    # learned projector timeouts from before the restart, saved with the snapshot interval
+    projector_latency.load(conf.PROJECTOR_LATENCY_PATH)
+    escvp_latency.load(conf.ESCVP_LATENCY_PATH)
+    gevent.spawn(save_projector_latency_periodically)
+
+    # keep the session ids of recently used hosts fresh so desktop actions skip qwinsta
+    session_ids.start()
+
+    # accept host agent connections (only if AGENT_TOKEN is set)
+    host_agents.start()
+
+    # stored content and what each host has already been sent
+    content_store.load()
+
+    # probe the hosts' ssh ports so room status and room actions know who is up
+    host_monitor.start()
 
 #def get_db_connection(database='/home/innovation-hub-api/persistent/db/container2/IH_device_database.db'):                    
 #    conn = sqlite3.connect(database)
@@ -2853,36 +4170,29 @@ def connect_samba_share_route():
 
         ssh_username, ssh_password = host_data
 
-        # Create a new SSH client object
-        client = paramiko.SSHClient()
+        def connect_samba_share_job(job):
+            # Lease a pooled SSH connection, closing it returns it to the pool
+            client = ssh_pool.lease()
 
-        # Automatically add the remote host key (not recommended for production use)
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            # Connect to the remote host using SSH
+            ssh_connect(client, hostname, ssh_username, ssh_password)
 
-        # Connect to the remote host using SSH
-        client.connect(hostname, username=ssh_username, password=ssh_password)
+            # Call the connect_and_map_samba_share function with the SSH client object
+            # NOTE: connect_and_map_samba_share function handles closing of client object
+            result = connect_and_map_samba_share(
+                client, samba_username, samba_password, share_path
+            )
 
-        # Call the connect_and_map_samba_share function with the SSH client object
-        # NOTE: connect_and_map_samba_share function handles closing of client object
-        result = connect_and_map_samba_share(
-            client, samba_username, samba_password, share_path
-        )
+            # Check if the mapping was successful
+            if result.get('drive_letter') is None:
+                raise Exception(result.get('error', 'Unexpected response from connect_and_map_samba_share'))
+            return {'message': result['message'], 'drive_letter': result['drive_letter']}
 
-        # Check if the mapping was successful
-        if 'drive_letter' in result:
-            if result['drive_letter'] is not None:
-                return jsonify({'message': result['message'], 'drive_letter': result['drive_letter']}), 200
-            else:
-                return jsonify({'error': result['error']}), 500
-        else:
-            return jsonify({'error': 'Unexpected response from connect_and_map_samba_share'}), 500
+        return host_job_response('connect_samba_share', hostname, connect_samba_share_job)
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-import socket
-from ipaddress import IPv4Network
-
 def is_valid_mac_address(mac_address):
     # A simple validation function for MAC addresses
     if not mac_address:
@@ -2902,33 +4212,8 @@ def is_valid_mac_address(mac_address):
     logger.info(f"testing.... in is_valid_mac_address, mac_address OK.")
     return True
 
-def send_magic_packet(mac_address, broadcast_address):
-    logger.info(f"testing.... in send_magic_packet, mac_address: {mac_address}")
-    logger.info(f"testing.... in send_magic_packet, broadcast_address: {broadcast_address}")
-
-    # Create a Magic Packet
-    mac_bytes = bytes.fromhex(mac_address.replace(':', '').replace('-', ''))
-    magic_packet = b'\xFF' * 6 + mac_bytes * 16
-    
-    logger.info(f"testing.... in send_magic_packet, mac_bytes: {mac_bytes}")
-    logger.info(f"testing.... in send_magic_packet, magic_packet: {magic_packet}")
-    
-    # Send the Magic Packet to the broadcast address
-    try:
-        logger.info(f"testing.... in send_magic_packet, sending1...")
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-            s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-            logger.info(f"testing.... in send_magic_packet, sending2...")
-            s.sendto(magic_packet, (broadcast_address, 9))  # Replace with the actual broadcast address
-            logger.info(f"testing.... in send_magic_packet, sending3...")
-        return True
-    except Exception as e:
-        #print(f"Error sending Magic Packet: {str(e)}")
-        logger.info(f"Error sending Magic Packet: {str(e)}")
-        return False
-    
-
-from ipaddress import IPv4Network
+# subnets the hosts are on, their broadcast addresses are used for the magic packets
+wol_subnets = wol.parse_subnets(conf.WOL_SUBNETS)
 
 @app.route('/wake-on-lan/<string:room_code>/<string:host_address>', methods=['GET'])
 def wake_on_lan(room_code, host_address):
@@ -2975,19 +4260,17 @@ def wake_on_lan(room_code, host_address):
         logger.info(f"wake-on-lan is_valid_mac_address is {is_valid_mac_address}")
         return jsonify({'error': f'Invalid MAC address: {host_mac}'}), 400
         
-    # Calculate the broadcast address based on the host_address
+    # Calculate the broadcast address from the subnet the host is on (WOL_SUBNETS, else WOL_DEFAULT_PREFIX)
     try:
         logger.info(f"wake-on-lan trying to send {host_address} a wake up packet")
-        host_ip = IPv4Network(f'{host_address}/24', strict=False)
-        logger.info(f"wake-on-lan host_ip {host_ip}")
-        broadcast_address = str(host_ip.broadcast_address)
-        logger.info(f"wake-on-lan broadcast_address {broadcast_address}")
-        logger.info(f"testing.... in wake_on_lan, broadcast_address: {broadcast_address}")
+        target = wol.WakeTarget(host_address, host_mac, wol_subnets, conf.WOL_DEFAULT_PREFIX)
+        logger.info(f"wake-on-lan broadcast_address {target.broadcast}")
     except ValueError:
         return jsonify({'error': 'Invalid host address'}), 400
 
-    # Send the Magic Packet
-    if send_magic_packet(host_mac, broadcast_address):
+    # Send the Magic Packet, a few times as a single broadcast is easily lost
+    wol.send_bursts([target], conf.WOL_REPEATS, conf.WOL_REPEAT_INTERVAL, conf.WOL_PORT)
+    if target.packets_sent:
         return jsonify({'status': 'Magic Packet sent successfully'}), 200
     else:
         return jsonify({'error': 'Failed to send Magic Packet'}), 500
@@ -3058,13 +4341,11 @@ def open_browser(room_code, host_address):
     #password = host_data['password']
     url = data.get('url')
 
-    # Open PowerPoint on the remote device using the retrieved credentials and URL
-    result = run_browser(host_address, username, password, url)
+    # Open PowerPoint on the remote device using the retrieved credentials and URL, as a background job
+    def open_browser_job(job):
+        return host_result(run_browser(host_address, username, password, url))
 
-    if result is None:
-        return jsonify({'error': 'Backend function failed'}), 500
-    else:
-        return jsonify({'response': result}), 200
+    return host_job_response('open_browser', host_address, open_browser_job)
         
 @app.route('/sim_mouse_click/<string:room_code>/<string:host_address>', methods=['GET'])
 def sim_mouse_click(room_code, host_address):
@@ -3305,7 +4586,6 @@ def open_application(room_code, host_address):
     else:
         return jsonify({'response': result}), 200
     
-from pathlib import Path
 
 def normalize_windows_path(path):
     # Replace common path separators with a single backslash for Windows
@@ -3381,12 +4661,11 @@ def open_vlc_video(room_code, host_address):
             arguments += ' --loop'
 
         logger.info(f"testing.... in open_vlc_video, arguments: {arguments}")
-        result = run_vlc_application(host_address, username, password, vlc_executable, arguments=arguments,video=video_path)
-        
-        if result is None:
-            return jsonify({'error': 'Failed to open VLC or play video'}), 500
-        else:
-            return jsonify({'response': result}), 200
+
+        def open_vlc_job(job):
+            return host_result(run_vlc_application(host_address, username, password, vlc_executable, arguments=arguments,video=video_path))
+
+        return host_job_response('open_vlc_video', host_address, open_vlc_job)
     else:
         return jsonify({'error': 'Unsupported application'}), 400
 
@@ -3733,6 +5012,8 @@ def remove_device(room_code, pdu_address):
     cursor.execute('DELETE FROM pdus WHERE pdu_address = %s AND room_code = %s', (pdu_address, room_code))
     conn.commit()
     conn.close()
+
+    device_snapshot.remove(PDUS, pdu_address)
     
     print("Host removed from the database.")
 
@@ -3802,6 +5083,9 @@ def view_outlet_settings(room_code):
     if app.config['pdu_data'] is not None:
         # There is data in app.config['pdu_data']
         pdus = app.config['pdu_data']
+    elif pdu_connect_lock.locked():
+        # PDUs are still reconnecting after a restart, answer with last-known outlet states
+        return view_outlet_settings_snapshot(room_code)
     else:
         # app.config['pdu_data'] is None, so it's not populated with data
         pdus = get_or_create_devices()
@@ -3839,6 +5123,7 @@ def view_outlet_settings(room_code):
             pdu_in_config = pdus_by_address[pdu_address]
             # Fetch outlet settings or other information about the device if needed
             pdu_outlet_info = pdu_in_config.get_outlet_info()
+            snapshot_pdu(pdu_in_config)
             pdu_outlet_settings = {
                 'device_number': index + 1,
                 'pdu_address': pdu_address,
@@ -3848,6 +5133,25 @@ def view_outlet_settings(room_code):
             
     return jsonify(pdu_outlet_settings_all)
 
+# outlet settings for a room from the device snapshot, used while PDUs reconnect
+def view_outlet_settings_snapshot(room_code):
+    pdu_records = device_snapshot.get_section(PDUS, room_code)
+
+    if len(pdu_records) < 1:
+        return jsonify({'message': 'PDUs are reconnecting, no last-known state available yet.'}), 200
+
+    pdu_outlet_settings_all = []
+    for index, (pdu_address, record) in enumerate(pdu_records.items()):
+        pdu_outlet_settings_all.append({
+            'device_number': index + 1,
+            'pdu_address': pdu_address,
+            'outlet_settings': record.get('outlet_states'),
+            'stale': record['stale'],
+            'updated': record['updated']
+        })
+
+    return jsonify(pdu_outlet_settings_all)
+
 @app.route('/view_pdu_outlet_settings_all/', methods=['GET'])
 def view_outlet_settings_all():        
     pdus = None        
@@ -3929,10 +5233,17 @@ def view_outlet_settings_all_old():
 
 @app.route('/view_all_pdu_settings/<string:room_code>/<string:pdu_address>', methods=['GET'])
 def view_all_pdu_settings(room_code, pdu_address):
-    devices = None        
+    devices = None
     if app.config['pdu_data'] is not None:
         # There is data in app.config['pdu_data']
         devices = app.config['pdu_data']
+    elif pdu_connect_lock.locked():
+        # PDUs are still reconnecting after a restart, answer with last-known settings if cached
+        last_known = device_snapshot.get(PDUS, pdu_address)
+        if last_known and last_known.get('room_code') == room_code and last_known.get('settings'):
+            system_settings = dict(last_known['settings'], stale=True, updated=last_known['updated'])
+            return jsonify(system_settings)
+        devices = get_or_create_devices()
     else:
         # app.config['pdu_data'] is None, so it's not populated with data
         devices = get_or_create_devices()
@@ -3950,6 +5261,7 @@ def view_all_pdu_settings(room_code, pdu_address):
     # You can use the selected_device to retrieve system settings or other information
     # Here you can customize the response based on your requirements
     system_settings = selected_device.get_all_info()
+    snapshot_pdu(selected_device, settings=system_settings)
 
     return jsonify(system_settings)
 
@@ -4365,41 +5677,71 @@ def change_time_settings(room_code, pdu_address):
 # When the server receives this request, it will receive the hostname, username, password, and directory values as JSON-encoded data in the request body, and the image files will be included as binary data in the multipart/form-data encoded request body.
 #
 # You can adjust the files list to include as many files as you need to upload, and you can adjust the filenames and content types to match the actual filenames and content types of the files you're uploading.
-from pathlib import Path
 @app.route('/upload_images', methods=['POST'])
 def upload_images():
-    data = request.get_json()
+    # the fields come as form data alongside the files in a multipart request, file parts are
+    # streamed to spool files on disk (hashed on the way) rather than read into memory
+    staged = []
+    if request.is_json:
+        data, files = request.get_json(), {}
+    else:
+        _, data, files = parse_form_data(
+            request.environ, stream_factory=staging_stream_factory(conf.UPLOAD_STAGING_DIR, staged))
+
+    def discard_staged():
+        for staged_file in staged:
+            staged_file.discard()
+
     if not all(key in data for key in ['hostname', 'username', 'password', 'directory']):
+        discard_staged()
         return jsonify({'error': 'Missing required field(s)'}), 400
 
-    # Extract the list of image files from the request.
-    files = request.files.getlist('images')
+    hostname = data['hostname']
+    username = data['username']
+    password = data['password']
+    directory = data['directory']
+    verify = data.get('verify', conf.UPLOAD_VERIFY)
+    if verify not in VERIFY_MODES:
+        discard_staged()
+        return jsonify({'error': f"verify must be one of {', '.join(VERIFY_MODES)}"}), 400
+
+    # Extract the list of image files from the request, one per name
+    uploads = {}
+    for file in files.getlist('images') if files else []:
+        name = safe_name(file.filename)
+        uploads[name] = file.stream.local_file(name)
+
+    def upload_images_job(job):
+        try:
+            # SSH into the Windows PC over a pooled Paramiko connection.
+            with ssh_pool.lease() as ssh:
+                ssh_connect(ssh, hostname, username, password)
 
-    # SSH into the Windows PC using Paramiko.
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    ssh.connect(data['hostname'], username=data['username'], password=data['password'])
+                # Upload the image files to the specified directory path, several at once over the one connection
+                results = upload_files(ssh, list(uploads.values()), directory,
+                                       concurrency=conf.UPLOAD_CONCURRENCY, chunk_size=conf.UPLOAD_CHUNK_SIZE,
+                                       verify=verify, callback=job.update)
+        finally:
+            discard_staged()
 
-    # Upload the image files to the specified directory path.
-    sftp = ssh.open_sftp()
-    for file in files:
-        remote_path = Path(data['directory']) / file.filename
-        sftp.put(file, str(remote_path))
+        failed = [result for result in results if result['status'] == FAILED]
+        if failed:
+            job.update({'files': results})
+            raise Exception(f"{len(failed)} of {len(results)} files failed: " +
+                            ', '.join(f"{result['file']} ({result['error']})" for result in failed))
 
-    sftp.close()
-    ssh.close()
+        return {'message': 'Images uploaded successfully.', 'files': results}
 
-    return jsonify({'message': 'Images uploaded successfully.'}), 200
+    return host_job_response('upload_images', hostname, upload_images_job)
 
 # turn down volume using paramiko
 def turn_down_volume(hostname, username, password):
-    # Create an SSH client
-    client = paramiko.SSHClient()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    # Lease a pooled SSH connection, closing it returns it to the pool
+    client = ssh_pool.lease()
 
     try:
         # Connect to the remote Windows computer
-        client.connect(hostname, username=username, password=password)
+        ssh_connect(client, hostname, username, password)
 
         # Send the command to turn down the volume
         command = "nircmd.exe changesysvolume -2000"
@@ -4421,13 +5763,12 @@ def turn_down_volume(hostname, username, password):
 # set/change volume using paramiko
 # to use: change_volume('hostname', 'username', 'password', 'mute')
 def change_volume(hostname, username, password, action, step=2000):
-    # Create an SSH client
-    client = paramiko.SSHClient()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    # Lease a pooled SSH connection, closing it returns it to the pool
+    client = ssh_pool.lease()
 
     try:
         # Connect to the remote Windows computer
-        client.connect(hostname, username=username, password=password)
+        ssh_connect(client, hostname, username, password)
 
         # Send the command to change the volume
         if action == 'down':
@@ -42,3 +42,186 @@ else:
 
 logger.debug(f'SQL_LOGGING: {SQL_VERBOSE}')
 
+
+# warm-restart device state snapshot - stored on the persistent volume
+SNAPSHOT_PATH = os.environ.get('SNAPSHOT_PATH', '/home/innovation-hub-api/persistent/db/container2/device_snapshot.json.gz')
+
+# how often (seconds) the device state snapshot is written to disk
+SNAPSHOT_INTERVAL = int(os.environ.get('SNAPSHOT_INTERVAL', 60))
+
+# projector HTTP sessions - keep-alive connections per display
+PROJECTOR_POOL_SIZE = int(os.environ.get('PROJECTOR_POOL_SIZE', 2))
+
+# max displays holding open sessions, least recently used are closed first
+PROJECTOR_MAX_SESSIONS = int(os.environ.get('PROJECTOR_MAX_SESSIONS', 64))
+
+# seconds before an unused projector session is closed
+PROJECTOR_SESSION_IDLE = int(os.environ.get('PROJECTOR_SESSION_IDLE', 120))
+
+# default timeout (seconds) for a projector HTTP request
+PROJECTOR_HTTP_TIMEOUT = float(os.environ.get('PROJECTOR_HTTP_TIMEOUT', 10))
+
+# projector volume - INC/DEC steps sent concurrently per burst
+PROJECTOR_VOLUME_BURST = int(os.environ.get('PROJECTOR_VOLUME_BURST', 4))
+
+# seconds a believed volume is trusted before it is read from the projector again
+PROJECTOR_VOLUME_TRUST = int(os.environ.get('PROJECTOR_VOLUME_TRUST', 30))
+
+# max seconds a set_projector_volume request waits for the volume to converge
+PROJECTOR_VOLUME_TIMEOUT = float(os.environ.get('PROJECTOR_VOLUME_TIMEOUT', 30))
+
+# projector state poller - seconds between polls of every display
+PROJECTOR_POLL_INTERVAL = int(os.environ.get('PROJECTOR_POLL_INTERVAL', 30))
+
+# max age (seconds) of cached projector state served by the GET routes
+PROJECTOR_STATE_MAX_AGE = int(os.environ.get('PROJECTOR_STATE_MAX_AGE', 60))
+
+# delay (seconds) before a display is re-read after a write through the api
+PROJECTOR_REFRESH_DELAY = float(os.environ.get('PROJECTOR_REFRESH_DELAY', 1))
+
+# displays polled at once
+PROJECTOR_POLL_CONCURRENCY = int(os.environ.get('PROJECTOR_POLL_CONCURRENCY', 10))
+
+# room-wide commands - seconds each device gets before it is reported as timed out
+ROOM_COMMAND_DEADLINE = float(os.environ.get('ROOM_COMMAND_DEADLINE', 15))
+
+# room-wide commands - devices contacted at once
+ROOM_COMMAND_CONCURRENCY = int(os.environ.get('ROOM_COMMAND_CONCURRENCY', 20))
+
+# room-wide host actions - seconds each host gets before it is reported as timed out
+ROOM_HOST_DEADLINE = float(os.environ.get('ROOM_HOST_DEADLINE', 30))
+
+# room-wide host actions - hosts contacted over ssh at once
+ROOM_HOST_CONCURRENCY = int(os.environ.get('ROOM_HOST_CONCURRENCY', 20))
+
+# epson_projector library - seconds a route waits on the projector loop thread
+PROJECTOR_LOOP_TIMEOUT = float(os.environ.get('PROJECTOR_LOOP_TIMEOUT', 15))
+
+# epson_projector library - factor applied to its per-command timeouts (slow projectors)
+PROJECTOR_TIMEOUT_SCALE = float(os.environ.get('PROJECTOR_TIMEOUT_SCALE', 1.0))
+
+# adaptive projector timeouts - latency learned per display, kept on the persistent volume
+PROJECTOR_LATENCY_PATH = os.environ.get('PROJECTOR_LATENCY_PATH', '/home/innovation-hub-api/persistent/db/container2/projector_latency.json')
+
+# latency learned by the epson_projector library (ESC/VP21 over HTTP, TCP or serial)
+ESCVP_LATENCY_PATH = os.environ.get('ESCVP_LATENCY_PATH', '/home/innovation-hub-api/persistent/db/container2/escvp_latency.json')
+
+# learned timeout = observed p99 latency x this margin
+PROJECTOR_TIMEOUT_MARGIN = float(os.environ.get('PROJECTOR_TIMEOUT_MARGIN', 1.5))
+
+# floor/ceiling (seconds) of the learned timeout for projector queries
+PROJECTOR_QUERY_TIMEOUT_MIN = float(os.environ.get('PROJECTOR_QUERY_TIMEOUT_MIN', 1))
+PROJECTOR_QUERY_TIMEOUT_MAX = float(os.environ.get('PROJECTOR_QUERY_TIMEOUT_MAX', 10))
+
+# floor/ceiling (seconds) of the learned timeout for projector commands
+PROJECTOR_COMMAND_TIMEOUT_MIN = float(os.environ.get('PROJECTOR_COMMAND_TIMEOUT_MIN', 2))
+PROJECTOR_COMMAND_TIMEOUT_MAX = float(os.environ.get('PROJECTOR_COMMAND_TIMEOUT_MAX', 15))
+
+# floor/ceiling (seconds) of the learned timeout for projector power on/off
+PROJECTOR_POWER_TIMEOUT_MIN = float(os.environ.get('PROJECTOR_POWER_TIMEOUT_MIN', 5))
+PROJECTOR_POWER_TIMEOUT_MAX = float(os.environ.get('PROJECTOR_POWER_TIMEOUT_MAX', 30))
+
+# host ssh connections - max kept open, least recently used are closed first
+SSH_POOL_MAX_CONNECTIONS = int(os.environ.get('SSH_POOL_MAX_CONNECTIONS', 64))
+
+# seconds before an unused host ssh connection is closed
+SSH_IDLE_TIMEOUT = int(os.environ.get('SSH_IDLE_TIMEOUT', 300))
+
+# seconds between ssh keepalive packets on open host connections
+SSH_KEEPALIVE = int(os.environ.get('SSH_KEEPALIVE', 30))
+
+# seconds allowed for an ssh connect/handshake/auth to a host
+SSH_CONNECT_TIMEOUT = float(os.environ.get('SSH_CONNECT_TIMEOUT', 10))
+
+# a connection idle for longer than this (seconds) is checked before it is reused
+SSH_HEALTH_CHECK_AFTER = int(os.environ.get('SSH_HEALTH_CHECK_AFTER', 60))
+
+# seconds a cached interactive session id is used before qwinsta is run again
+SESSION_ID_TTL = int(os.environ.get('SESSION_ID_TTL', 300))
+
+# seconds between background refreshes of the session ids of recently used hosts
+SESSION_ID_REFRESH_INTERVAL = int(os.environ.get('SESSION_ID_REFRESH_INTERVAL', 120))
+
+# hosts with no desktop action for this long (seconds) drop out of the refresh
+SESSION_ID_ACTIVE_WINDOW = int(os.environ.get('SESSION_ID_ACTIVE_WINDOW', 1800))
+
+# background jobs - jobs run at once, across all hosts
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 10))
+
+# background jobs - jobs run at once on one host, the rest wait their turn
+JOB_PER_HOST = int(os.environ.get('JOB_PER_HOST', 1))
+
+# background jobs - seconds a finished job is kept for /jobs/<job_id>
+JOB_RETENTION = int(os.environ.get('JOB_RETENTION', 3600))
+
+# background jobs - seconds a route called with ?wait=1 waits before answering 202
+JOB_WAIT_TIMEOUT = float(os.environ.get('JOB_WAIT_TIMEOUT', 50))
+
+# host agents - shared secret the agents authenticate with, empty disables the agent port
+AGENT_TOKEN = os.environ.get('AGENT_TOKEN', '')
+
+# host agents - port the agents connect to
+AGENT_PORT = int(os.environ.get('AGENT_PORT', 7070))
+
+# host agents - seconds a command may take before it is reported as failed
+AGENT_COMMAND_TIMEOUT = float(os.environ.get('AGENT_COMMAND_TIMEOUT', 10))
+
+# host agents - seconds between pings, an agent that misses one is dropped
+AGENT_HEARTBEAT = int(os.environ.get('AGENT_HEARTBEAT', 30))
+
+# uploads - directory multipart file parts are spooled to before they go to the host
+UPLOAD_STAGING_DIR = os.environ.get('UPLOAD_STAGING_DIR', '/tmp/innovation-hub-uploads')
+
+# uploads - files sent to a host at once, each on its own sftp channel of one connection
+UPLOAD_CONCURRENCY = int(os.environ.get('UPLOAD_CONCURRENCY', 4))
+
+# uploads - bytes per pipelined sftp write
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 1024 * 1024))
+
+# uploads - skip files already on the host when 'hash' (size and sha256), 'size' matches, or 'none'
+UPLOAD_VERIFY = os.environ.get('UPLOAD_VERIFY', 'hash')
+
+# content distribution - files uploaded once and sent to room hosts, kept on the persistent volume
+CONTENT_STORE_DIR = os.environ.get('CONTENT_STORE_DIR', '/home/innovation-hub-api/persistent/db/container2/content')
+
+# content distribution - directory on each host the files go to, {username} is the host's user
+CONTENT_HOST_DIRECTORY = os.environ.get('CONTENT_HOST_DIRECTORY', 'C:/Users/{username}/Videos')
+
+# content distribution - hosts of a room sent files at once
+CONTENT_HOST_CONCURRENCY = int(os.environ.get('CONTENT_HOST_CONCURRENCY', 10))
+
+# content distribution - seconds a host may take to receive its files
+CONTENT_HOST_DEADLINE = float(os.environ.get('CONTENT_HOST_DEADLINE', 1800))
+
+# host monitor - seconds between reachability probes of every host
+HOST_MONITOR_INTERVAL = int(os.environ.get('HOST_MONITOR_INTERVAL', 30))
+
+# host monitor - seconds a tcp connect to the ssh port may take
+HOST_MONITOR_TIMEOUT = float(os.environ.get('HOST_MONITOR_TIMEOUT', 3))
+
+# host monitor - hosts probed at once
+HOST_MONITOR_CONCURRENCY = int(os.environ.get('HOST_MONITOR_CONCURRENCY', 50))
+
+# host monitor - ssh port probed on each host
+HOST_MONITOR_PORT = int(os.environ.get('HOST_MONITOR_PORT', 22))
+
+# host monitor - command run over ssh once the port answers (e.g. 'echo ok'), empty for the port check only
+HOST_MONITOR_COMMAND = os.environ.get('HOST_MONITOR_COMMAND', '')
+
+# wake-on-lan - subnets the hosts are on, comma separated cidrs (e.g. '192.168.128.0/22'), each host's
+# magic packet goes to the broadcast address of the one it is in
+WOL_SUBNETS = os.environ.get('WOL_SUBNETS', '')
+
+# wake-on-lan - prefix length used for hosts outside WOL_SUBNETS
+WOL_DEFAULT_PREFIX = int(os.environ.get('WOL_DEFAULT_PREFIX', 24))
+
+# wake-on-lan - udp port the magic packets are sent to
+WOL_PORT = int(os.environ.get('WOL_PORT', 9))
+
+# wake-on-lan - bursts of packets sent to every host, and seconds between them
+WOL_REPEATS = int(os.environ.get('WOL_REPEATS', 3))
+WOL_REPEAT_INTERVAL = float(os.environ.get('WOL_REPEAT_INTERVAL', 0.5))
+
+# wake-on-lan - seconds a room wake waits for the hosts' ssh ports, and seconds between checks
+WOL_READY_TIMEOUT = int(os.environ.get('WOL_READY_TIMEOUT', 300))
+WOL_READY_POLL_INTERVAL = float(os.environ.get('WOL_READY_POLL_INTERVAL', 5))
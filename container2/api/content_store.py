@@ -0,0 +1,163 @@
+# innovation-hub-api - container2 - api/content_store.py
+#
+# Content-addressed store for media and slide images that are sent to the hosts of a
+# room.  A file is uploaded to the api once and kept on the persistent volume under
+# its sha256, so the same content uploaded twice (under any name) is stored once.
+# A manifest per host records what has already been sent where; distributing to a
+# room only sends each host the files its manifest does not list, so preparing a
+# room transfers every file at most once per host.
+#
+#   <root>/objects/<sha256>   the stored files
+#   <root>/staging/           multipart uploads spooled here, then moved into objects
+#   <root>/index.json         {sha256: {'name', 'names', 'size', 'added'}}
+#   <root>/manifests.json     {host_address: {remote path: {'sha256', 'size', 'sent'}}}
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+from sftp_upload import LocalFile, RESUMED, SKIPPED, UPLOADED
+
+logger = logging.getLogger()
+
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+class ContentStore:
+    def __init__(self, root):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.staging_dir = os.path.join(root, 'staging')
+        self.index_path = os.path.join(root, 'index.json')
+        self.manifest_path = os.path.join(root, 'manifests.json')
+
+        self._items = {}
+        self._manifests = {}
+        self._lock = threading.Lock()
+
+    # ===================================================
+    # Persistence
+    # ===================================================
+    def load(self):
+        # read the index and manifests, dropping index entries whose file has gone
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.staging_dir, exist_ok=True)
+
+        self._items = {sha256: item for sha256, item in self._read(self.index_path).items()
+                       if os.path.exists(self.object_path(sha256))}
+        self._manifests = self._read(self.manifest_path)
+
+        # spool files left behind by a restart mid-upload
+        for name in os.listdir(self.staging_dir):
+            try:
+                os.remove(os.path.join(self.staging_dir, name))
+            except OSError:
+                pass
+
+        logger.info(f"content_store, {len(self._items)} files, manifests for {len(self._manifests)} hosts")
+
+    def _read(self, path):
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path) as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            logger.error(f"content_store, failed to read {path}: {e}")
+            return {}
+
+    def _write(self, path, data):
+        # write to a temp file then rename so a restart mid-write never leaves a torn file
+        temp_path = path + '.tmp'
+        try:
+            with open(temp_path, 'w') as file:
+                json.dump(data, file, separators=(',', ':'))
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.error(f"content_store, failed to write {path}: {e}")
+
+    # ===================================================
+    # Content
+    # ===================================================
+    def object_path(self, sha256):
+        return os.path.join(self.objects_dir, sha256)
+
+    def add(self, local):
+        # move a staged LocalFile into the store, returns its item and whether it was already stored
+        with self._lock:
+            existed = os.path.exists(self.object_path(local.sha256))
+            if existed:
+                os.remove(local.path)
+            else:
+                os.replace(local.path, self.object_path(local.sha256))
+
+            # the newest name is the one used on the hosts, earlier names still find the item
+            names = self._items.get(local.sha256, {}).get('names', [])
+            item = {'sha256': local.sha256, 'name': local.name,
+                    'names': [name for name in names if name != local.name] + [local.name],
+                    'size': local.size, 'added': time.time()}
+            self._items[local.sha256] = item
+            self._write(self.index_path, self._items)
+
+        return dict(item, existed=existed)
+
+    def get(self, reference):
+        # an item by sha256, or the newest item uploaded under that name
+        reference = str(reference)
+        if SHA256_PATTERN.match(reference.lower()):
+            return self._items.get(reference.lower())
+
+        named = [item for item in self._items.values() if reference in item.get('names', [item['name']])]
+        return max(named, key=lambda item: item['added']) if named else None
+
+    def list(self):
+        return sorted(self._items.values(), key=lambda item: item['added'])
+
+    def remove(self, sha256):
+        # the hosts keep their copies and their manifest entries
+        with self._lock:
+            item = self._items.pop(sha256, None)
+            if item is None:
+                return None
+            try:
+                os.remove(self.object_path(sha256))
+            except OSError:
+                pass
+            self._write(self.index_path, self._items)
+        return item
+
+    def local_file(self, item):
+        return LocalFile(item['name'], self.object_path(item['sha256']), item['size'], item['sha256'])
+
+    # ===================================================
+    # Host manifests
+    # ===================================================
+    def manifest(self, host):
+        return dict(self._manifests.get(host, {}))
+
+    def missing(self, host, files, directory):
+        # the LocalFiles the host's manifest does not list at directory with the same content
+        manifest = self._manifests.get(host, {})
+        return [local for local in files
+                if manifest.get(str(Path(directory) / local.name), {}).get('sha256') != local.sha256]
+
+    def record(self, host, directory, outcomes):
+        # note the files sftp_upload sent to (or found on) the host
+        now = time.time()
+        with self._lock:
+            manifest = self._manifests.setdefault(host, {})
+            for outcome in outcomes:
+                if outcome['status'] in (UPLOADED, RESUMED, SKIPPED):
+                    manifest[str(Path(directory) / outcome['file'])] = {
+                        'sha256': outcome['sha256'], 'size': outcome['size'], 'sent': now}
+            self._write(self.manifest_path, self._manifests)
+
+    def forget(self, host):
+        # drop a host's manifest, e.g. after it was reimaged, so everything is checked again
+        with self._lock:
+            if self._manifests.pop(host, None) is not None:
+                self._write(self.manifest_path, self._manifests)
@@ -0,0 +1,150 @@
+# innovation-hub-api - container2 - api/device_snapshot.py
+#
+# Warm-restart snapshot of device state.  Last-known PDU outlet states/settings,
+# projector power/source and host reachability are kept in memory, written
+# periodically to the persistent volume as gzipped JSON and loaded again when
+# gunicorn restarts, so routes can answer with last-known state (marked stale)
+# while the live PDU/projector sessions reconnect in the background.
+
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+
+import gevent
+
+logger = logging.getLogger()
+
+# state sections held in the snapshot
+PDUS = 'pdus'
+PROJECTORS = 'projectors'
+HOSTS = 'hosts'
+
+SECTIONS = (PDUS, PROJECTORS, HOSTS)
+
+# bump when the on-disk layout changes, older files are then ignored
+SNAPSHOT_VERSION = 1
+
+
+class DeviceSnapshot:
+    def __init__(self, path, interval=60):
+        self.path = path
+        self.interval = interval
+
+        # {section: {device_address: record}}
+        self._state = {section: {} for section in SECTIONS}
+
+        # addresses loaded from disk that have not been refreshed live yet
+        self._stale = {section: set() for section in SECTIONS}
+
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saver = None
+
+    # ===================================================
+    # State access
+    # ===================================================
+    def update(self, section, address, **values):
+        # merge live values into the record for a device and clear its stale flag
+        with self._lock:
+            record = self._state[section].setdefault(address, {})
+            record.update(values)
+            record['updated'] = time.time()
+            self._stale[section].discard(address)
+            self._dirty = True
+
+    def get(self, section, address):
+        # returns a copy of the record with 'stale' set, or None if never seen
+        with self._lock:
+            record = self._state[section].get(address)
+            if record is None:
+                return None
+            record = dict(record)
+            record['stale'] = address in self._stale[section]
+            return record
+
+    def get_section(self, section, room_code=None):
+        # all records for a section, optionally only those for one room
+        with self._lock:
+            addresses = [
+                address for address, record in self._state[section].items()
+                if room_code is None or record.get('room_code') == room_code
+            ]
+        return {address: self.get(section, address) for address in addresses}
+
+    def is_stale(self, section, address):
+        with self._lock:
+            return address in self._stale[section]
+
+    def remove(self, section, address):
+        with self._lock:
+            if self._state[section].pop(address, None) is not None:
+                self._dirty = True
+            self._stale[section].discard(address)
+
+    # ===================================================
+    # Persistence
+    # ===================================================
+    def load(self):
+        # load the last snapshot from disk, every loaded record starts out stale
+        if not os.path.exists(self.path):
+            logger.info(f"device_snapshot, no snapshot found at {self.path}")
+            return False
+
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as snapshot_file:
+                data = json.load(snapshot_file)
+        except (OSError, ValueError) as e:
+            logger.error(f"device_snapshot, failed to read {self.path}: {e}")
+            return False
+
+        if data.get('version') != SNAPSHOT_VERSION:
+            logger.info(f"device_snapshot, ignoring snapshot version {data.get('version')}")
+            return False
+
+        with self._lock:
+            for section in SECTIONS:
+                records = data.get(section, {})
+                self._state[section] = records
+                self._stale[section] = set(records)
+            self._dirty = False
+
+        logger.info(f"device_snapshot, loaded snapshot saved at {data.get('saved')}")
+        return True
+
+    def save(self):
+        # write to a temp file then rename so a restart mid-write never leaves a torn file
+        with self._lock:
+            if not self._dirty:
+                return False
+            data = {section: dict(self._state[section]) for section in SECTIONS}
+            self._dirty = False
+
+        data['version'] = SNAPSHOT_VERSION
+        data['saved'] = time.time()
+
+        temp_path = f'{self.path}.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with gzip.open(temp_path, 'wt', encoding='utf-8') as snapshot_file:
+                json.dump(data, snapshot_file, separators=(',', ':'))
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.error(f"device_snapshot, failed to write {self.path}: {e}")
+            with self._lock:
+                self._dirty = True
+            return False
+
+        return True
+
+    def _save_loop(self):
+        while True:
+            gevent.sleep(self.interval)
+            self.save()
+
+    def start(self):
+        # start the periodic background save, safe to call more than once
+        if self._saver is None or self._saver.dead:
+            self._saver = gevent.spawn(self._save_loop)
@@ -2,6 +2,10 @@
 
 from epson_projector.error import ProjectorError, ProjectorUnavailableError
 
+from epson_projector.latency import LatencyTracker
+
 from epson_projector.projector import Projector
 
+from epson_projector.snapshot import ProjectorSnapshot
+
 from epson_projector.version import __version__
@@ -0,0 +1,215 @@
+"""Adaptive timeouts from observed latency for Epson projector module."""
+import json
+import logging
+import math
+import os
+
+from .const import (
+    ADAPTIVE_MIN_SAMPLES,
+    ADAPTIVE_TIMEOUT_LIMITS,
+    ADAPTIVE_TIMEOUT_MARGIN,
+    LATENCY_COMMAND,
+    LATENCY_POWER,
+    LATENCY_QUERY,
+    TURN_OFF,
+    TURN_ON,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+# latencies below this land in the same bucket
+MIN_LATENCY = 0.001
+
+# decayed buckets lighter than this are dropped
+MIN_WEIGHT = 0.01
+
+
+def command_class(command, query=False):
+    """Timeout class of a command: power switching, other commands or queries."""
+    if command in (TURN_ON, TURN_OFF):
+        return LATENCY_POWER
+    if query:
+        return LATENCY_QUERY
+    return LATENCY_COMMAND
+
+
+class LatencySketch:
+    """
+    Streaming percentile sketch of latencies.
+
+    Samples go into logarithmic buckets, so quantiles are within
+    `accuracy` relative error whatever the spread of values, in constant
+    memory. Once more than max_count samples are held every bucket is
+    halved, so old observations fade and the sketch follows a device
+    whose latency changes.
+    """
+
+    def __init__(self, accuracy=0.02, max_count=2000):
+        """
+        Latency sketch.
+
+        :param float accuracy:  Relative error of quantiles
+        :param int max_count:   Samples held before older ones are decayed
+        """
+        self.accuracy = accuracy
+        self.max_count = max_count
+        self._gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.buckets = {}
+        self.count = 0
+
+    def add(self, seconds):
+        """Record one latency in seconds."""
+        index = math.ceil(math.log(max(seconds, MIN_LATENCY)) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        if self.count > self.max_count:
+            self._decay()
+
+    def _decay(self):
+        # weights stay fractional so rare tail latencies are not rounded away
+        self.buckets = {
+            index: count / 2
+            for index, count in self.buckets.items()
+            if count / 2 >= MIN_WEIGHT
+        }
+        self.count = sum(self.buckets.values())
+
+    def quantile(self, q):
+        """Latency at quantile q (0..1), None without samples."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        # a snapshot, the loop thread may be adding samples meanwhile
+        for index, count in sorted(list(self.buckets.items())):
+            seen += count
+            if seen > rank:
+                break
+        # middle of the bucket (gamma^(i-1), gamma^i]
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def to_dict(self):
+        return {
+            "accuracy": self.accuracy,
+            "max_count": self.max_count,
+            "buckets": {str(index): count for index, count in list(self.buckets.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data.get("accuracy", 0.02), data.get("max_count", 2000))
+        sketch.buckets = {int(index): count for index, count in data.get("buckets", {}).items()}
+        sketch.count = sum(sketch.buckets.values())
+        return sketch
+
+
+class LatencyTracker:
+    """
+    Per device latency sketches and the timeouts learned from them.
+
+    The timeout for a device and command class is its observed p99 times
+    a margin, clamped to the class floor and ceiling. Until enough
+    samples are seen the static default is used. One tracker can be
+    shared by every Projector (and saved/loaded across restarts).
+    Updates are plain dict operations, no lock is taken.
+    """
+
+    def __init__(
+        self,
+        limits=None,
+        margin=ADAPTIVE_TIMEOUT_MARGIN,
+        min_samples=ADAPTIVE_MIN_SAMPLES,
+        quantile=0.99,
+    ):
+        """
+        Latency tracker.
+
+        :param dict limits:     {command class: (floor, ceiling)} in seconds
+        :param float margin:    Factor applied to the observed quantile
+        :param int min_samples: Samples needed before the learned timeout is used
+        :param float quantile:  Quantile the timeout is based on
+        """
+        self.limits = dict(ADAPTIVE_TIMEOUT_LIMITS, **(limits or {}))
+        self.margin = margin
+        self.min_samples = min_samples
+        self.quantile = quantile
+        # {device: {command class: LatencySketch}}
+        self._sketches = {}
+
+    def record(self, device, command_class, seconds):
+        """Record how long a request to device took."""
+        sketches = self._sketches.setdefault(device, {})
+        sketch = sketches.get(command_class)
+        if sketch is None:
+            sketch = sketches[command_class] = LatencySketch()
+        sketch.add(seconds)
+
+    def percentile(self, device, command_class, q):
+        sketch = self._sketches.get(device, {}).get(command_class)
+        return sketch.quantile(q) if sketch else None
+
+    def timeout(self, device, command_class, default):
+        """Learned timeout for a request, or default while still learning."""
+        sketch = self._sketches.get(device, {}).get(command_class)
+        if sketch is None or sketch.count < self.min_samples:
+            return default
+        floor, ceiling = self.limits.get(command_class, (0, default))
+        return min(ceiling, max(floor, sketch.quantile(self.quantile) * self.margin))
+
+    def forget(self, device):
+        self._sketches.pop(device, None)
+
+    def stats(self, device):
+        """{command class: {count, p50, p99, timeout}} for a device."""
+        return {
+            command_class: {
+                "count": sketch.count,
+                "p50": sketch.quantile(0.5),
+                "p99": sketch.quantile(0.99),
+                "timeout": self.timeout(device, command_class, None),
+            }
+            for command_class, sketch in list(self._sketches.get(device, {}).items())
+        }
+
+    def to_dict(self):
+        return {
+            device: {
+                command_class: sketch.to_dict()
+                for command_class, sketch in list(sketches.items())
+            }
+            for device, sketches in list(self._sketches.items())
+        }
+
+    def from_dict(self, data):
+        self._sketches = {
+            device: {
+                command_class: LatencySketch.from_dict(sketch)
+                for command_class, sketch in sketches.items()
+            }
+            for device, sketches in data.items()
+        }
+
+    def save(self, path):
+        """Write the sketches to path as JSON (temp file then rename)."""
+        temp_path = f"{path}.tmp"
+        try:
+            with open(temp_path, "w") as latency_file:
+                json.dump(self.to_dict(), latency_file)
+            os.replace(temp_path, path)
+        except OSError as err:
+            _LOGGER.error("Cannot save latencies to %s: %s", path, err)
+            return False
+        return True
+
+    def load(self, path):
+        """Load sketches saved by save(), returns False if there are none."""
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path) as latency_file:
+                self.from_dict(json.load(latency_file))
+        except (OSError, ValueError) as err:
+            _LOGGER.error("Cannot load latencies from %s: %s", path, err)
+            return False
+        return True
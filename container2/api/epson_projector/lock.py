@@ -11,14 +11,23 @@ class Lock:
         self._timer = 0
         self._operation = False
 
-    def setLock(self, command):
-        """Set lock on requests."""
+    @staticmethod
+    def operation(command):
+        """Operation whose lock window a command opens."""
         if command in (TURN_ON, TURN_OFF):
-            self._operation = command
+            return command
         elif command in INV_SOURCES:
-            self._operation = SOURCE
-        else:
-            self._operation = ALL
+            return SOURCE
+        return ALL
+
+    @classmethod
+    def window(cls, command):
+        """Seconds of the lock window a command opens."""
+        return TIMEOUT_TIMES.get(cls.operation(command), DEFAULT_TIMEOUT_TIME)
+
+    def setLock(self, command):
+        """Set lock on requests."""
+        self._operation = self.operation(command)
         self._isLocked = True
         self._timer = time.time()
 
@@ -28,6 +37,10 @@ class Lock:
         self._timer = 0
         self._isLocked = False
 
+    def release(self):
+        """End the current lock window early, e.g. once the projector reports it is ready."""
+        self.__unlock()
+
     def checkLock(self):
         """
         Lock checking.
@@ -41,3 +54,10 @@ class Lock:
                 return False
             return True
         return False
+
+    def remaining(self):
+        """Seconds left until the current lock window expires, 0 if unlocked."""
+        if not self.checkLock():
+            return 0
+        timeout = TIMEOUT_TIMES.get(self._operation, DEFAULT_TIMEOUT_TIME)
+        return max(0, timeout - (time.time() - self._timer))
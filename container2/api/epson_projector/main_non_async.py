@@ -1,4 +1,3 @@
-import gevent
 import logging
 import time
 import requests  # Use synchronous requests library
@@ -28,6 +27,7 @@ class Projector:
             "Accept": ACCEPT_HEADER,
             "Referer": referer
         }
+        self._powering_on = False
         self.__initLock()
 
     def __initLock(self):
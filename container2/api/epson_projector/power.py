@@ -0,0 +1,120 @@
+"""Power transition state machine for Epson projector module."""
+import logging
+import time
+
+from .const import (
+    POWER_COOLING,
+    POWER_OFF,
+    POWER_ON,
+    POWER_STATE_CODES,
+    POWER_TRANSITION_GRACE,
+    POWER_UNKNOWN,
+    POWER_WARMING,
+    TIMEOUT_TIMES,
+    TURN_OFF,
+    TURN_ON,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+# code reported while a transition is predicted, like the projector itself would
+TRANSITION_CODES = {POWER_WARMING: "02", POWER_COOLING: "03"}
+
+# weight of the newest observed transition in the learned durations
+DURATION_WEIGHT = 0.3
+
+
+class PowerStateMachine:
+    """
+    Predicted power state of one projector.
+
+    off -> warming -> on -> cooling -> off, driven by the power commands
+    sent and the PWR codes read back. While warming or cooling the state
+    and the time left (learned from earlier transitions) are known without
+    asking the projector, which only answers BUSY/ERR at that point.
+    """
+
+    def __init__(self, warmup_time=None, cooldown_time=None):
+        """
+        Power state machine.
+
+        :param float warmup_time:   Expected seconds from PWR ON to on
+        :param float cooldown_time: Expected seconds from PWR OFF to off
+        """
+        self.durations = {
+            POWER_WARMING: warmup_time or TIMEOUT_TIMES[TURN_ON],
+            POWER_COOLING: cooldown_time or TIMEOUT_TIMES[TURN_OFF],
+        }
+        self.state = POWER_UNKNOWN
+        self._started = None
+        self._observed_start = False
+
+    @property
+    def in_transition(self):
+        return self.state in (POWER_WARMING, POWER_COOLING)
+
+    @property
+    def code(self):
+        """PWR code for the predicted state while in transition, else None."""
+        return TRANSITION_CODES.get(self.state)
+
+    def eta(self):
+        """Seconds until the current transition should finish, None if stable."""
+        if not self.in_transition:
+            return None
+        return max(0.0, self._started + self.durations[self.state] - time.monotonic())
+
+    def expired(self):
+        """True once a transition has run well past its expected duration."""
+        return self.in_transition and time.monotonic() > (
+            self._started + self.durations[self.state] + POWER_TRANSITION_GRACE
+        )
+
+    def status(self):
+        return {"state": self.state, "eta": self.eta()}
+
+    def _start(self, state, observed=False):
+        self.state = state
+        self._started = time.monotonic()
+        self._observed_start = observed
+        _LOGGER.debug("Power %s, expected in %.0fs", state, self.durations[state])
+
+    def command(self, command):
+        """A power command was accepted by the projector."""
+        if command == TURN_ON and self.state in (POWER_OFF, POWER_UNKNOWN, POWER_COOLING):
+            self._start(POWER_WARMING)
+        elif command == TURN_OFF and self.state in (POWER_ON, POWER_UNKNOWN, POWER_WARMING):
+            self._start(POWER_COOLING)
+
+    def observe(self, code):
+        """
+        A PWR code was read from the projector.
+
+        Returns True when this ends a transition, so queued commands can go.
+        """
+        state = POWER_STATE_CODES.get(code)
+        if state is None:
+            # BUSY, ERR or no answer, keep the prediction
+            return False
+
+        if state in (POWER_WARMING, POWER_COOLING):
+            if self.state != state:
+                # started elsewhere (remote, other client), its start time is unknown
+                self._start(state, observed=True)
+            return False
+
+        ended = self.in_transition
+        if ended and not self._observed_start:
+            # learn how long this model takes, only from transitions timed from their start
+            expected = POWER_ON if self.state == POWER_WARMING else POWER_OFF
+            if state == expected:
+                elapsed = time.monotonic() - self._started
+                self.durations[self.state] += DURATION_WEIGHT * (elapsed - self.durations[self.state])
+        self.state = state
+        self._started = None
+        return ended
+
+    def reset(self):
+        """Give up on a transition that never finished."""
+        self.state = POWER_UNKNOWN
+        self._started = None
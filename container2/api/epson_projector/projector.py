@@ -1,10 +1,29 @@
 """Main of Epson projector module."""
 import logging
+import time
 
-from .const import BUSY, TCP_PORT, HTTP_PORT, POWER, HTTP, TCP, SERIAL
+import asyncio
+
+from .const import (
+    BUSY,
+    TCP_PORT,
+    HTTP_PORT,
+    POWER,
+    POWER_POLL_TIME,
+    HTTP,
+    TCP,
+    SERIAL,
+    STATE_UNAVAILABLE,
+    TURN_OFF,
+    TURN_ON,
+)
+from .error import ProjectorError
+from .latency import command_class
+from .power import PowerStateMachine
 from .timeout import get_timeout
 
-from .lock import Lock
+from .scheduler import CommandScheduler
+from .snapshot import ProjectorSnapshot
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -22,6 +41,8 @@ class Projector:
         websession=None,
         type=HTTP,
         timeout_scale=1.0,
+        port=None,
+        latency_tracker=None,
     ):
         """
         Epson Projector controller.
@@ -29,24 +50,29 @@ class Projector:
         :param str host:        Hostname/IP/serial to the projector
         :param obj websession:  Websession to pass for HTTP protocol
         :param timeout_scale    Factor to multiply default timeouts by (for slow projectors)
+        :param int port:        Port for HTTP/TCP, defaults to the projector's standard port
+        :param latency_tracker  LatencyTracker learning timeouts from observed latency
 
         """
-        self._lock = Lock()
+        self._power_state = PowerStateMachine()
+        self._power_watcher = None
+        self._scheduler = CommandScheduler(ready=self._wait_power)
         self._type = type
         self._timeout_scale = timeout_scale
         self._power = None
+        self._latency = latency_tracker
         if self._type == HTTP:
             self._host = host
             from .projector_http import ProjectorHttp
 
             self._projector = ProjectorHttp(
-                host=host, websession=websession, port=HTTP_PORT
+                host=host, websession=websession, port=port or HTTP_PORT
             )
         elif self._type == TCP:
             from .projector_tcp import ProjectorTcp
 
             self._host = host
-            self._projector = ProjectorTcp(host, TCP_PORT)
+            self._projector = ProjectorTcp(host, port or TCP_PORT)
         elif self._type == SERIAL:
             from .projector_serial import ProjectorSerial
 
@@ -55,11 +81,48 @@ class Projector:
 
     def close(self):
         """Close connection. Not used in HTTP"""
+        if self._power_watcher is not None:
+            self._power_watcher.cancel()
         self._projector.close()
 
+    async def wait_closed(self):
+        """Wait for the background tasks stopped by close() to finish."""
+        if self._power_watcher is not None:
+            try:
+                await self._power_watcher
+            except asyncio.CancelledError:
+                pass
+            self._power_watcher = None
+        if hasattr(self._projector, "wait_closed"):
+            await self._projector.wait_closed()
+
     def set_timeout_scale(self, timeout_scale=1.0):
         self._timeout_scale = timeout_scale
 
+    def _timeout(self, command, query):
+        """Timeout for a request, learned for this projector if a latency tracker is set."""
+        default = get_timeout(command, self._timeout_scale)
+        if self._latency is None:
+            return default
+        return self._latency.timeout(self._host, command_class(command, query), default)
+
+    async def _timed(self, command, query, request):
+        """
+        Run request, recording its latency with the tracker if the projector answered.
+
+        Timeouts and failures are not recorded: their elapsed time is the
+        timeout itself, which would only push the learned timeout up.
+        """
+        if self._latency is None:
+            return await request()
+        started = time.monotonic()
+        result = await request()
+        if result is not None and result != STATE_UNAVAILABLE:
+            self._latency.record(
+                self._host, command_class(command, query), time.monotonic() - started
+            )
+        return result
+
     async def get_serial_number(self):
         return await self._projector.get_serial()
 
@@ -71,27 +134,171 @@ class Projector:
             self._power = power
         return self._power
 
+    @property
+    def queue_depth(self):
+        """Number of commands waiting for the projector."""
+        return self._scheduler.queue_depth
+
+    @property
+    def command_wait(self):
+        """Seconds a command sent now waits in the queue for lock windows."""
+        return self._scheduler.wait_time()
+
+    @property
+    def power_state(self):
+        """
+        Predicted power state without asking the projector.
+
+        {"state": off/warming/on/cooling/unknown, "eta": seconds left
+        in a warm-up or cool-down, None when not in transition}
+        """
+        return self._power_state.status()
+
+    async def wait_for_power(self, timeout=None):
+        """Wait until a warm-up or cool-down has finished, returns the power state."""
+        return await self._wait_power(timeout)
+
+    async def _wait_power(self, timeout=None):
+        """
+        Wait out a power transition, polled by the power watcher.
+
+        Runs before every queued command, so commands issued mid
+        transition are replayed as soon as the projector is ready.
+        """
+        self._watch_power()
+        if self._power_watcher is not None and not self._power_watcher.done():
+            try:
+                # shielded, a caller giving up does not stop the polling
+                await asyncio.wait_for(asyncio.shield(self._power_watcher), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._power_state.state
+
+    def _watch_power(self):
+        """Start polling PWR in the background while a power transition is predicted."""
+        if self._power_state.in_transition and (
+            self._power_watcher is None or self._power_watcher.done()
+        ):
+            self._power_watcher = asyncio.ensure_future(self._poll_power())
+
+    async def _poll_power(self):
+        """Read PWR every POWER_POLL_TIME until the transition is confirmed or given up."""
+        machine = self._power_state
+        while machine.in_transition:
+            if machine.expired():
+                _LOGGER.warning("Power transition of %s did not finish", self._host)
+                machine.reset()
+                self._scheduler.release()
+                break
+            await asyncio.sleep(POWER_POLL_TIME)
+            try:
+                code = await self._timed(
+                    POWER,
+                    True,
+                    lambda: self._projector.get_property(
+                        command=POWER, timeout=self._timeout(POWER, query=True)
+                    ),
+                )
+            except (ProjectorError, OSError, asyncio.TimeoutError):
+                code = None
+            if machine.observe(code):
+                self._scheduler.release()
+        return machine.state
+
     async def get_property(self, command, timeout=None):
-        """Get property state from device."""
+        """
+        Get property state from device.
+
+        While the projector is busy the last value read is returned,
+        or BUSY if there is none. During a power transition PWR is
+        answered with the predicted code until a read confirms it ended.
+        """
         _LOGGER.debug("Getting property %s", command)
-        timeout = timeout if timeout else get_timeout(command, self._timeout_scale)
-        if self._lock.checkLock():
-            return BUSY
-        return await self._projector.get_property(command=command, timeout=timeout)
+        if self._power_state.in_transition and (
+            self._power_state.eta() > 0 or self._scheduler.is_busy()
+        ):
+            # the projector only answers BUSY/ERR while warming up or cooling down,
+            # the power watcher polls PWR meanwhile
+            self._watch_power()
+            if command == POWER:
+                return self._power_state.code
+            return self._scheduler.last_value(command)
+        timeout = timeout if timeout else self._timeout(command, query=True)
+
+        async def read():
+            return await self._timed(
+                command,
+                True,
+                lambda: self._projector.get_property(command=command, timeout=timeout),
+            )
+
+        value = await self._scheduler.read(command, read)
+        if command == POWER and self._power_state.observe(value):
+            self._scheduler.release()
+        self._watch_power()
+        return value
+
+    async def get_properties(self, commands, timeout=None):
+        """
+        Read several properties at once, returns a ProjectorSnapshot.
+
+        Over HTTP the reads are issued concurrently, over TCP and serial
+        they are pipelined in one write. While the projector is busy or
+        in a power transition each value is answered as get_property
+        would, from the last value read.
+        """
+        commands = list(commands)
+        if (
+            self._type == HTTP
+            or self._scheduler.is_busy()
+            or self._power_state.in_transition
+        ):
+            values = await asyncio.gather(
+                *[self.get_property(command, timeout) for command in commands],
+                return_exceptions=True,
+            )
+            return ProjectorSnapshot(dict(zip(commands, values)))
+
+        _LOGGER.debug("Getting properties %s", commands)
+        timeout = (
+            timeout
+            if timeout
+            else sum(self._timeout(command, query=True) for command in commands)
+        )
+        try:
+            values = await self._projector.get_properties(commands, timeout)
+        except ProjectorError as err:
+            values = [err] * len(commands)
+        for command, value in zip(commands, values):
+            self._scheduler.remember(command, value)
+            if command == POWER and self._power_state.observe(value):
+                self._scheduler.release()
+        self._watch_power()
+        return ProjectorSnapshot(dict(zip(commands, values)))
 
     async def send_command(self, command):
-        """Send command to Epson."""
+        """
+        Send command to Epson.
+
+        Waits in the projector's queue until previous commands are done.
+        """
         _LOGGER.debug("Sending command to projector %s", command)
-        if self._lock.checkLock():
-            return False
-        self._lock.setLock(command)
-        return await self._projector.send_command(
-            command, get_timeout(command, self._timeout_scale)
-        )
+
+        async def send():
+            timeout = self._timeout(command, query=False)
+            response = await self._timed(
+                command, False, lambda: self._projector.send_command(command, timeout)
+            )
+            if command in (TURN_ON, TURN_OFF) and response not in (False, None):
+                self._power_state.command(command)
+                self._watch_power()
+            return response
+
+        return await self._scheduler.submit(command, send)
 
     async def send_request(self, command):
         """Get property state from device."""
         _LOGGER.debug("Getting property %s", command)
-        if self._lock.checkLock():
+        if self._scheduler.is_busy():
             return BUSY
         return await self._projector.send_request(params=command, timeout=10)
@@ -0,0 +1,116 @@
+"""Snapshot of several projector properties for Epson projector module."""
+from .const import (
+    BUSY,
+    CMODE,
+    CMODE_LIST,
+    MUTE,
+    POWER,
+    POWER_STATE_CODES,
+    POWER_UNKNOWN,
+    SOURCE,
+    SOURCE_LIST,
+    VOLUME,
+)
+
+# volume is read as VOLUME over HTTP (json_query VOL?) and VOL over TCP/serial
+VOLUME_COMMANDS = (VOLUME, "VOL")
+
+
+class ProjectorSnapshot:
+    """
+    Properties read together by Projector.get_properties.
+
+    Raw values are kept in `values`, properties that could not be read
+    are listed in `errors` and the common ones are decoded: power state
+    name, source and colour mode names from SOURCE_LIST/CMODE_LIST,
+    volume as a number and mute as a bool.
+    """
+
+    def __init__(self, values):
+        """
+        Projector snapshot.
+
+        :param dict values: {command: value, False/BUSY or exception}
+        """
+        self.values = {}
+        self.errors = {}
+        for command, value in values.items():
+            if isinstance(value, Exception):
+                self.errors[command] = str(value) or type(value).__name__
+            elif value == BUSY:
+                self.errors[command] = "busy"
+            elif value is False or value is None:
+                self.errors[command] = "no response"
+            else:
+                self.values[command] = value
+
+    def get(self, command, default=None):
+        return self.values.get(command, default)
+
+    @property
+    def power(self):
+        """PWR code, e.g. "01"."""
+        return self.get(POWER)
+
+    @property
+    def power_state(self):
+        if self.power is None:
+            return None
+        return POWER_STATE_CODES.get(self.power, POWER_UNKNOWN)
+
+    @property
+    def source(self):
+        """SOURCE code, e.g. "30"."""
+        return self.get(SOURCE)
+
+    @property
+    def source_name(self):
+        if self.source is None:
+            return None
+        return SOURCE_LIST.get(self.source, self.source)
+
+    @property
+    def cmode(self):
+        """CMODE code, e.g. "07"."""
+        return self.get(CMODE)
+
+    @property
+    def cmode_name(self):
+        if self.cmode is None:
+            return None
+        return CMODE_LIST.get(self.cmode, self.cmode)
+
+    @property
+    def volume(self):
+        for command in VOLUME_COMMANDS:
+            value = self.get(command)
+            if value is not None:
+                try:
+                    return int(value)
+                except ValueError:
+                    return None
+        return None
+
+    @property
+    def mute(self):
+        value = self.get(MUTE)
+        if value is None:
+            return None
+        return value == "ON"
+
+    def as_dict(self):
+        return {
+            "power": self.power,
+            "power_state": self.power_state,
+            "source": self.source,
+            "source_name": self.source_name,
+            "cmode": self.cmode,
+            "cmode_name": self.cmode_name,
+            "volume": self.volume,
+            "mute": self.mute,
+            "values": self.values,
+            "errors": self.errors,
+        }
+
+    def __repr__(self):
+        return f"ProjectorSnapshot({self.values!r}, errors={self.errors!r})"
@@ -0,0 +1,52 @@
+# innovation-hub-api - container2 - api/fan_out.py
+#
+# Runs one action against many devices at once for the room-wide routes.  Each
+# device gets its own deadline and its own outcome, so one slow or unreachable
+# device never holds up or fails the rest of the room; the whole call takes
+# about as long as the slowest device (or its deadline).
+
+import logging
+import time
+
+import gevent
+from gevent.pool import Pool
+
+logger = logging.getLogger()
+
+
+def run_concurrently(targets, action, deadline, concurrency=20):
+    # targets: {device_address: args tuple}, action(device_address, *args) returns a
+    # json-able result or raises.  Returns {device_address: outcome}.
+    outcomes = {}
+
+    def run(device_address, args):
+        started = time.time()
+        try:
+            with gevent.Timeout(deadline):
+                result = action(device_address, *args)
+            outcomes[device_address] = {'ok': True, 'result': result}
+        except gevent.Timeout:
+            outcomes[device_address] = {'ok': False, 'error': f'No response within {deadline}s'}
+        except Exception as e:
+            logger.info(f"fan_out, {device_address}: {e}")
+            outcomes[device_address] = {'ok': False, 'error': str(e)}
+        outcomes[device_address]['elapsed'] = round(time.time() - started, 3)
+
+    pool = Pool(concurrency)
+    for device_address, args in targets.items():
+        pool.spawn(run, device_address, args)
+    pool.join()
+
+    return outcomes
+
+
+def summarise(outcomes, **extra):
+    # response body and status for a fan-out: 200 if every device succeeded, else 207
+    succeeded = sum(1 for outcome in outcomes.values() if outcome['ok'])
+    body = dict(extra)
+    body.update({
+        'succeeded': succeeded,
+        'failed': len(outcomes) - succeeded,
+        'results': outcomes,
+    })
+    return body, 200 if succeeded == len(outcomes) else 207
@@ -0,0 +1,300 @@
+# innovation-hub-api - container2 - api/host_agents.py
+#
+# Server side of the host agent protocol.  Each host can run host-setup/host_agent.py
+# in the logged on user's session; the agent dials this server, both sides prove they
+# know AGENT_TOKEN, and the connection is kept open for the api to send typed commands
+# (launch, kill, nircmd, volume, media) that run straight away in the desktop session
+# - no ssh handshake, no psexec service start and no credentials on a command line.
+# Hosts without an agent keep using ssh/psexec.
+#
+# Protocol (version 2): newline delimited json objects over tcp, sign(key, *parts) is
+# hmac_sha256(key, json.dumps(parts))
+#   server -> agent  {"type": "challenge", "version": 2, "nonce": <server nonce>}
+#   agent  -> server {"type": "hello", "host": <address>, "user": ..., "platform": ..., "nonce": <agent nonce>,
+#                     "mac": sign(token, "hello", server nonce, agent nonce, host)}
+#   server -> agent  {"type": "welcome", "mac": sign(token, "welcome", server nonce, agent nonce, host)}
+#                 or {"type": "error", "error": ...} and close
+# The hello is only accepted from the address it names, and the agent only stays
+# connected if the welcome proves the server knows the token.  Every later line is
+# "<mac> <json>", the mac being sign(session key, sender, json) with the session key
+# sign(token, "session", server nonce, agent nonce, host), and each json carries the
+# sender's next "seq" - a message that was altered, replayed or reordered closes the
+# connection.  The messages are signed, not encrypted; no credentials travel on it.
+#   server -> agent  {"type": "request", "seq": <n>, "id": <n>, "command": <name>, "args": {...}}
+#   agent  -> server {"type": "response", "seq": <n>, "id": <n>, "ok": true, "result": ...}
+#                 or {"type": "response", "seq": <n>, "id": <n>, "ok": false, "error": ...}
+# Requests carry ids, so several commands can be in flight on one connection.
+
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+
+import gevent
+from gevent.event import AsyncResult
+from gevent.server import StreamServer
+
+logger = logging.getLogger()
+
+PROTOCOL_VERSION = 2
+
+# longest line accepted from an agent
+MAX_MESSAGE = 1024 * 1024
+
+
+class AgentUnavailable(Exception):
+    pass
+
+
+class AgentError(Exception):
+    pass
+
+
+def sign(key, *parts):
+    # json encoding the parts keeps their boundaries, no two part lists sign the same bytes
+    return hmac.new(key.encode(), json.dumps(parts).encode(), hashlib.sha256).hexdigest()
+
+
+def matches(mac, expected):
+    return hmac.compare_digest(str(mac).encode(), expected.encode())
+
+
+class MessageAuth:
+    # signs and checks the messages of one connection after the handshake
+    def __init__(self, key, local, remote):
+        self.key = key
+        self.local = local
+        self.remote = remote
+
+        self._sent = 0
+        self._received = 0
+
+    def seal(self, message):
+        # callers serialise seal() and the write, so seq goes out in order
+        self._sent += 1
+        payload = json.dumps(dict(message, seq=self._sent))
+        return f'{sign(self.key, self.local, payload)} {payload}\n'.encode()
+
+    def open(self, line):
+        mac, _, payload = line.decode(errors='replace').strip().partition(' ')
+        if not matches(mac, sign(self.key, self.remote, payload)):
+            raise AgentError('Bad message signature')
+        message = json.loads(payload)
+        if message.get('seq') != self._received + 1:
+            raise AgentError('Message out of sequence')
+        self._received += 1
+        return message
+
+
+class AgentConnection:
+    def __init__(self, sock, file, address, hello, auth):
+        self.sock = sock
+        self.file = file
+        self.auth = auth
+        self.peer = address[0]
+
+        self.host = hello['host']
+        self.user = hello.get('user')
+        self.platform = hello.get('platform')
+        self.agent_version = hello.get('agent_version')
+        self.connected = time.time()
+        self.last_seen = time.time()
+
+        # request id -> AsyncResult waiting for the response
+        self._pending = {}
+        self._next_id = 0
+        self._write_lock = threading.Lock()
+        self.closed = False
+
+    def send(self, message):
+        with self._write_lock:
+            self.sock.sendall(self.auth.seal(message))
+
+    def call(self, command, args=None, timeout=10):
+        # send one command and wait for its response
+        if self.closed:
+            raise AgentUnavailable(f'Agent on {self.host} disconnected')
+
+        self._next_id += 1
+        request_id = self._next_id
+        result = AsyncResult()
+        self._pending[request_id] = result
+        try:
+            self.send({'type': 'request', 'id': request_id, 'command': command, 'args': args or {}})
+            response = result.get(timeout=timeout)
+        except gevent.Timeout:
+            raise AgentError(f'No response from the agent on {self.host} within {timeout}s')
+        except OSError as e:
+            self.close()
+            raise AgentUnavailable(f'Agent on {self.host} disconnected: {e}')
+        finally:
+            self._pending.pop(request_id, None)
+
+        if not response.get('ok'):
+            raise AgentError(response.get('error') or 'Agent command failed')
+        return response.get('result')
+
+    def read_loop(self):
+        # route responses to their callers until the agent goes away
+        try:
+            while True:
+                line = self.file.readline(MAX_MESSAGE)
+                if not line:
+                    break
+                try:
+                    message = self.auth.open(line)
+                except (AgentError, ValueError) as e:
+                    logger.info(f"host_agents, closing connection to {self.host}: {e}")
+                    break
+                self.last_seen = time.time()
+                if message.get('type') == 'response':
+                    result = self._pending.get(message.get('id'))
+                    if result is not None:
+                        result.set(message)
+        except OSError as e:
+            logger.info(f"host_agents, connection to {self.host} lost: {e}")
+        finally:
+            self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for result in list(self._pending.values()):
+            result.set({'ok': False, 'error': f'Agent on {self.host} disconnected'})
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def status(self):
+        return {
+            'host': self.host,
+            'peer': self.peer,
+            'user': self.user,
+            'platform': self.platform,
+            'agent_version': self.agent_version,
+            'connected': self.connected,
+            'last_seen': self.last_seen,
+            'pending': len(self._pending),
+        }
+
+
+class HostAgentServer:
+    def __init__(self, token, port=7070, host='0.0.0.0', heartbeat=30, handshake_timeout=10):
+        self.token = token
+        self.address = (host, port)
+        self.heartbeat = heartbeat
+        self.handshake_timeout = handshake_timeout
+
+        # host address -> AgentConnection, the newest connection from a host wins
+        self._agents = {}
+        self._server = None
+        self._heartbeat = None
+
+    # ===================================================
+    # Lookup
+    # ===================================================
+    def get(self, host):
+        agent = self._agents.get(host)
+        if agent is not None and not agent.closed:
+            return agent
+        return None
+
+    def call(self, host, command, args=None, timeout=10):
+        agent = self.get(host)
+        if agent is None:
+            raise AgentUnavailable(f'No agent connected for {host}')
+        return agent.call(command, args, timeout)
+
+    def status(self):
+        return {host: agent.status() for host, agent in list(self._agents.items()) if not agent.closed}
+
+    # ===================================================
+    # Connections
+    # ===================================================
+    def _handshake(self, sock, address):
+        nonce = os.urandom(16).hex()
+        sock.sendall((json.dumps({'type': 'challenge', 'version': PROTOCOL_VERSION, 'nonce': nonce}) + '\n').encode())
+
+        file = sock.makefile('rb')
+        with gevent.Timeout(self.handshake_timeout):
+            line = file.readline(MAX_MESSAGE)
+        hello = json.loads(line)
+
+        host = hello.get('host')
+        agent_nonce = hello.get('nonce')
+        if hello.get('type') != 'hello' or not host or not agent_nonce:
+            raise AgentError('Expected hello')
+        # the token is shared by every host, so an agent may only speak for the address it connects from
+        if host != address[0]:
+            raise AgentError(f'Agent for {host} connected from {address[0]}')
+        if not matches(hello.get('mac', ''), sign(self.token, 'hello', nonce, agent_nonce, host)):
+            raise AgentError('Authentication failed')
+
+        # prove the server knows the token too, everything after is signed with a key for this connection
+        welcome = {'type': 'welcome', 'mac': sign(self.token, 'welcome', nonce, agent_nonce, host)}
+        sock.sendall((json.dumps(welcome) + '\n').encode())
+        auth = MessageAuth(sign(self.token, 'session', nonce, agent_nonce, host), 'server', 'agent')
+        return hello, file, auth
+
+    def _handle(self, sock, address):
+        try:
+            hello, file, auth = self._handshake(sock, address)
+        except (Exception, gevent.Timeout) as e:
+            logger.info(f"host_agents, rejected agent from {address[0]}: {e}")
+            try:
+                sock.sendall((json.dumps({'type': 'error', 'error': str(e)}) + '\n').encode())
+            except OSError:
+                pass
+            return
+
+        agent = AgentConnection(sock, file, address, hello, auth)
+        previous = self._agents.get(agent.host)
+        self._agents[agent.host] = agent
+        if previous is not None:
+            previous.close()
+
+        logger.info(f"host_agents, agent for {agent.host} connected from {address[0]} as {agent.user}")
+        agent.read_loop()
+
+        if self._agents.get(agent.host) is agent:
+            del self._agents[agent.host]
+        logger.info(f"host_agents, agent for {agent.host} disconnected")
+
+    def _check(self):
+        # ping every agent, a dead connection is dropped so helpers fall back to ssh
+        while True:
+            gevent.sleep(self.heartbeat)
+            for agent in list(self._agents.values()):
+                gevent.spawn(self._ping, agent)
+
+    def _ping(self, agent):
+        try:
+            agent.call('ping', timeout=self.heartbeat)
+        except (AgentError, AgentUnavailable) as e:
+            logger.info(f"host_agents, agent for {agent.host} not answering: {e}")
+            agent.close()
+
+    def start(self):
+        if not self.token:
+            logger.info("host_agents, no AGENT_TOKEN set, host agents disabled")
+            return
+        if self._server is None:
+            self._server = StreamServer(self.address, self._handle)
+            self._server.start()
+            self._heartbeat = gevent.spawn(self._check)
+            logger.info(f"host_agents, listening for agents on port {self.address[1]}")
+
+    def stop(self):
+        if self._server is not None:
+            self._server.stop()
+            self._server = None
+        if self._heartbeat is not None:
+            self._heartbeat.kill()
+            self._heartbeat = None
+        for agent in list(self._agents.values()):
+            agent.close()
@@ -0,0 +1,138 @@
+# innovation-hub-api - container2 - api/host_monitor.py
+#
+# Background reachability monitor for the room hosts.  Every host's ssh port is
+# probed on a schedule - a tcp connect and sshd's identification line, no login,
+# optionally followed by a light command over the pooled ssh connection - a bounded
+# number at a time, and the result (reachable, probe latency, last seen) is kept in
+# the device snapshot (hosts section) next to what ssh_connect records on live
+# requests.  Up/down comes from the probe alone (probe_reachable), a live login
+# failing on a bad password says nothing about the host.  The control page reads
+# room reachability from here to grey out dead hosts, and room-wide actions skip
+# hosts known to be down instead of waiting for ssh timeouts.
+
+import logging
+import socket
+import time
+
+import gevent
+from gevent.pool import Pool
+
+from device_snapshot import HOSTS
+
+logger = logging.getLogger()
+
+UP = 'up'
+DOWN = 'down'
+UNKNOWN = 'unknown'
+
+
+class HostMonitor:
+    def __init__(self, snapshot, list_hosts, check_command=None, port=22, interval=30, timeout=3, concurrency=50):
+        self.snapshot = snapshot
+
+        # callable returning [(host_address, room_code, username, password), ...]
+        self.list_hosts = list_hosts
+
+        # optional callable(host_address, username, password) run once the port answers, raises if the host is not usable
+        self.check_command = check_command
+
+        self.port = port
+        self.interval = interval
+        self.timeout = timeout
+        self.concurrency = concurrency
+
+        self._poller = None
+
+    # ===================================================
+    # Status
+    # ===================================================
+    def state(self, record):
+        # up/down from our own probe no older than two intervals, else unknown
+        if record is None or record.get('probe_reachable') is None or record.get('stale'):
+            return UNKNOWN
+        if time.time() - record.get('checked', 0) > 2 * self.interval:
+            return UNKNOWN
+        return UP if record['probe_reachable'] else DOWN
+
+    def status(self, host_address):
+        record = self.snapshot.get(HOSTS, host_address) or {}
+        return dict(record, state=self.state(record))
+
+    def is_down(self, host_address):
+        return self.state(self.snapshot.get(HOSTS, host_address)) == DOWN
+
+    # ===================================================
+    # Probing
+    # ===================================================
+    def probe(self, host_address, room_code, username, password):
+        # tcp connect to the ssh port, then the optional command; records and returns the host's status
+        started = time.time()
+        try:
+            with socket.create_connection((host_address, self.port), timeout=self.timeout) as sock:
+                latency = round(time.time() - started, 3)
+
+                # sshd speaks first, its identification line shows it is really serving
+                sock.settimeout(self.timeout)
+                banner = sock.recv(256).split(b'\r\n')[0].decode('ascii', errors='replace')
+                if not banner.startswith('SSH-'):
+                    raise OSError(f'no ssh banner ({banner[:40]!r})')
+
+                # answer with our own identification so sshd closes without logging a bad client
+                sock.sendall(b'SSH-2.0-innovation-hub-monitor\r\n')
+        except (OSError, socket.timeout) as e:
+            self.snapshot.update(HOSTS, host_address, room_code=room_code, reachable=False, probe_reachable=False,
+                                 error=f'Port {self.port} not reachable: {e}', checked=time.time())
+            return self.status(host_address)
+
+        values = {'latency': latency, 'banner': banner}
+        if self.check_command is not None:
+            try:
+                with gevent.Timeout(self.timeout * 3):
+                    self.check_command(host_address, username, password)
+                values['command_ok'] = True
+            except (Exception, gevent.Timeout) as e:
+                self.snapshot.update(HOSTS, host_address, room_code=room_code, reachable=False, probe_reachable=False,
+                                     command_ok=False,
+                                     error=f'Check command failed: {e}' if str(e) else 'Check command timed out',
+                                     checked=time.time(), **values)
+                return self.status(host_address)
+
+        now = time.time()
+        self.snapshot.update(HOSTS, host_address, room_code=room_code, reachable=True, probe_reachable=True,
+                             error=None, last_seen=now, checked=now, **values)
+        return self.status(host_address)
+
+    def probe_hosts(self, hosts):
+        # hosts: [(host_address, room_code, username, password)], probed concurrently, {host_address: status}
+        statuses = {}
+
+        def run(host_address, room_code, username, password):
+            try:
+                statuses[host_address] = self.probe(host_address, room_code, username, password)
+            except Exception as e:
+                logger.error(f"host_monitor, probe of {host_address} failed: {e}")
+                statuses[host_address] = self.status(host_address)
+
+        pool = Pool(self.concurrency)
+        for host in hosts:
+            pool.spawn(run, *host)
+        pool.join()
+
+        return statuses
+
+    def _poll_loop(self):
+        while True:
+            started = time.time()
+            try:
+                statuses = self.probe_hosts(self.list_hosts())
+                down = [host_address for host_address, status in statuses.items() if status['state'] == DOWN]
+                if down:
+                    logger.info(f"host_monitor, {len(down)} of {len(statuses)} hosts down: {', '.join(down)}")
+            except Exception as e:
+                logger.error(f"host_monitor, poll failed: {e}")
+            gevent.sleep(max(0, self.interval - (time.time() - started)))
+
+    def start(self):
+        # start the background monitor, safe to call more than once
+        if self._poller is None or self._poller.dead:
+            self._poller = gevent.spawn(self._poll_loop)
@@ -0,0 +1,145 @@
+# innovation-hub-api - container2 - api/host_script.py
+#
+# Compiles a host script - an ordered list of typed desktop actions such as
+# monitor_on, hide_taskbar, mute and open_browser - into as few remote executions as
+# possible.  Consecutive nircmd style steps become one psexec running one cmd.exe, and
+# consecutive plain shell steps (taskkill) one ssh command.  Every step in a batch
+# runs; its success comes back in the batch's exit code, one bit per step, so each
+# step still gets its own result.  Launches run one psexec -d each, waits run here.
+
+NIRCMD_PATH = r'C:\NirCmd\nircmd.exe'
+
+CHROME_PATH = r'C:\Program Files\Google\Chrome\Application\chrome.exe'
+
+# steps run in the user session through nircmd, each one or more nircmd commands
+NIRCMD = 'nircmd'
+
+# steps run as plain commands on the ssh shell
+SHELL = 'shell'
+
+# steps that start a program in the user session (psexec -d)
+LAUNCH = 'launch'
+
+# pause between steps, on the api side
+WAIT = 'wait'
+
+# the exit code carries one bit per step
+MAX_BATCH = 16
+
+# longest wait step, seconds
+MAX_WAIT = 30
+
+
+class Step:
+    def __init__(self, index, action, kind, payload, agent_commands=None):
+        self.index = index
+        self.action = action
+        self.kind = kind
+
+        # nircmd: [nircmd commands], shell: [shell commands],
+        # launch: (path, [arguments]), wait: seconds
+        self.payload = payload
+
+        # [(command, args)] for a connected host agent, which runs steps one by one
+        if agent_commands is None:
+            if kind == NIRCMD:
+                agent_commands = [('nircmd', {'args': command}) for command in payload]
+            elif kind == LAUNCH:
+                agent_commands = [('launch', {'path': payload[0], 'args': payload[1]})]
+            else:
+                agent_commands = []
+        self.agent_commands = agent_commands
+
+
+class Batch:
+    def __init__(self, kind, steps):
+        self.kind = kind
+        self.steps = steps
+
+
+def parse_step(index, step):
+    # turn one requested action into a Step, raises ValueError if it is not valid
+    action = step.get('action')
+
+    if action == 'nircmd':
+        if not step.get('command'):
+            raise ValueError(f'step {index}: nircmd needs a command')
+        return Step(index, action, NIRCMD, [step['command']])
+    elif action == 'monitor_off':
+        return Step(index, action, NIRCMD, ['monitor off'])
+    elif action == 'monitor_on':
+        # the mouse press keeps the monitor from going straight back to sleep
+        return Step(index, action, NIRCMD, ['monitor on', 'wait 3000', 'sendmouse click 50 50'])
+    elif action == 'hide_taskbar':
+        return Step(index, action, NIRCMD, ['win hide class Shell_TrayWnd'])
+    elif action == 'show_taskbar':
+        return Step(index, action, NIRCMD, ['win show class Shell_TrayWnd'])
+    elif action in ('mute', 'unmute'):
+        mute = action == 'mute' and str(step.get('mute', True)).lower() != 'false'
+        return Step(index, action, NIRCMD, [f'mutesysvolume {1 if mute else 0}'])
+    elif action == 'volume':
+        try:
+            level = max(0, min(100, int(step['level'])))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f'step {index}: volume needs a level 0-100')
+        return Step(index, action, NIRCMD, [f'setsysvolume {round(level * 655.35)}'])
+    elif action == 'open_browser':
+        if not step.get('url'):
+            raise ValueError(f'step {index}: open_browser needs a url')
+        return Step(index, action, LAUNCH, (CHROME_PATH, ['--kiosk', step['url']]))
+    elif action == 'launch':
+        if not step.get('path'):
+            raise ValueError(f'step {index}: launch needs a path')
+        arguments = step.get('args') or []
+        if isinstance(arguments, str):
+            arguments = arguments.split()
+        return Step(index, action, LAUNCH, (step['path'], [str(argument) for argument in arguments]))
+    elif action == 'kill_chrome':
+        return Step(index, action, SHELL, ['taskkill /IM chrome.exe /F'], [('kill', {'image': 'chrome.exe'})])
+    elif action == 'kill_process':
+        try:
+            pid = int(step['pid'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f'step {index}: kill_process needs a pid')
+        return Step(index, action, SHELL, [f'taskkill /PID {pid} /F'], [('kill', {'pid': pid})])
+    elif action == 'wait':
+        try:
+            seconds = float(step.get('seconds', 1))
+        except (TypeError, ValueError):
+            raise ValueError(f'step {index}: wait needs seconds')
+        return Step(index, action, WAIT, max(0.0, min(MAX_WAIT, seconds)))
+
+    raise ValueError(f'step {index}: unknown action {action}')
+
+
+def compile_steps(steps):
+    # group consecutive nircmd steps and consecutive shell steps into batches
+    batches = []
+    for index, step in enumerate(steps):
+        parsed = parse_step(index, step)
+        previous = batches[-1] if batches else None
+        if (previous is not None and parsed.kind in (NIRCMD, SHELL) and previous.kind == parsed.kind
+                and len(previous.steps) < MAX_BATCH):
+            previous.steps.append(parsed)
+        else:
+            batches.append(Batch(parsed.kind, [parsed]))
+    return batches
+
+
+def batch_command(batch, nircmd_path=NIRCMD_PATH):
+    # one cmd.exe line running every step of the batch, exiting with a bit set per failed step
+    parts = []
+    for bit, step in enumerate(batch.steps):
+        if batch.kind == NIRCMD:
+            # unquoted, the whole line is already one quoted argument to psexec and cmd
+            commands = ' && '.join(f'{nircmd_path} {command}' for command in step.payload)
+        else:
+            commands = ' && '.join(step.payload)
+        parts.append(f'({commands} || set /a r+={1 << bit})')
+
+    return 'cmd /v:on /c "set r=0& ' + ' & '.join(parts) + ' & exit !r!"'
+
+
+def batch_results(batch, exit_code):
+    # [True/False per step] from the batch's exit code
+    return [not exit_code & (1 << bit) for bit in range(len(batch.steps))]
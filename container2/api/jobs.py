@@ -0,0 +1,158 @@
+# innovation-hub-api - container2 - api/jobs.py
+#
+# Background jobs for the slow host operations (open youtube/browser/vlc, map a samba
+# share, upload images).  A route submits the work and answers 202 with a job id
+# straight away, so the single gevent worker never sits on a psexec or sftp transfer
+# until nginx/gunicorn give up at 60 seconds.  Jobs run on a bounded set of greenlets
+# with a separate limit per host, so one busy pc cannot take every worker, and their
+# status, progress and result are kept for a while for GET /jobs/<id>.
+
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+
+import gevent
+from gevent.event import Event
+
+logger = logging.getLogger()
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+
+class Job:
+    def __init__(self, kind, host, function):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.host = host
+        self.function = function
+
+        self.status = QUEUED
+        self.progress = None
+        self.result = None
+        self.error = None
+
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+        self._done = Event()
+
+    @property
+    def done(self):
+        return self.status in (SUCCEEDED, FAILED)
+
+    def update(self, progress):
+        # called by the job function, e.g. {'files_done': 2, 'files_total': 5}
+        self.progress = progress
+
+    def wait(self, timeout=None):
+        # True once the job has finished
+        return self._done.wait(timeout)
+
+    def as_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'host': self.host,
+            'status': self.status,
+            'progress': self.progress,
+            'result': self.result,
+            'error': self.error,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'elapsed': round((self.finished or time.time()) - (self.started or self.created), 3),
+        }
+
+
+class JobQueue:
+    def __init__(self, workers=10, per_host=1, retention=3600, max_jobs=1000):
+        self.workers = workers
+        self.per_host = per_host
+        self.retention = retention
+        self.max_jobs = max_jobs
+
+        # job_id -> Job, oldest first, finished jobs are kept for retention seconds
+        self._jobs = {}
+        self._pending = deque()
+        self._running = {}
+        self._lock = threading.Lock()
+
+    # ===================================================
+    # Submit / lookup
+    # ===================================================
+    def submit(self, kind, host, function):
+        # function(job) does the work and returns a json-able result or raises
+        job = Job(kind, host, function)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+            self._pending.append(job)
+        self._dispatch()
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def list(self, host=None, status=None):
+        return [job for job in list(self._jobs.values())
+                if (host is None or job.host == host) and (status is None or job.status == status)]
+
+    def _prune(self):
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.done and (now - job.finished > self.retention or len(self._jobs) > self.max_jobs):
+                del self._jobs[job_id]
+
+    # ===================================================
+    # Scheduling
+    # ===================================================
+    def _dispatch(self):
+        # start queued jobs, oldest first, while a worker and a slot on their host are free
+        with self._lock:
+            started = []
+            for job in list(self._pending):
+                if sum(self._running.values()) >= self.workers:
+                    break
+                if self._running.get(job.host, 0) >= self.per_host:
+                    continue
+                self._pending.remove(job)
+                self._running[job.host] = self._running.get(job.host, 0) + 1
+                started.append(job)
+
+        for job in started:
+            gevent.spawn(self._run, job)
+
+    def _run(self, job):
+        job.status = RUNNING
+        job.started = time.time()
+        try:
+            job.result = job.function(job)
+            job.status = SUCCEEDED
+        except Exception as e:
+            logger.info(f"jobs, {job.kind} on {job.host} failed: {e}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished = time.time()
+            job.function = None
+            with self._lock:
+                self._running[job.host] -= 1
+                if not self._running[job.host]:
+                    del self._running[job.host]
+            job._done.set()
+            self._dispatch()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': len(self._pending),
+                'running': sum(self._running.values()),
+                'workers': self.workers,
+                'per_host': self.per_host,
+            }
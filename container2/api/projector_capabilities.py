@@ -0,0 +1,156 @@
+# innovation-hub-api - container2 - api/projector_capabilities.py
+#
+# Detects which projector web API families a display supports, once, so generic
+# commands go straight to an endpoint that exists instead of timing out on one
+# that does not.  The families in use across the rooms are:
+#   pj_v01          /lighting/api/v01/pj/*            (library dih EV-100/105)
+#   contentmgr_v01  /api/v01/contentmgr/remote/power/*
+#   contentmgr_v02  /api/v02/contentmgr/*            (TC level 2 PU1008B/EV-110)
+# Each family is probed on one of its real endpoints with a request that changes
+# nothing: a GET where the family has a read, an OPTIONS where its only routes act
+# (v01's power/on and power/off are GETs that switch the projector).  A 2xx, or a
+# 405 for a route that exists under another method, means the family is there;
+# anything else (404, 401/403, 500...) means it is not.  The result (plus the pj
+# source list) is kept in memory and stored with the display record by the caller.
+
+import json
+import logging
+import threading
+import time
+
+import gevent
+
+logger = logging.getLogger()
+
+PJ_V01 = 'pj_v01'
+CONTENTMGR_V01 = 'contentmgr_v01'
+CONTENTMGR_V02 = 'contentmgr_v02'
+
+# family -> (method, endpoint) of its probe
+PROBES = {
+    PJ_V01: ('GET', '/lighting/api/v01/pj/power'),
+    CONTENTMGR_V02: ('GET', '/api/v02/contentmgr/remote/power'),
+    CONTENTMGR_V01: ('OPTIONS', '/api/v01/contentmgr/remote/power/on'),
+}
+
+# families able to carry each generic command, most capable first
+COMMAND_FAMILIES = {
+    'power': [PJ_V01, CONTENTMGR_V02, CONTENTMGR_V01],
+    'source': [PJ_V01, CONTENTMGR_V02],
+    'mute': [PJ_V01, CONTENTMGR_V02],
+}
+
+
+class UnsupportedCommandError(Exception):
+    pass
+
+
+class ProjectorCapabilities:
+    def __init__(self, sessions, load, store):
+        self.sessions = sessions
+
+        # load(display_address) -> dict or None, store(display_address, dict) - the display record
+        self.load = load
+        self.store = store
+
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    # ===================================================
+    # Detection
+    # ===================================================
+    def known(self, display_address):
+        # capabilities already detected for a display, None if it has never been probed
+        with self._lock:
+            capabilities = self._cache.get(display_address)
+        if capabilities is None:
+            capabilities = self.load(display_address)
+            if capabilities is not None:
+                with self._lock:
+                    self._cache[display_address] = capabilities
+        return capabilities
+
+    def get(self, display_address, username, password, refresh=False):
+        # capabilities of a display, probed only the first time (or on refresh)
+        if not refresh:
+            capabilities = self.known(display_address)
+            if capabilities is not None:
+                return capabilities
+
+        capabilities = self.probe(display_address, username, password)
+        with self._lock:
+            self._cache[display_address] = capabilities
+        self.store(display_address, capabilities)
+        return capabilities
+
+    def probe(self, display_address, username, password):
+        # probe every family at once, raises if the display did not answer at all
+        def check(method, endpoint):
+            url = f'http://{display_address}{endpoint}'
+            try:
+                return self.sessions.request(method, display_address, username, password, url).status_code
+            except Exception as e:
+                logger.info(f"projector_capabilities, {method} {display_address}{endpoint}: {e}")
+                return None
+
+        greenlets = {family: gevent.spawn(check, *probe) for family, probe in PROBES.items()}
+        gevent.joinall(list(greenlets.values()))
+        statuses = {family: greenlet.value for family, greenlet in greenlets.items()}
+
+        answered = [status for status in statuses.values() if status is not None]
+        if not answered:
+            raise Exception(f'Display {display_address} did not respond to the capability probe')
+
+        # with good credentials every path authenticates, so a 401/403 means the result cannot be trusted
+        if any(status in (401, 403) for status in answered):
+            raise Exception(f'Display {display_address} rejected the credentials during the capability probe')
+
+        families = [family for family, status in statuses.items()
+                    if status is not None and (200 <= status < 300 or status == 405)]
+
+        sources = []
+        if PJ_V01 in families:
+            url = f'http://{display_address}/lighting/api/v01/pj/sources'
+            try:
+                response = self.sessions.get(display_address, username, password, url)
+                if response.status_code == 200:
+                    sources = response.json().get('sources', [])
+            except Exception as e:
+                logger.info(f"projector_capabilities, {display_address} sources: {e}")
+
+        capabilities = {'families': families, 'sources': sources, 'probed': time.time()}
+        logger.info(f"projector_capabilities, {display_address}: {capabilities}")
+        return capabilities
+
+    def forget(self, display_address):
+        with self._lock:
+            self._cache.pop(display_address, None)
+
+    # ===================================================
+    # Routing
+    # ===================================================
+    def build_request(self, capabilities, command, value):
+        # (method, endpoint_url, request kwargs) for a generic command on this display
+        families = capabilities.get('families', [])
+        family = next((family for family in COMMAND_FAMILIES.get(command, []) if family in families), None)
+        if family is None:
+            raise UnsupportedCommandError(f"Display does not support '{command}'")
+
+        json_headers = {'Content-Type': 'application/json'}
+
+        if family == PJ_V01:
+            if command in ('power', 'mute'):
+                value = str(value).upper()
+            elif capabilities.get('sources') and value not in capabilities['sources']:
+                raise UnsupportedCommandError(f"Invalid source: {value}. Valid sources are: {', '.join(capabilities['sources'])}")
+            return 'PUT', f'/lighting/api/v01/pj/{command}', {'data': json.dumps({command: value}), 'headers': json_headers}
+
+        if family == CONTENTMGR_V02:
+            if command in ('power', 'mute'):
+                value = str(value).lower()
+            else:
+                value = int(value)
+            return 'PUT', f'/api/v02/contentmgr/remote/{command}', {'json': {command: value}}
+
+        # contentmgr v01 only has power on/off as plain GETs
+        return 'GET', f'/api/v01/contentmgr/remote/power/{str(value).lower()}', {}
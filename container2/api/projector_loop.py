@@ -0,0 +1,237 @@
+# innovation-hub-api - container2 - api/projector_loop.py
+#
+# Bridge between the gevent/Flask side of the api and the asyncio epson_projector
+# library.  One asyncio event loop runs in a dedicated native thread and hosts a
+# shared aiohttp.ClientSession plus every Projector instance (HTTP, TCP or serial),
+# so their keep-alive connections and locks live as long as the api does.  Routes
+# call the synchronous methods below, which submit a coroutine to the loop and
+# wait for it cooperatively (only the calling greenlet blocks) up to a deadline.
+#
+# The loop thread is started with the original (unpatched) thread API: under
+# gevent's monkey patching threading.Thread would only create a greenlet.  Results
+# come back through a hub async watcher, the one gevent primitive that is safe to
+# signal from another native thread.  Projectors are addressed by IP, so no name
+# resolution is needed in the loop thread.
+
+import asyncio
+import logging
+import threading
+
+import aiohttp
+import gevent
+from gevent import monkey
+from gevent.hub import Waiter
+
+from epson_projector.const import HTTP
+from epson_projector.projector import Projector
+
+logger = logging.getLogger()
+
+_start_new_thread = monkey.get_original('_thread', 'start_new_thread')
+
+# the loop blocks in a plain epoll/select, not gevent's selector, since its thread has no hub running
+_DefaultSelector = monkey.get_original('selectors', 'DefaultSelector')
+
+
+class ProjectorLoopError(Exception):
+    pass
+
+
+class ProjectorLoop:
+    def __init__(self, timeout=15, timeout_scale=1.0, latency=None):
+        self.timeout = timeout
+        self.timeout_scale = timeout_scale
+
+        # optional LatencyTracker shared by every Projector, learns their timeouts
+        self.latency = latency
+
+        # only touched from inside the loop thread
+        self._session = None
+        self._projectors = {}
+
+        self._loop = None
+        self._lock = threading.Lock()
+
+    # ===================================================
+    # Loop thread
+    # ===================================================
+    def start(self):
+        # start the loop thread, safe to call more than once
+        with self._lock:
+            if self._loop is not None:
+                return
+
+            started = gevent.get_hub().loop.async_()
+            waiter = Waiter()
+            started.start(waiter.switch, None)
+            holder = {}
+
+            def run():
+                loop = asyncio.SelectorEventLoop(_DefaultSelector())
+                asyncio.set_event_loop(loop)
+                holder['loop'] = loop
+                started.send()
+                loop.run_forever()
+
+            _start_new_thread(run, ())
+            try:
+                waiter.get()
+            finally:
+                started.close()
+
+            self._loop = holder['loop']
+            logger.info("projector_loop, asyncio loop thread started")
+
+    def call(self, coroutine_function, *args, timeout=None):
+        # run coroutine_function(*args) on the loop and wait for its result, the
+        # coroutine is cancelled if it has not finished within the deadline
+        self.start()
+        timeout = self.timeout if timeout is None else timeout
+
+        # the watcher is started before anything is submitted, so a fast result is never missed
+        finished = gevent.get_hub().loop.async_()
+        waiter = Waiter()
+        finished.start(waiter.switch, None)
+        holder = {}
+
+        def done(task):
+            holder['task'] = task
+            finished.send()
+
+        def submit():
+            task = asyncio.ensure_future(coroutine_function(*args))
+            holder['pending'] = task
+            task.add_done_callback(done)
+
+        self._loop.call_soon_threadsafe(submit)
+
+        try:
+            with gevent.Timeout(timeout, ProjectorLoopError(f'No response within {timeout}s')):
+                waiter.get()
+        except ProjectorLoopError:
+            self._loop.call_soon_threadsafe(lambda: holder['pending'].cancel() if 'pending' in holder else None)
+            raise
+        finally:
+            finished.close()
+
+        return holder['task'].result()
+
+    def stop(self):
+        if self._loop is None:
+            return
+        try:
+            self.call(self._close_all, timeout=5)
+        except Exception as e:
+            logger.error(f"projector_loop, closing projectors failed: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = None
+
+    # ===================================================
+    # Coroutines - run inside the loop thread
+    # ===================================================
+    async def _get_projector(self, host, type):
+        # one Projector per (host, type), all sharing the loop's aiohttp session
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+
+        projector = self._projectors.get((host, type))
+        if projector is None:
+            projector = Projector(host, websession=self._session, type=type,
+                                  timeout_scale=self.timeout_scale, latency_tracker=self.latency)
+            self._projectors[(host, type)] = projector
+        return projector
+
+    async def _get_property(self, host, type, command):
+        projector = await self._get_projector(host, type)
+        return await projector.get_property(command)
+
+    async def _get_properties(self, host, type, commands):
+        projector = await self._get_projector(host, type)
+        snapshot = await projector.get_properties(commands)
+        return snapshot.as_dict()
+
+    async def _send_command(self, host, type, command):
+        projector = await self._get_projector(host, type)
+        return await projector.send_command(command)
+
+    async def _get_serial_number(self, host, type):
+        projector = await self._get_projector(host, type)
+        return await projector.get_serial_number()
+
+    async def _queue_depth(self, host, type):
+        projector = await self._get_projector(host, type)
+        return projector.queue_depth
+
+    async def _power_state(self, host, type):
+        projector = await self._get_projector(host, type)
+        return dict(projector.power_state, queue_depth=projector.queue_depth, wait=round(projector.command_wait, 1))
+
+    async def _queue_command(self, host, type, command):
+        # left to the projector's scheduler, which sends it once a warm-up/cool-down is over
+        projector = await self._get_projector(host, type)
+        task = asyncio.ensure_future(projector.send_command(command))
+        task.add_done_callback(self._log_queued_result)
+        await asyncio.sleep(0)
+        return projector.queue_depth
+
+    @staticmethod
+    def _log_queued_result(task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"projector_loop, queued command failed: {task.exception()}")
+
+    async def _get_property_many(self, hosts, type, command, timeout):
+        # every host at once, each with its own deadline
+        async def one(host):
+            try:
+                return await asyncio.wait_for(self._get_property(host, type, command), timeout)
+            except asyncio.TimeoutError:
+                return ProjectorLoopError(f'No response within {timeout}s')
+            except Exception as e:
+                return e
+
+        values = await asyncio.gather(*[one(host) for host in hosts])
+        return dict(zip(hosts, values))
+
+    async def _close_all(self):
+        for projector in self._projectors.values():
+            projector.close()
+        for projector in self._projectors.values():
+            await projector.wait_closed()
+        self._projectors = {}
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    # ===================================================
+    # Synchronous facade for the routes
+    # ===================================================
+    def get_property(self, host, command, type=HTTP, timeout=None):
+        return self.call(self._get_property, host, type, command, timeout=timeout)
+
+    def get_properties(self, host, commands, type=HTTP, timeout=None):
+        # several properties in one round (concurrent on http, pipelined on tcp/serial), decoded
+        return self.call(self._get_properties, host, type, list(commands), timeout=timeout)
+
+    def send_command(self, host, command, type=HTTP, timeout=None):
+        return self.call(self._send_command, host, type, command, timeout=timeout)
+
+    def get_serial_number(self, host, type=HTTP, timeout=None):
+        return self.call(self._get_serial_number, host, type, timeout=timeout)
+
+    def get_property_many(self, hosts, command, type=HTTP, timeout=None):
+        # {host: value or exception} - one slow projector never holds up the others
+        timeout = self.timeout if timeout is None else timeout
+        return self.call(self._get_property_many, list(hosts), type, command, timeout, timeout=timeout + 1)
+
+    def queue_depth(self, host, type=HTTP, timeout=None):
+        # commands waiting in the projector's scheduler
+        return self.call(self._queue_depth, host, type, timeout=timeout)
+
+    def power_state(self, host, type=HTTP, timeout=None):
+        # predicted power state, eta of a warm-up/cool-down, queue depth and the seconds a new
+        # command would wait for lock windows - no projector i/o
+        return self.call(self._power_state, host, type, timeout=timeout)
+
+    def queue_command(self, host, command, type=HTTP, timeout=None):
+        # queue a command without waiting for it, returns the queue depth
+        return self.call(self._queue_command, host, type, command, timeout=timeout)
@@ -0,0 +1,207 @@
+# innovation-hub-api - container2 - api/projector_sessions.py
+#
+# Pooled, keep-alive HTTP sessions for the projector web APIs.  Each display gets
+# one requests.Session with a small bounded connection pool and a digest auth
+# handler whose challenge is shared by every request to that display, so after the
+# first 401 the nonce is reused (with an incrementing nc) and each command costs a
+# single round trip on an already open connection.  Sessions idle for longer than
+# the idle timeout, or beyond the session limit, are closed.
+#
+# With a LatencyTracker (epson_projector.latency) every answered request is timed
+# and its timeout is learned per display from the observed p99, within per-class
+# floors and ceilings, instead of one fixed timeout for every model.
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPDigestAuth
+from urllib3.util.retry import Retry
+
+from epson_projector.const import LATENCY_COMMAND, LATENCY_POWER, LATENCY_QUERY
+
+logger = logging.getLogger()
+
+
+# requests keeps digest challenge state in a threading.local; with gevent's monkey
+# patching that becomes greenlet-local, so every API request would start with a fresh
+# 401 round trip.  This keeps one challenge (nonce, nc count) per display, shared by
+# every request, while the state of a single request (body position, 401 retries)
+# stays greenlet-local so concurrent requests to a display do not trample each other.
+class _DigestChallenge:
+    def __init__(self):
+        self.last_nonce = ''
+        self.nonce_count = 0
+        self.chal = {}
+        self.lock = threading.Lock()
+
+
+def _shared(name):
+    return property(lambda self: getattr(self.challenge, name),
+                    lambda self, value: setattr(self.challenge, name, value))
+
+
+class _DigestState(threading.local):
+    last_nonce = _shared('last_nonce')
+    nonce_count = _shared('nonce_count')
+    chal = _shared('chal')
+
+    def __init__(self, challenge):
+        self.challenge = challenge
+
+
+class SharedDigestAuth(HTTPDigestAuth):
+    def __init__(self, username, password):
+        super().__init__(username, password)
+        self._challenge = _DigestChallenge()
+        self._thread_local = _DigestState(self._challenge)
+
+    def init_per_thread_state(self):
+        if not hasattr(self._thread_local, 'init'):
+            self._thread_local.init = True
+            self._thread_local.pos = None
+            self._thread_local.num_401_calls = None
+
+    def build_digest_header(self, method, url):
+        # one nc per header, in order, however many requests are signing at once
+        with self._challenge.lock:
+            return super().build_digest_header(method, url)
+
+
+def request_class(method, url):
+    # latency/timeout class of a projector web API request
+    if method == 'GET':
+        return LATENCY_QUERY
+    if url.rstrip('/').endswith('/power'):
+        return LATENCY_POWER
+    return LATENCY_COMMAND
+
+
+class ProjectorSession:
+    def __init__(self, display_address, username, password, pool_size):
+        self.display_address = display_address
+        self.username = username
+        self.password = password
+        self.last_used = time.time()
+
+        # a failed connect is retried for any request, a read error only for GETs - a PUT
+        # (power, volume INC) may already have been carried out by the projector
+        retries = Retry(total=1, allowed_methods=frozenset(['GET']), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=retries)
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.auth = SharedDigestAuth(username, password)
+        self.session.verify = False
+
+        # one slot per pooled connection, a request holding a slot never waits on the pool
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def request(self, method, url, **kwargs):
+        # returns the response and the seconds the display took to answer it, None if the
+        # answer needed a digest 401 round trip first (that time is not the display's latency)
+        with self._slots:
+            self.last_used = time.time()
+            started = time.time()
+            response = self.session.request(method, url, **kwargs)
+            latency = None if response.history else time.time() - started
+        return response, latency
+
+    def close(self):
+        self.session.close()
+
+
+class ProjectorSessionManager:
+    def __init__(self, pool_size=2, max_sessions=64, idle_timeout=120, timeout=10, latency=None):
+        self.pool_size = pool_size
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+
+        # optional LatencyTracker, timeouts are then learned per display
+        self.latency = latency
+
+        # display_address -> ProjectorSession, least recently used first
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_session(self, display_address, username, password):
+        with self._lock:
+            self._expire_idle()
+
+            session = self._sessions.get(display_address)
+
+            # credentials changed in the db, drop the old session and its challenge
+            if session is not None and (session.username, session.password) != (username, password):
+                session.close()
+                session = None
+
+            if session is None:
+                logger.info(f"projector_sessions, opening session for {display_address}")
+                session = ProjectorSession(display_address, username, password, self.pool_size)
+
+            self._sessions[display_address] = session
+            self._sessions.move_to_end(display_address)
+
+            # bound the number of displays holding open connections
+            while len(self._sessions) > self.max_sessions:
+                _, evicted = self._sessions.popitem(last=False)
+                evicted.close()
+
+            return session
+
+    def _expire_idle(self):
+        now = time.time()
+        for display_address in list(self._sessions):
+            session = self._sessions[display_address]
+            if now - session.last_used > self.idle_timeout:
+                logger.info(f"projector_sessions, closing idle session for {display_address}")
+                session.close()
+                del self._sessions[display_address]
+
+    def request(self, method, display_address, username, password, url, **kwargs):
+        if self.latency is None:
+            kwargs.setdefault('timeout', self.timeout)
+            session = self.get_session(display_address, username, password)
+            response, _ = session.request(method, url, **kwargs)
+            return response
+
+        command_class = request_class(method, url)
+        kwargs.setdefault('timeout', self.latency.timeout(display_address, command_class, self.timeout))
+        session = self.get_session(display_address, username, password)
+
+        # only answered requests are recorded, a timeout's elapsed time is the timeout itself
+        # and would ratchet the learned timeout up for a display that has stopped answering
+        response, latency = session.request(method, url, **kwargs)
+        if latency is not None and response.ok:
+            self.latency.record(display_address, command_class, latency)
+        return response
+
+    def get(self, display_address, username, password, url, **kwargs):
+        return self.request('GET', display_address, username, password, url, **kwargs)
+
+    def put(self, display_address, username, password, url, **kwargs):
+        return self.request('PUT', display_address, username, password, url, **kwargs)
+
+    def post(self, display_address, username, password, url, **kwargs):
+        return self.request('POST', display_address, username, password, url, **kwargs)
+
+    def delete(self, display_address, username, password, url, **kwargs):
+        return self.request('DELETE', display_address, username, password, url, **kwargs)
+
+    def close(self, display_address):
+        with self._lock:
+            session = self._sessions.pop(display_address, None)
+        if session is not None:
+            session.close()
+
+    def close_all(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
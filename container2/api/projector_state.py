@@ -0,0 +1,187 @@
+# innovation-hub-api - container2 - api/projector_state.py
+#
+# Background poller and cache for projector state.  Every display's power,
+# source, volume and mute are read periodically over its keep-alive session and
+# stored in the device snapshot (projectors section) with a timestamp per field
+# and the display's reachability.  Writes through the API schedule a quick
+# refresh of the display so the cache catches up with the change, and the GET
+# routes answer from the cache unless it is older than max_age.
+
+import logging
+import threading
+import time
+
+import gevent
+from gevent.pool import Pool
+
+from device_snapshot import PROJECTORS
+
+logger = logging.getLogger()
+
+# field -> pj api endpoint it is read from
+FIELDS = {
+    'power': '/lighting/api/v01/pj/power',
+    'source': '/lighting/api/v01/pj/source',
+    'volume': '/lighting/api/v01/pj/volume',
+    'mute': '/lighting/api/v01/pj/mute',
+}
+
+
+class ProjectorStateCache:
+    def __init__(self, sessions, snapshot, list_displays, interval=30, max_age=60, refresh_delay=1, concurrency=10):
+        self.sessions = sessions
+        self.snapshot = snapshot
+
+        # callable returning [(display_address, room_code, username, password), ...]
+        self.list_displays = list_displays
+
+        self.interval = interval
+        self.max_age = max_age
+        self.refresh_delay = refresh_delay
+        self.concurrency = concurrency
+
+        # display_address -> pending refresh greenlet, so bursts of writes poll once
+        self._refreshing = {}
+        self._lock = threading.Lock()
+        self._poller = None
+
+    # ===================================================
+    # Cache access
+    # ===================================================
+    def record(self, display_address, room_code, **values):
+        # store values read from (or accepted by) the projector
+        now = time.time()
+        fields = {f'{field}_updated': now for field in values}
+        self.snapshot.update(PROJECTORS, display_address, room_code=room_code, reachable=True, **values, **fields)
+
+    def record_error(self, display_address, room_code, error):
+        self.snapshot.update(PROJECTORS, display_address, room_code=room_code, reachable=False, last_error=str(error))
+
+    def get(self, display_address, field, max_age=None):
+        # cached value of one field, or None if missing, stale or too old
+        max_age = self.max_age if max_age is None else max_age
+
+        last_known = self.snapshot.get(PROJECTORS, display_address)
+        if last_known is None or last_known['stale'] or last_known.get(field) is None:
+            return None
+
+        updated = last_known.get(f'{field}_updated', 0)
+        if time.time() - updated > max_age:
+            return None
+
+        return {field: last_known[field], 'updated': updated, 'reachable': last_known.get('reachable')}
+
+    # ===================================================
+    # Polling
+    # ===================================================
+    def read_fields(self, display_address, username, password, fields=FIELDS):
+        # read the fields concurrently, returns ({field: value}, {field: error}, answered)
+        # where answered is False if no request got an HTTP response at all
+        def read(field):
+            url = f'http://{display_address}{FIELDS[field]}'
+            try:
+                response = self.sessions.get(display_address, username, password, url)
+            except Exception as e:
+                return None, str(e), False
+
+            if response.status_code == 401:
+                return None, 'Authentication failed', True
+            elif response.status_code != 200:
+                return None, f'Projector returned {response.status_code}', True
+
+            try:
+                return response.json().get(field), None, True
+            except ValueError:
+                return None, 'Invalid response from projector', True
+
+        greenlets = {field: gevent.spawn(read, field) for field in fields}
+        gevent.joinall(list(greenlets.values()))
+
+        values, errors, answered = {}, {}, False
+        for field, greenlet in greenlets.items():
+            value, error, responded = greenlet.value
+            answered = answered or responded
+            if error is not None:
+                errors[field] = error
+            elif value is not None:
+                values[field] = value
+
+        return values, errors, answered
+
+    def poll_display(self, display_address, room_code, username, password, fields=FIELDS):
+        # read and record the fields, a display that does not answer at all is marked unreachable
+        values, errors, answered = self.read_fields(display_address, username, password, fields)
+
+        if values:
+            self.record(display_address, room_code, **values)
+        elif answered:
+            self.snapshot.update(PROJECTORS, display_address, room_code=room_code, reachable=True)
+        elif errors:
+            error = next(iter(errors.values()))
+            logger.info(f"projector_state, {display_address} unreachable: {error}")
+            self.record_error(display_address, room_code, error)
+
+        return values, errors
+
+    def status(self, display_address, room_code, username, password, fresh=False):
+        # one document with every field, cached fields are reused unless fresh, the rest read live
+        document = {'display_address': display_address, 'room_code': room_code}
+        missing = []
+
+        for field in FIELDS:
+            cached = None if fresh else self.get(display_address, field)
+            if cached is None:
+                missing.append(field)
+            else:
+                document[field] = cached[field]
+                document[f'{field}_updated'] = cached['updated']
+
+        errors = {}
+        if missing:
+            values, errors = self.poll_display(display_address, room_code, username, password, missing)
+            now = time.time()
+            for field, value in values.items():
+                document[field] = value
+                document[f'{field}_updated'] = now
+
+        last_known = self.snapshot.get(PROJECTORS, display_address) or {}
+        document['reachable'] = last_known.get('reachable')
+        document['errors'] = errors
+
+        return document
+
+    def refresh_soon(self, display_address, room_code, username, password):
+        # re-read a display shortly after a write, once per burst of writes
+        with self._lock:
+            pending = self._refreshing.get(display_address)
+            if pending is not None and not pending.dead:
+                return
+            self._refreshing[display_address] = gevent.spawn_later(
+                self.refresh_delay, self._refresh, display_address, room_code, username, password)
+
+    def _refresh(self, display_address, room_code, username, password):
+        with self._lock:
+            self._refreshing.pop(display_address, None)
+        try:
+            self.poll_display(display_address, room_code, username, password)
+        except Exception as e:
+            logger.error(f"projector_state, refresh of {display_address} failed: {e}")
+
+    def poll_all(self):
+        pool = Pool(self.concurrency)
+        for display_address, room_code, username, password in self.list_displays():
+            pool.spawn(self.poll_display, display_address, room_code, username, password)
+        pool.join()
+
+    def _poll_loop(self):
+        while True:
+            try:
+                self.poll_all()
+            except Exception as e:
+                logger.error(f"projector_state, poll failed: {e}")
+            gevent.sleep(self.interval)
+
+    def start(self):
+        # start the background poller, safe to call more than once
+        if self._poller is None or self._poller.dead:
+            self._poller = gevent.spawn(self._poll_loop)
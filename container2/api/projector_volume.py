@@ -0,0 +1,222 @@
+# innovation-hub-api - container2 - api/projector_volume.py
+#
+# Closed-loop volume control for the projectors.  The pj volume API only takes
+# INC/DEC steps, so each display gets a controller that tracks the volume it
+# believes the projector is at and drives it towards a target from a single
+# worker greenlet.  Steps are sent in concurrent bursts over the display's
+# keep-alive session, a newer target replaces an older one mid-flight
+# (last-writer-wins) and the result is verified with one GET at the end.
+
+import json
+import logging
+import threading
+import time
+
+import gevent
+from gevent.event import AsyncResult
+from gevent.pool import Pool
+
+logger = logging.getLogger()
+
+VOLUME_MIN = 0
+VOLUME_MAX = 20
+
+
+class ProjectorVolumeError(Exception):
+    def __init__(self, message, status_code=500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class VolumeController:
+    def __init__(self, engine, display_address):
+        self.engine = engine
+        self.display_address = display_address
+        self.username = None
+        self.password = None
+
+        # last volume read from or driven on the projector, None if unknown
+        self.believed = None
+        self.believed_at = 0
+
+        # each set_volume call bumps the generation, the worker always chases the newest target
+        self.target = None
+        self.generation = 0
+        self._waiters = {}
+
+        self._worker = None
+        self._lock = threading.Lock()
+
+    # ===================================================
+    # Public
+    # ===================================================
+    def set_volume(self, username, password, target, timeout):
+        with self._lock:
+            self.username = username
+            self.password = password
+            self.target = target
+            self.generation += 1
+            waiter = AsyncResult()
+            self._waiters[self.generation] = waiter
+
+            if self._worker is None or self._worker.dead:
+                self._worker = gevent.spawn(self._run)
+
+        try:
+            return waiter.get(timeout=timeout)
+        except gevent.Timeout:
+            raise ProjectorVolumeError('Timed out waiting for volume change')
+
+    def observe(self, volume):
+        # volume seen elsewhere (e.g. get_projector_volume), only trusted while idle
+        with self._lock:
+            if self._worker is None or self._worker.dead:
+                self.believed = volume
+                self.believed_at = time.time()
+
+    def forget(self):
+        # volume changed outside the controller, re-read before the next change
+        with self._lock:
+            if self._worker is None or self._worker.dead:
+                self.believed = None
+
+    # ===================================================
+    # Worker
+    # ===================================================
+    def _run(self):
+        verify_attempts = 0
+        try:
+            while True:
+                with self._lock:
+                    generation, target = self.generation, self.target
+
+                if self.believed is None or time.time() - self.believed_at > self.engine.trust_time:
+                    self._set_believed(self._read_volume())
+
+                difference = target - self.believed
+
+                if difference == 0:
+                    # believed to be on target, confirm once with the projector
+                    actual = self._read_volume()
+                    self._set_believed(actual)
+
+                    with self._lock:
+                        superseded = generation != self.generation
+
+                    if superseded:
+                        continue
+
+                    if actual != target and verify_attempts < self.engine.verify_attempts:
+                        verify_attempts += 1
+                        logger.info(f"projector_volume, {self.display_address} at {actual} not {target}, correcting")
+                        continue
+
+                    self._finish(generation, actual)
+                    return
+
+                self._step(difference)
+        except Exception as e:
+            logger.error(f"projector_volume, {self.display_address}: {e}")
+            self.believed = None
+            self._fail(e)
+
+    def _step(self, difference):
+        # send up to one burst of INC/DEC steps concurrently, then go back and re-check the target
+        command = 'INC' if difference > 0 else 'DEC'
+        count = min(abs(difference), self.engine.burst)
+
+        pool = Pool(count)
+        results = [pool.spawn(self._send_step, command) for _ in range(count)]
+        pool.join(raise_error=True)
+
+        hit_limit = False
+        for greenlet in results:
+            response = greenlet.value
+            if response.status_code == 401:
+                raise ProjectorVolumeError('Authentication failed', 401)
+            if response.status_code != 200:
+                raise ProjectorVolumeError('Failed to change volume')
+            if '"limit"' in response.text:
+                hit_limit = True
+
+        if hit_limit:
+            # projector reported it is at the end of its range
+            self._set_believed(VOLUME_MAX if command == 'INC' else VOLUME_MIN)
+        else:
+            self._set_believed(self.believed + (count if command == 'INC' else -count))
+
+    def _send_step(self, command):
+        url = f'http://{self.display_address}/lighting/api/v01/pj/volume'
+        payload = {'volume': command}
+        return self.engine.sessions.put(self.display_address, self.username, self.password, url,
+                                        data=json.dumps(payload), headers={'Content-Type': 'application/json'})
+
+    def _read_volume(self):
+        url = f'http://{self.display_address}/lighting/api/v01/pj/volume'
+        response = self.engine.sessions.get(self.display_address, self.username, self.password, url)
+
+        if response.status_code == 401:
+            raise ProjectorVolumeError('Authentication failed', 401)
+        if response.status_code != 200:
+            raise ProjectorVolumeError('Failed to read volume')
+
+        return json.loads(response.text).get('volume')
+
+    def _set_believed(self, volume):
+        self.believed = volume
+        self.believed_at = time.time()
+
+    def _finish(self, generation, volume):
+        # the newest request succeeded, any older ones it replaced are told so
+        with self._lock:
+            waiters, self._waiters = self._waiters, {}
+            self._worker = None
+
+        for waiter_generation, waiter in waiters.items():
+            waiter.set({
+                'volume': volume,
+                'target': self.target,
+                'superseded': waiter_generation != generation,
+            })
+
+    def _fail(self, error):
+        with self._lock:
+            waiters, self._waiters = self._waiters, {}
+            self._worker = None
+
+        for waiter in waiters.values():
+            waiter.set_exception(error)
+
+
+class ProjectorVolumeEngine:
+    def __init__(self, sessions, burst=4, trust_time=30, verify_attempts=1, timeout=30):
+        self.sessions = sessions
+        self.burst = burst
+        self.trust_time = trust_time
+        self.verify_attempts = verify_attempts
+        self.timeout = timeout
+
+        self._controllers = {}
+        self._lock = threading.Lock()
+
+    def controller(self, display_address):
+        with self._lock:
+            controller = self._controllers.get(display_address)
+            if controller is None:
+                controller = VolumeController(self, display_address)
+                self._controllers[display_address] = controller
+            return controller
+
+    def set_volume(self, display_address, username, password, target):
+        target = max(VOLUME_MIN, min(VOLUME_MAX, int(target)))
+        return self.controller(display_address).set_volume(username, password, target, self.timeout)
+
+    def observe(self, display_address, volume):
+        self.controller(display_address).observe(volume)
+
+    def forget(self, display_address):
+        self.controller(display_address).forget()
+
+    def remove(self, display_address):
+        with self._lock:
+            self._controllers.pop(display_address, None)
@@ -0,0 +1,145 @@
+# innovation-hub-api - container2 - api/session_ids.py
+#
+# Cache of the interactive (console) session id per (host, user).  Desktop actions
+# start programs with psexec -i <session id>, and the id used to be looked up with
+# qwinsta over ssh before every single command.  Ids are now kept for a TTL, dropped
+# when psexec reports the session is not valid (the command is then retried once
+# with a fresh qwinsta) or the host is rebooted/shut down, and refreshed in the background for hosts used recently, so a click normally
+# costs only the psexec command itself.
+
+import logging
+import threading
+import time
+
+import gevent
+from gevent.pool import Pool
+
+logger = logging.getLogger()
+
+# psexec stderr (lower case) when the session id it was given is not a live session
+PSEXEC_SESSION_ERRORS = (
+    'session does not exist',
+    'invalid session',
+    'no such session',
+)
+
+
+class SessionIdCache:
+    def __init__(self, pool, lookup, ttl=300, refresh_interval=120, active_window=1800, concurrency=10):
+        self.pool = pool
+
+        # lookup(client, username) -> session id or None, runs qwinsta on a leased connection
+        self.lookup = lookup
+
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.active_window = active_window
+        self.concurrency = concurrency
+
+        # (hostname, username) -> {'session_id', 'password', 'updated', 'last_used'}
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._refresher = None
+
+    # ===================================================
+    # Lookup
+    # ===================================================
+    def get(self, client, username):
+        # session id for the host the leased client is connected to, qwinsta only on a miss
+        hostname = client.connection.hostname
+        key = (hostname, username)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry['last_used'] = now
+                if now - entry['updated'] < self.ttl:
+                    return entry['session_id']
+
+        session_id = self.lookup(client, username)
+        self.put(hostname, username, client.connection.password, session_id)
+        return session_id
+
+    def put(self, hostname, username, password, session_id):
+        # only live sessions are cached, nobody logged on is asked again next time
+        now = time.time()
+        with self._lock:
+            if session_id is None:
+                self._entries.pop((hostname, username), None)
+                return
+            entry = self._entries.setdefault((hostname, username), {'last_used': now})
+            entry.update(session_id=session_id, password=password, updated=now)
+
+    # ===================================================
+    # Invalidation
+    # ===================================================
+    def invalidate(self, hostname, username=None):
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] == hostname and (username is None or key[1] == username):
+                    del self._entries[key]
+
+    def check_psexec(self, client, username, error):
+        # drop the cached id if psexec says the session was not valid, returns True if so
+        if error and any(marker in error.lower() for marker in PSEXEC_SESSION_ERRORS):
+            logger.info(f"session_ids, psexec rejected the session of {username} on {client.connection.hostname}")
+            self.invalidate(client.connection.hostname, username)
+            return True
+        return False
+
+    def run_psexec(self, client, username, session_id, command):
+        # run command(session_id), a psexec command line, returns (stdout, stderr); if psexec rejects
+        # the session the id is looked up again and the command run once more with the new one
+        output, error = self._exec(client, command(session_id))
+        if self.check_psexec(client, username, error):
+            fresh_id = self.get(client, username)
+            if fresh_id and fresh_id != session_id:
+                logger.info(f"session_ids, retrying psexec for {username} on {client.connection.hostname} "
+                            f"in session {fresh_id}")
+                output, error = self._exec(client, command(fresh_id))
+                self.check_psexec(client, username, error)
+        return output, error
+
+    @staticmethod
+    def _exec(client, command):
+        _, stdout, stderr = client.exec_command(command)
+        return stdout.read().decode('utf-8'), stderr.read().decode('utf-8')
+
+    # ===================================================
+    # Background refresh
+    # ===================================================
+    def refresh(self):
+        # re-read the ids of hosts used within the active window, forget the rest
+        now = time.time()
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if now - entry['last_used'] > self.active_window]:
+                del self._entries[key]
+            targets = [(hostname, username, entry['password']) for (hostname, username), entry in self._entries.items()]
+
+        def refresh_one(hostname, username, password):
+            try:
+                with self.pool.lease() as client:
+                    client.connect(hostname, username=username, password=password)
+                    session_id = self.lookup(client, username)
+            except Exception as e:
+                logger.info(f"session_ids, refresh of {username} on {hostname} failed: {e}")
+                session_id = None
+            self.put(hostname, username, password, session_id)
+
+        pool = Pool(self.concurrency)
+        for target in targets:
+            pool.spawn(refresh_one, *target)
+        pool.join()
+
+    def _run(self):
+        while True:
+            gevent.sleep(self.refresh_interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"session_ids, refresh failed: {e}")
+
+    def start(self):
+        if self._refresher is None or self._refresher.dead:
+            self._refresher = gevent.spawn(self._run)
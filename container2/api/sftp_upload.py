@@ -0,0 +1,254 @@
+# innovation-hub-api - container2 - api/sftp_upload.py
+#
+# Upload pipeline for pushing files (slide images, media) to a host over sftp.
+#
+#   - multipart parts are streamed to spool files on disk as they arrive, hashed on
+#     the way, so a large upload never sits in memory and its sha256 is known before
+#     the transfer starts
+#   - files go up concurrently, each on its own sftp channel of the one pooled ssh
+#     connection, written in large pipelined chunks (no wait for an ack per 32KB
+#     packet), so the transfer is limited by the network and not by round trips
+#   - a file already on the host with the same size (and sha256, unless only the
+#     size is checked) is skipped
+#   - data is written to <name>.<hash>.part and renamed when complete, so an upload
+#     that was cut off resumes from where it stopped the next time the same content
+#     is sent
+
+import hashlib
+import logging
+import os
+import re
+import stat
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from gevent.pool import Pool
+
+logger = logging.getLogger()
+
+# skip files whose size and sha256 match, only whose size matches, or never
+VERIFY_HASH = 'hash'
+VERIFY_SIZE = 'size'
+VERIFY_NONE = 'none'
+VERIFY_MODES = (VERIFY_HASH, VERIFY_SIZE, VERIFY_NONE)
+
+UPLOADED = 'uploaded'
+RESUMED = 'resumed'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+# characters a shell (cmd or sh) would act on inside double quotes, never put in a command line
+UNSAFE_CHARACTERS = re.compile(r'["%!^&|<>`$\r\n]')
+
+
+class LocalFile:
+    # a file ready to upload: name on the host, local path, size and sha256
+    def __init__(self, name, path, size, sha256):
+        self.name = name
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+
+class StagedFile:
+    # file-like target for the multipart parser, spools a part to disk and hashes it
+    def __init__(self, directory, filename):
+        self.filename = filename
+        self._file = tempfile.NamedTemporaryFile(dir=directory, prefix='upload-', delete=False)
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self._hash.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def tell(self):
+        return self._file.tell()
+
+    def read(self, *args):
+        return self._file.read(*args)
+
+    def flush(self):
+        return self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def local_file(self, name):
+        self._file.close()
+        return LocalFile(name, self._file.name, self.size, self._hash.hexdigest())
+
+    def discard(self):
+        self._file.close()
+        try:
+            os.remove(self._file.name)
+        except OSError:
+            pass
+
+
+def staging_stream_factory(directory, staged):
+    # stream_factory for werkzeug's form parser, each file part lands in a StagedFile
+    os.makedirs(directory, exist_ok=True)
+
+    def factory(total_content_length, content_type, filename, content_length=None):
+        staged_file = StagedFile(directory, filename)
+        staged.append(staged_file)
+        return staged_file
+
+    return factory
+
+
+def safe_name(filename):
+    # keep only the file name, the host directory comes from the request, and replace
+    # anything outside letters, digits, space and ._-()+ so it is safe in a command line
+    name = os.path.basename((filename or '').replace('\\', '/'))
+    return re.sub(r'[^\w .()+-]', '_', name).strip(' .') or 'upload'
+
+
+def remote_sha256(client, path):
+    # sha256 of a file on the host, certutil on windows, sha256sum elsewhere, None if neither works
+    # or the path cannot be quoted safely (the file is then sent again rather than skipped)
+    if UNSAFE_CHARACTERS.search(path):
+        logger.info(f"sftp_upload, not hashing {path!r}, it cannot be quoted for the host shell")
+        return None
+    for command in (f'certutil -hashfile "{path}" SHA256', f'sha256sum "{path}"'):
+        try:
+            _, stdout, _ = client.exec_command(command)
+            output = stdout.read().decode('utf-8', errors='replace')
+        except Exception as e:
+            logger.info(f"sftp_upload, hashing {path} failed: {e}")
+            continue
+        match = re.search(r'\b([0-9a-fA-F]{64})\b', output.replace(' ', ''))
+        if match:
+            return match.group(1).lower()
+    return None
+
+
+def remote_size(sftp, path):
+    try:
+        attributes = sftp.stat(path)
+    except IOError:
+        return None
+    return None if stat.S_ISDIR(attributes.st_mode or 0) else attributes.st_size
+
+
+class UploadProgress:
+    # bytes and files done across the concurrent transfers, reported through callback(dict)
+    def __init__(self, files, callback=None):
+        self.files_total = len(files)
+        self.bytes_total = sum(local.size for local in files)
+        self.files_done = 0
+        self.bytes_done = 0
+        self.callback = callback
+        self._lock = threading.Lock()
+        self._reported = 0
+
+    def add(self, sent=0, finished=False):
+        with self._lock:
+            self.bytes_done += sent
+            if finished:
+                self.files_done += 1
+            now = time.time()
+            if self.callback is not None and (finished or now - self._reported > 0.5):
+                self._reported = now
+                self.callback({
+                    'files_done': self.files_done,
+                    'files_total': self.files_total,
+                    'bytes_done': self.bytes_done,
+                    'bytes_total': self.bytes_total,
+                })
+
+
+def upload_file(client, local, directory, verify, chunk_size, progress):
+    # one file on its own sftp channel, returns its outcome
+    started = time.time()
+    remote_path = str(Path(directory) / local.name)
+    part_path = f'{remote_path}.{local.sha256[:12]}.part'
+    outcome = {'file': local.name, 'size': local.size, 'sha256': local.sha256, 'bytes_sent': 0}
+
+    sftp = client.open_sftp()
+    try:
+        # already there?
+        existing = remote_size(sftp, remote_path)
+        if existing == local.size and verify != VERIFY_NONE:
+            if verify == VERIFY_SIZE or remote_sha256(client, remote_path) == local.sha256:
+                progress.add(local.size, finished=True)
+                outcome.update(status=SKIPPED, elapsed=round(time.time() - started, 3))
+                return outcome
+
+        # resume a cut off upload of the same content
+        offset = remote_size(sftp, part_path) or 0
+        if offset > local.size:
+            offset = 0
+        progress.add(offset)
+
+        with open(local.path, 'rb') as source:
+            source.seek(offset)
+            with sftp.open(part_path, 'r+b' if offset else 'wb', bufsize=chunk_size) as target:
+                # writes go out without waiting for each ack, errors surface on close
+                target.seek(offset)
+                target.set_pipelined(True)
+                while True:
+                    chunk = source.read(chunk_size)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    outcome['bytes_sent'] += len(chunk)
+                    progress.add(len(chunk))
+
+        if existing is not None:
+            sftp.remove(remote_path)
+        sftp.rename(part_path, remote_path)
+
+        progress.add(finished=True)
+        outcome.update(status=RESUMED if offset else UPLOADED, resumed_from=offset,
+                       elapsed=round(time.time() - started, 3))
+        return outcome
+    finally:
+        sftp.close()
+
+
+def upload_files(client, files, directory, concurrency=4, chunk_size=1024 * 1024, verify=VERIFY_HASH,
+                 callback=None):
+    # upload LocalFiles to directory on the host the client is connected to, returns an outcome per file
+    progress = UploadProgress(files, callback)
+    outcomes = {}
+
+    def run(local):
+        try:
+            outcomes[local.name] = upload_file(client, local, directory, verify, chunk_size, progress)
+        except Exception as e:
+            logger.info(f"sftp_upload, {local.name} failed: {e}")
+            progress.add(finished=True)
+            outcomes[local.name] = {'file': local.name, 'size': local.size, 'sha256': local.sha256,
+                                    'status': FAILED, 'error': str(e)}
+
+    # make sure the target directory exists before the transfers race to it
+    sftp = client.open_sftp()
+    try:
+        if remote_size(sftp, directory) is not None:
+            raise IOError(f'{directory} is a file')
+        try:
+            sftp.stat(directory)
+        except IOError:
+            sftp.mkdir(directory)
+    finally:
+        sftp.close()
+
+    # a deadline (gevent.Timeout) raised in join() must not leave transfers writing after the
+    # caller has handed the connection back
+    pool = Pool(concurrency)
+    try:
+        for local in files:
+            pool.spawn(run, local)
+        pool.join()
+    finally:
+        pool.kill()
+
+    return [outcomes[local.name] for local in files]
@@ -0,0 +1,220 @@
+# innovation-hub-api - container2 - api/ssh_pool.py
+#
+# Pooled, keep-alive SSH connections for the host helpers.  Connections are keyed by
+# (host, username, password) and held open with transport keepalives, so an action on
+# a host costs one channel open on an existing connection instead of a TCP connect,
+# key exchange and password auth (most of a second against Windows OpenSSH).
+#
+# Helpers lease a connection for a block of work.  The lease behaves like the
+# paramiko.SSHClient the helpers used before (connect, exec_command, open_sftp,
+# close, with-block), so closing it only hands the connection back to the pool.
+# A connection idle for a while is health checked with a channel open before it is
+# reused, a connection that turns out dead is reopened once, transparently (never
+# while its transport is still alive, other leases may be using it), and
+# connections unused for longer than the idle timeout (or beyond the pool limit)
+# are closed.
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import paramiko
+
+logger = logging.getLogger()
+
+
+class SshConnection:
+    def __init__(self, hostname, username, password, connect_timeout, keepalive):
+        self.hostname = hostname
+        self.username = username
+        self.password = password
+        self.connect_timeout = connect_timeout
+        self.keepalive = keepalive
+
+        self.client = None
+        self.last_used = time.time()
+
+        # leases currently using the connection, it is never evicted while in use
+        self.users = 0
+
+        self._lock = threading.Lock()
+
+    def is_active(self):
+        transport = self.client.get_transport() if self.client is not None else None
+        return transport is not None and transport.is_active()
+
+    def healthy(self):
+        # a channel open proves the far end is still there, not just our socket
+        try:
+            self.client.get_transport().open_session(timeout=self.connect_timeout).close()
+            return True
+        except Exception as e:
+            logger.info(f"ssh_pool, health check failed for {self.hostname}: {e}")
+            return False
+
+    def ensure_connected(self, health_check_after):
+        with self._lock:
+            if self.is_active():
+                # a connection other leases are using is in use, not idle
+                if time.time() - self.last_used < health_check_after or self.users > 1 or self.healthy():
+                    return
+            self._open()
+
+    def reconnect(self, failed_client):
+        # reopen after failed_client errored, unless another lease already reopened it or the
+        # transport is still alive - other leases may have channels open on it
+        with self._lock:
+            if self.client is not failed_client:
+                return
+            if self.is_active() and self.healthy():
+                return
+            self._open()
+
+    def _open(self):
+        self._close_client()
+        logger.info(f"ssh_pool, opening connection to {self.hostname}")
+
+        client = paramiko.SSHClient()
+
+        # Automatically add the remote host key (not recommended for production use)
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+
+        client.connect(self.hostname, username=self.username, password=self.password,
+                       timeout=self.connect_timeout, banner_timeout=self.connect_timeout,
+                       auth_timeout=self.connect_timeout)
+        client.get_transport().set_keepalive(self.keepalive)
+        self.client = client
+
+    def _close_client(self):
+        if self.client is not None:
+            try:
+                self.client.close()
+            except Exception:
+                pass
+            self.client = None
+
+    def close(self):
+        with self._lock:
+            self._close_client()
+
+
+class SshLease:
+    # stands in for a paramiko.SSHClient inside the host helpers
+    def __init__(self, pool):
+        self.pool = pool
+        self.connection = None
+
+    def connect(self, hostname, username=None, password=None, **kwargs):
+        self.close()
+        self.connection = self.pool.acquire(hostname, username, password)
+
+    def _call(self, operation):
+        # run operation(client), reopening the connection once if it was dropped under us
+        if self.connection is None:
+            raise paramiko.SSHException('Not connected')
+        client = self.connection.client
+        try:
+            return operation(client)
+        except paramiko.ChannelException:
+            # the server refused the channel (e.g. too many sessions), the connection is fine
+            raise
+        except (paramiko.SSHException, EOFError, OSError, AttributeError) as e:
+            logger.info(f"ssh_pool, connection to {self.connection.hostname} failed ({e}), reconnecting if dead")
+            self.connection.reconnect(client)
+            return operation(self.connection.client)
+
+    def exec_command(self, command, **kwargs):
+        return self._call(lambda client: client.exec_command(command, **kwargs))
+
+    def open_sftp(self):
+        return self._call(lambda client: client.open_sftp())
+
+    def get_transport(self):
+        return self.connection.client.get_transport() if self.connection is not None else None
+
+    def close(self):
+        # hand the connection back, it stays open for the next lease
+        if self.connection is not None:
+            self.pool.release(self.connection)
+            self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SshPool:
+    def __init__(self, max_connections=64, idle_timeout=300, keepalive=30, connect_timeout=10,
+                 health_check_after=60):
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        self.connect_timeout = connect_timeout
+        self.health_check_after = health_check_after
+
+        # (hostname, username, password) -> SshConnection, least recently used first
+        self._connections = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lease(self):
+        return SshLease(self)
+
+    def acquire(self, hostname, username, password):
+        key = (hostname, username, password)
+        with self._lock:
+            self._expire_idle()
+
+            connection = self._connections.get(key)
+            if connection is None:
+                connection = SshConnection(hostname, username, password, self.connect_timeout, self.keepalive)
+                self._connections[key] = connection
+            self._connections.move_to_end(key)
+            connection.users += 1
+
+            # bound the number of open connections, never closing one in use
+            for evict_key in list(self._connections):
+                if len(self._connections) <= self.max_connections:
+                    break
+                evicted = self._connections[evict_key]
+                if evicted.users == 0:
+                    del self._connections[evict_key]
+                    evicted.close()
+
+        try:
+            connection.ensure_connected(self.health_check_after)
+        except Exception:
+            self.release(connection)
+            raise
+        return connection
+
+    def release(self, connection):
+        with self._lock:
+            connection.users = max(0, connection.users - 1)
+            connection.last_used = time.time()
+
+    def _expire_idle(self):
+        now = time.time()
+        for key in list(self._connections):
+            connection = self._connections[key]
+            if connection.users == 0 and now - connection.last_used > self.idle_timeout:
+                logger.info(f"ssh_pool, closing idle connection to {connection.hostname}")
+                del self._connections[key]
+                connection.close()
+
+    def close(self, hostname):
+        # drop every connection to a host, e.g. when it is removed or rebooted
+        with self._lock:
+            keys = [key for key in self._connections if key[0] == hostname]
+            connections = [self._connections.pop(key) for key in keys]
+        for connection in connections:
+            connection.close()
+
+    def close_all(self):
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for connection in connections:
+            connection.close()
@@ -0,0 +1,124 @@
+# innovation-hub-api - container2 - api/wake_on_lan.py
+#
+# Wake-on-lan for a whole room.  Each host's magic packet and broadcast addresses are
+# worked out once up front - the broadcast from the subnet the host is configured to
+# be on (WOL_SUBNETS) or a default prefix, rather than always a /24 - then every host
+# is sent a few bursts of packets from one socket, since a single udp broadcast is
+# easily lost.  After that each host's ssh port is watched until it answers, so the
+# caller sees when every pc is actually ready and how long it took.
+
+import logging
+import socket
+import time
+from ipaddress import IPv4Address, IPv4Network
+
+import gevent
+from gevent.pool import Pool
+
+logger = logging.getLogger()
+
+WAITING = 'waiting'
+READY = 'ready'
+TIMED_OUT = 'timed_out'
+FAILED = 'failed'
+
+
+def mac_bytes(mac_address):
+    # 6 bytes from aa:bb:cc:dd:ee:ff, aa-bb-..., or aabbccddeeff, ValueError if it is not a mac
+    digits = (mac_address or '').replace(':', '').replace('-', '').replace('.', '').strip()
+    if len(digits) != 12:
+        raise ValueError(f'Invalid MAC address: {mac_address}')
+    return bytes.fromhex(digits)
+
+
+def magic_packet(mac_address):
+    return b'\xFF' * 6 + mac_bytes(mac_address) * 16
+
+
+def parse_subnets(subnets):
+    # 'a.b.c.d/n, ...' (or a list) -> [IPv4Network], most specific first
+    if isinstance(subnets, str):
+        subnets = [subnet.strip() for subnet in subnets.split(',')]
+    networks = [IPv4Network(subnet, strict=False) for subnet in subnets or [] if subnet]
+    return sorted(networks, key=lambda network: network.prefixlen, reverse=True)
+
+
+def broadcast_address(host_address, subnets=(), default_prefix=24):
+    # directed broadcast of the configured subnet holding the host, else of its default_prefix network
+    address = IPv4Address(host_address)
+    for network in subnets:
+        if address in network:
+            return str(network.broadcast_address)
+    return str(IPv4Network(f'{host_address}/{default_prefix}', strict=False).broadcast_address)
+
+
+class WakeTarget:
+    # one host to wake, packet and broadcast worked out once
+    def __init__(self, host_address, mac_address, subnets=(), default_prefix=24):
+        self.host_address = host_address
+        self.mac_address = mac_address
+        self.packet = magic_packet(mac_address)
+        self.broadcast = broadcast_address(host_address, subnets, default_prefix)
+
+        self.state = WAITING
+        self.error = None
+        self.packets_sent = 0
+        self.ready_after = None
+
+    def as_dict(self):
+        return {
+            'mac_address': self.mac_address,
+            'broadcast': self.broadcast,
+            'packets_sent': self.packets_sent,
+            'state': self.state,
+            'ready_after': self.ready_after,
+            'error': self.error,
+        }
+
+
+def send_bursts(targets, repeats=3, interval=0.5, port=9):
+    # every target's packet to its broadcast address, repeats times, interval seconds apart
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        for burst in range(repeats):
+            if burst:
+                gevent.sleep(interval)
+            for target in targets:
+                try:
+                    sock.sendto(target.packet, (target.broadcast, port))
+                    target.packets_sent += 1
+                except OSError as e:
+                    logger.info(f"wake_on_lan, sending to {target.host_address} via {target.broadcast} failed: {e}")
+                    target.error = str(e)
+
+    for target in targets:
+        if not target.packets_sent:
+            target.state = FAILED
+
+
+def wait_until_ready(targets, probe, timeout=300, poll_interval=5, started=None, callback=None, concurrency=50):
+    # probe(target) -> True once the host is up; each target ends READY (with ready_after) or TIMED_OUT
+    started = started or time.time()
+
+    def watch(target):
+        while True:
+            try:
+                if probe(target):
+                    target.state = READY
+                    target.ready_after = round(time.time() - started, 1)
+                    break
+            except Exception as e:
+                target.error = str(e)
+            if time.time() - started >= timeout:
+                target.state = TIMED_OUT
+                break
+            gevent.sleep(poll_interval)
+
+        if callback is not None:
+            callback(targets)
+
+    pool = Pool(concurrency)
+    for target in targets:
+        if target.state == WAITING:
+            pool.spawn(watch, target)
+    pool.join()
@@ -0,0 +1,128 @@
+"""
+Benchmark the Epson projector transports against mock_projector.
+
+For HTTP, TCP and serial this measures, through the full Projector stack
+(scheduler, shared connections, serial queue):
+
+  latency       per-command round trip of sequential reads
+  throughput    sequential reads per second
+  scaling       reads per second and p95 latency with N concurrent callers
+
+    python benchmark.py --requests 200 --concurrency 1,2,4,8,16 --latency 0.04
+
+Use benchmark_api.py for the API layers built on top of these transports.
+"""
+import argparse
+import asyncio
+import time
+
+import aiohttp
+
+import epson_projector as epson
+from epson_projector.const import HTTP, POWER, SERIAL, TCP
+
+from mock_projector import POWER_ON, MockProjectorState, SerialMock, start_http, start_tcp
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(round(fraction * (len(samples) - 1))))]
+
+
+def summary(samples):
+    return "min {:.1f}  p50 {:.1f}  p95 {:.1f}  p99 {:.1f}  max {:.1f} ms".format(
+        *[value * 1000 for value in (
+            min(samples),
+            percentile(samples, 0.5),
+            percentile(samples, 0.95),
+            percentile(samples, 0.99),
+            max(samples),
+        )]
+    )
+
+
+async def timed(projector, command):
+    start = time.perf_counter()
+    value = await projector.get_property(command)
+    if not value:
+        raise RuntimeError(f"No answer to {command}")
+    return time.perf_counter() - start
+
+
+async def run_concurrent(projector, command, requests, concurrency):
+    """requests reads spread over concurrency callers, returns (elapsed, latencies)."""
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def caller():
+        for _ in remaining:
+            latencies.append(await timed(projector, command))
+
+    start = time.perf_counter()
+    await asyncio.gather(*[caller() for _ in range(concurrency)])
+    return time.perf_counter() - start, latencies
+
+
+async def bench_transport(name, projector, command, requests, levels):
+    # first request opens the connection / does the digest or ESC/VP handshake
+    await timed(projector, command)
+
+    elapsed, latencies = await run_concurrent(projector, command, requests, 1)
+    print(f"\n{name}")
+    print(f"  latency     {summary(latencies)}")
+    print(f"  throughput  {requests / elapsed:.1f} req/s sequential")
+    for concurrency in levels:
+        elapsed, latencies = await run_concurrent(projector, command, requests, concurrency)
+        print(
+            f"  scaling     {concurrency:>3} callers  {requests / elapsed:8.1f} req/s"
+            f"  p95 {percentile(latencies, 0.95) * 1000:.1f} ms"
+        )
+
+
+async def main(args):
+    state = MockProjectorState(latency=args.latency, power=POWER_ON)
+    levels = [int(level) for level in args.concurrency.split(",")]
+    transports = args.transports.split(",")
+
+    http = await start_http(state, args.host, args.http_port)
+    tcp = await start_tcp(state, args.host, args.tcp_port)
+    serial = SerialMock(state) if SERIAL in transports else None
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            if HTTP in transports:
+                projector = epson.Projector(args.host, websession=session, type=HTTP, port=args.http_port)
+                await bench_transport("http", projector, args.command, args.requests, levels)
+            if TCP in transports:
+                projector = epson.Projector(args.host, type=TCP, port=args.tcp_port)
+                await bench_transport("tcp", projector, args.command, args.requests, levels)
+                projector.close()
+                await projector.wait_closed()
+            if serial is not None:
+                projector = epson.Projector(serial.start(), type=SERIAL)
+                # 9600 baud is slow, a tenth of the requests is plenty
+                await bench_transport("serial", projector, args.command, max(10, args.requests // 10), levels)
+                projector.close()
+                await projector.wait_closed()
+    finally:
+        await http.cleanup()
+        for server in tcp:
+            server.close()
+        if serial is not None:
+            serial.stop()
+    print(f"\nmock handled {state.requests} requests")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Epson projector transports")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--http-port", type=int, default=8080)
+    parser.add_argument("--tcp-port", type=int, default=3629)
+    parser.add_argument("--transports", default="http,tcp,serial")
+    parser.add_argument("--command", default=POWER)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", default="1,2,4,8,16")
+    parser.add_argument("--latency", type=float, default=0.04, help="mock processing time per request")
+    asyncio.get_event_loop().run_until_complete(main(parser.parse_args()))
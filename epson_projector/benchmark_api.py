@@ -0,0 +1,185 @@
+"""
+Benchmark the API layers built on the projector transports.
+
+Starts mock_projector.py in a subprocess (one simulated projector per
+loopback address) and measures the container2 building blocks the routes
+use, under gevent like the API itself:
+
+  digest        per-request digest auth vs the pooled ProjectorSessionManager
+  volume        ProjectorVolumeEngine ramping the volume 0 -> 20 -> 0
+  loop          ProjectorLoop bridge (gevent -> asyncio library) over TCP
+  room          fan_out.run_concurrently across every projector
+
+With --api-url the routes of a running API are measured instead:
+
+    python benchmark_api.py --projectors 4 --requests 100
+    python benchmark_api.py --api-url http://localhost:5000 --room R1 --display 192.168.128.18
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import requests
+from gevent.pool import Pool
+from requests.auth import HTTPDigestAuth
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "container2", "api"))
+
+from epson_projector.const import POWER, TCP  # noqa: E402 - the container2 copy
+
+from benchmark import percentile, summary  # noqa: E402
+from fan_out import run_concurrently  # noqa: E402
+from projector_loop import ProjectorLoop  # noqa: E402
+from projector_sessions import ProjectorSessionManager  # noqa: E402
+from projector_volume import ProjectorVolumeEngine  # noqa: E402
+
+USERNAME = "EPSONWEB"
+PASSWORD = "admin"
+
+
+def start_mock(hosts, http_port, latency):
+    process = subprocess.Popen(
+        [
+            sys.executable, os.path.join(HERE, "mock_projector.py"),
+            "--host", ",".join(hosts),
+            "--http-port", str(http_port),
+            "--on",
+            "--latency", str(latency),
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 10
+    for host in hosts:
+        while True:
+            try:
+                socket.create_connection((host, http_port), timeout=1).close()
+                break
+            except OSError:
+                if time.time() > deadline:
+                    process.kill()
+                    raise RuntimeError("mock projector did not start")
+                time.sleep(0.1)
+    return process
+
+
+def measure(call, requests_count, concurrency):
+    """Run call() requests_count times over concurrency greenlets, returns (elapsed, latencies)."""
+    latencies = []
+
+    def timed():
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+
+    pool = Pool(concurrency)
+    start = time.perf_counter()
+    for _ in range(requests_count):
+        pool.spawn(timed)
+    pool.join(raise_error=True)
+    return time.perf_counter() - start, latencies
+
+
+def report(name, call, requests_count, levels):
+    call()
+    elapsed, latencies = measure(call, requests_count, 1)
+    print(f"\n{name}")
+    print(f"  latency     {summary(latencies)}")
+    print(f"  throughput  {requests_count / elapsed:.1f} req/s sequential")
+    for concurrency in levels:
+        elapsed, latencies = measure(call, requests_count, concurrency)
+        print(
+            f"  scaling     {concurrency:>3} callers  {requests_count / elapsed:8.1f} req/s"
+            f"  p95 {percentile(latencies, 0.95) * 1000:.1f} ms"
+        )
+
+
+def bench_mock(args, levels):
+    hosts = [f"127.0.0.{index + 1}" for index in range(args.projectors)]
+    process = start_mock(hosts, args.http_port, args.latency)
+    try:
+        display = f"{hosts[0]}:{args.http_port}"
+        url = f"http://{display}/lighting/api/v01/pj/power"
+
+        # what every route did before the session pool: new connection and a 401 round trip per request
+        def unpooled():
+            requests.get(url, auth=HTTPDigestAuth(USERNAME, PASSWORD), timeout=10).raise_for_status()
+
+        sessions = ProjectorSessionManager(pool_size=args.pool_size)
+
+        def pooled():
+            sessions.get(display, USERNAME, PASSWORD, url).raise_for_status()
+
+        report("digest, per-request auth", unpooled, args.requests, levels)
+        report("digest, ProjectorSessionManager", pooled, args.requests, levels)
+
+        engine = ProjectorVolumeEngine(sessions)
+        print("\nvolume, ProjectorVolumeEngine")
+        for target in (0, 20, 0):
+            start = time.perf_counter()
+            engine.set_volume(display, USERNAME, PASSWORD, target)
+            print(f"  to {target:>2}       {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        loop = ProjectorLoop()
+        report("loop, TCP get_property", lambda: loop.get_property(hosts[0], POWER, type=TCP), args.requests, levels)
+
+        displays = {f"{host}:{args.http_port}": () for host in hosts}
+
+        def power(display_address):
+            url = f"http://{display_address}/lighting/api/v01/pj/power"
+            return sessions.get(display_address, USERNAME, PASSWORD, url).json()
+
+        print(f"\nroom, {len(hosts)} projectors")
+        for name, call in (
+            ("sequential", lambda: [power(display_address) for display_address in displays]),
+            ("fan_out   ", lambda: run_concurrently(displays, power, deadline=10)),
+            ("loop many ", lambda: loop.get_property_many(hosts, POWER, type=TCP)),
+        ):
+            elapsed, latencies = measure(call, max(1, args.requests // 10), 1)
+            print(f"  {name}  p50 {percentile(latencies, 0.5) * 1000:.1f} ms per room")
+
+        loop.stop()
+        sessions.close_all()
+    finally:
+        process.kill()
+
+
+def bench_api(args, levels):
+    base = args.api_url.rstrip("/")
+    routes = {
+        "GET get_projector_power (cached)": f"{base}/get_projector_power/{args.room}/{args.display}",
+        "GET get_projector_power (fresh)": f"{base}/get_projector_power/{args.room}/{args.display}?fresh=1",
+        "GET display_status": f"{base}/display_status/{args.room}/{args.display}",
+        "GET display_status (room)": f"{base}/display_status/{args.room}",
+    }
+    session = requests.Session()
+    for name, url in routes.items():
+        report(name, lambda url=url: session.get(url, timeout=30).raise_for_status(), args.requests, levels)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the API layers on mock projectors")
+    parser.add_argument("--projectors", type=int, default=4)
+    parser.add_argument("--http-port", type=int, default=8080)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", default="1,2,4,8,16")
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.04, help="mock processing time per request")
+    parser.add_argument("--api-url", help="benchmark a running API instead")
+    parser.add_argument("--room")
+    parser.add_argument("--display")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    if args.api_url:
+        bench_api(args, levels)
+    else:
+        bench_mock(args, levels)
@@ -133,6 +133,34 @@ EPSON_KEY_COMMANDS = {
 DEFAULT_TIMEOUT_TIME = 3
 TIMEOUT_TIMES = {"PWR ON": 40, "PWR OFF": 10, "SOURCE": 5}
 
+LATENCY_POWER = "power"
+LATENCY_COMMAND = "command"
+LATENCY_QUERY = "query"
+ADAPTIVE_TIMEOUT_LIMITS = {
+    LATENCY_POWER: (10, 60),
+    LATENCY_COMMAND: (2, 15),
+    LATENCY_QUERY: (1, 10),
+}
+ADAPTIVE_TIMEOUT_MARGIN = 1.5
+ADAPTIVE_MIN_SAMPLES = 20
+
+POWER_OFF = "off"
+POWER_WARMING = "warming"
+POWER_ON = "on"
+POWER_COOLING = "cooling"
+POWER_UNKNOWN = "unknown"
+POWER_STATE_CODES = {
+    "00": POWER_OFF,
+    "01": POWER_ON,
+    "02": POWER_WARMING,
+    "03": POWER_COOLING,
+    "04": POWER_OFF,
+    "05": POWER_OFF,
+    "09": POWER_OFF,
+}
+POWER_POLL_TIME = 3
+POWER_TRANSITION_GRACE = 30
+
 DEFAULT_SOURCES = {
     "HDMI1": "HDMI1",
     "HDMI2": "HDMI2",
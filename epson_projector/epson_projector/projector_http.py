@@ -78,7 +78,7 @@ class ProjectorHttp:
     async def send_request(self, params, timeout, type=JSON_QUERY):
         """Send request to Epson."""
         try:
-            with async_timeout.timeout(timeout):
+            async with async_timeout.timeout(timeout):
                 url = "{url}{type}".format(url=self._http_url, type=type)
                 async with self.websession.get(
                     url=url, params=params, headers=self._headers
@@ -93,7 +93,7 @@ class ProjectorHttp:
             aiohttp.ClientError,
             aiohttp.ClientConnectionError,
             TimeoutError,
-            asyncio.exceptions.TimeoutError,
+            asyncio.TimeoutError,
         ):
             raise ProjectorUnavailableError(STATE_UNAVAILABLE)
 
@@ -101,7 +101,7 @@ class ProjectorHttp:
         """Send TCP request for serial to Epson."""
         if not self._serial:
             try:
-                with async_timeout.timeout(10):
+                async with async_timeout.timeout(10):
                     power_on = await self.get_property(POWER, get_timeout(POWER))
                     if power_on == EPSON_CODES[POWER]:
                         reader, writer = await asyncio.open_connection(
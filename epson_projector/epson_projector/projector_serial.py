@@ -1,10 +1,13 @@
 """Serial USB/RS232 connection of Epson projector module."""
+import itertools
 import logging
+import time
 
 import asyncio
 import serial_asyncio
 from serial.serialutil import SerialException
 from .const import ESCVP_HELLO_COMMAND, COLON, CR, GET_CR, BUSY, ERROR, SNO
+from .error import ProjectorUnavailableError
 import async_timeout
 
 _LOGGER = logging.getLogger(__name__)
@@ -12,10 +15,23 @@ _LOGGER = logging.getLogger(__name__)
 DEFAULT_TIMEOUT = 10
 MAX_TIMEOUTS = 3
 
+# queue priorities, lower is sent first
+PRIORITY_COMMAND = 0
+PRIORITY_POLL = 1
+
+# how long to wait for stray bytes when resynchronising after a timeout
+RESYNC_TIMEOUT = 0.2
+
 
 class ProjectorSerial:
     """
     Epson Serial connector
+
+    Requests from every caller go through one priority queue served by a
+    single task, so writes and reads never interleave on the line.
+    Commands are sent before polls, query responses are matched to their
+    request, the port is reopened transparently after an error and the
+    latency of each command is recorded.
     """
 
     def __init__(self, host):
@@ -31,6 +47,11 @@ class ProjectorSerial:
         self._isOpen = False
         self._loop = asyncio.get_running_loop()
         self._serial = None
+        self._queue = None
+        self._worker = None
+        self._sequence = itertools.count()
+        self._resync = False
+        self.latencies = {}
 
     async def async_init(self):
         """Async init to open serial connection with projector."""
@@ -42,7 +63,7 @@ class ProjectorSerial:
             except:
                 pass
         try:
-            with async_timeout.timeout(DEFAULT_TIMEOUT):
+            async with async_timeout.timeout(DEFAULT_TIMEOUT):
                 (
                     self._reader,
                     self._writer,
@@ -73,6 +94,29 @@ class ProjectorSerial:
         return False
 
     def close(self):
+        """
+        Close the port, stop the worker and fail every queued request.
+
+        Await wait_closed() afterwards to let the worker finish.
+        """
+        self._close_port()
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+        while self._queue is not None and not self._queue.empty():
+            future = self._queue.get_nowait()[-1]
+            if not future.done():
+                future.set_exception(ProjectorUnavailableError("Connection closed"))
+
+    async def wait_closed(self):
+        """Wait for the worker cancelled by close() to finish."""
+        if self._worker is not None:
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def _close_port(self):
         if self._writer and not self._writer.is_closing():
             _LOGGER.debug("Closing serial connection")
             self._writer.close()
@@ -84,9 +128,25 @@ class ProjectorSerial:
         if self._timeouts >= MAX_TIMEOUTS:
             self._writer.close()
 
-    async def get_property(self, command, timeout):
+    async def get_property(self, command, timeout, priority=PRIORITY_POLL):
         """Get property state from device."""
-        response = await self.send_request(timeout=timeout, command=command + GET_CR)
+        response = await self.send_request(
+            timeout=timeout, command=command + GET_CR, priority=priority
+        )
+        return self._parse_property(response)
+
+    async def get_properties(self, commands, timeout, priority=PRIORITY_POLL):
+        """Get several properties in one pipelined request, values in order."""
+        responses = await self.send_request(
+            timeout=timeout,
+            command=tuple(command + GET_CR for command in commands),
+            priority=priority,
+        )
+        if not responses:
+            return [False] * len(commands)
+        return [self._parse_property(response) for response in responses]
+
+    def _parse_property(self, response):
         if not response:
             return False
         try:
@@ -102,34 +162,128 @@ class ProjectorSerial:
         response = await self.send_request(timeout=timeout, command=command + CR)
         return response
 
-    async def send_request(self, timeout, command):
-        """Send request to Epson over serial."""
-        if self._writer and not self._isOpen:
-            self._writer.close()
-        if self._writer is None or self._writer.is_closing():
-            await self.async_init()
-        if self._writer and self._isOpen and command:
+    async def send_request(self, timeout, command, priority=PRIORITY_COMMAND):
+        """
+        Queue a request to Epson over serial and wait for its response.
+
+        :param timeout:         Seconds to wait for the response once sent
+        :param command:         Request including the trailing CR, or a
+                                tuple of them to pipeline (a list of
+                                responses is returned)
+        :param int priority:    PRIORITY_COMMAND or PRIORITY_POLL
+        """
+        if not command:
+            return False
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._run())
+        future = self._loop.create_future()
+        await self._queue.put((priority, next(self._sequence), command, timeout, future))
+        return await asyncio.shield(future)
+
+    async def _run(self):
+        """Serve queued requests one at a time."""
+        while True:
+            priority, _, command, timeout, future = await self._queue.get()
+            if future.done():
+                continue
             try:
-                with async_timeout.timeout(timeout):
+                response = await self._exchange(timeout, command)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.set_exception(ProjectorUnavailableError("Connection closed"))
+                raise
+            except Exception as err:
+                _LOGGER.error("Error during request %r: %s", command, err)
+                response = False
+            if not future.done():
+                future.set_result(response)
+
+    async def _exchange(self, timeout, command):
+        """
+        Write one request and read its response, reconnecting once on error.
+
+        A tuple of requests is written in one go and their responses read
+        back in order.
+        """
+        commands = command if isinstance(command, tuple) else (command,)
+        for attempt in range(2):
+            if self._writer and not self._isOpen:
+                self._writer.close()
+            if self._writer is None or self._writer.is_closing():
+                await self.async_init()
+            if not (self._writer and self._isOpen):
+                return False
+            try:
+                if self._resync:
+                    await self._discard_pending()
+                started = time.monotonic()
+                async with async_timeout.timeout(timeout):
                     _LOGGER.debug("Sent to Epson: %r with timeout %d", command, timeout)
-                    self._writer.write(command.encode())
-                    response = await self._reader.readuntil(COLON.encode())
-                    response = response[:-1].decode().rstrip(CR)
-                    _LOGGER.debug("Response from Epson %r", response)
+                    self._writer.write("".join(commands).encode())
+                    responses = [await self._read_response(request) for request in commands]
+                self._record_latency("".join(commands), time.monotonic() - started)
+                self._timeouts = 0
+                _LOGGER.debug("Response from Epson %r", responses)
+                for request, response in zip(commands, responses):
                     if response == ERROR:
-                        _LOGGER.error("Error response to request %r", command)
-                    else:
-                        return response
+                        _LOGGER.error("Error response to request %r", request)
+                responses = [False if response == ERROR else response for response in responses]
+                return responses if isinstance(command, tuple) else responses[0]
             except asyncio.TimeoutError:
                 _LOGGER.error("Timeout error during sending request %r", command)
+                # a late response may still arrive, drop it before the next request
+                self._resync = True
                 self._timeouts += 1
                 self._check_timeout_reconnect()
-            except SerialException as se:
+                return False
+            except (SerialException, asyncio.IncompleteReadError) as se:
                 _LOGGER.error(f"Error during serial write/read: {se}")
-                self.close()
-
+                self._close_port()
         return False
 
+    async def _read_response(self, command):
+        """
+        Read frames up to the ':' prompt until one answers the request.
+
+        A query ("PWR?") must be answered by "PWR=..." or ERR and a command
+        by a bare prompt or ERR, anything else is a late answer to an
+        earlier query and is skipped.
+        """
+        expected = None
+        if command.endswith(GET_CR):
+            expected = command[: -len(GET_CR)] + "="
+        while True:
+            response = await self._reader.readuntil(COLON.encode())
+            response = response[:-1].decode().strip(CR)
+            if response == ERROR:
+                return response
+            if expected is None and "=" not in response:
+                return response
+            if expected is not None and response.startswith(expected):
+                return response
+            _LOGGER.debug("Skipping unmatched response %r to %r", response, command)
+
+    async def _discard_pending(self):
+        """Drop bytes left on the line by a request that timed out."""
+        self._resync = False
+        while True:
+            try:
+                async with async_timeout.timeout(RESYNC_TIMEOUT):
+                    data = await self._reader.read(1024)
+            except asyncio.TimeoutError:
+                return
+            if not data:
+                return
+
+    def _record_latency(self, command, seconds):
+        """Per command latency: count, last and running average in seconds."""
+        stats = self.latencies.setdefault(command.strip(CR), {"count": 0, "last": 0, "average": 0})
+        stats["count"] += 1
+        stats["last"] = seconds
+        stats["average"] += (seconds - stats["average"]) / stats["count"]
+
     async def get_serial(self):
         """Send request for serial to Epson."""
         if not self._serial:
@@ -1,5 +1,6 @@
 """TCP connection of Epson projector module."""
 import logging
+import weakref
 
 import asyncio
 import async_timeout
@@ -9,6 +10,7 @@ from .const import (
     ESCVPNET_HELLO_COMMAND,
     ESCVPNETNAME,
     ERROR,
+    COLON,
     CR,
     CR_COLON,
     GET_CR,
@@ -21,50 +23,177 @@ from .timeout import get_timeout
 
 _LOGGER = logging.getLogger(__name__)
 
+CONNECT_TIMEOUT = 10
+HELLO_RESPONSE_LENGTH = 16
+HELLO_STATUS_OK = 32
 
-class ProjectorTcp:
+# {event loop: {(host, port): TcpConnection}} - streams belong to the loop that opened them
+_CONNECTIONS = weakref.WeakKeyDictionary()
+
+
+def get_connection(host, port):
+    """Return the shared connection to a projector, creating it if needed."""
+    connections = _CONNECTIONS.setdefault(asyncio.get_running_loop(), {})
+    connection = connections.get((host, port))
+    if connection is None:
+        connection = TcpConnection(host, port)
+        connections[(host, port)] = connection
+    return connection
+
+
+class TcpConnection:
     """
-    Epson TCP connector
+    Persistent ESC/VP.net connection to one projector.
+
+    Requests are queued so concurrent callers share the socket one
+    request/response at a time. A dropped connection is reopened,
+    with the ESC/VP.net handshake replayed, on the next request.
     """
 
-    def __init__(self, host, port=3629):
+    def __init__(self, host, port):
         """
-        Epson TCP connector
+        Persistent ESC/VP.net connection.
 
         :param str host:    IP address of Projector
-        :param int port:    Port to connect to. Default 3629.
+        :param int port:    Port to connect to.
         """
         self._host = host
         self._port = port
+        self._reader = None
+        self._writer = None
         self._isOpen = False
-        self._serial = None
-        self._loop = asyncio.get_running_loop()
+        self._queue = None
+        self.serial = None
 
-    async def async_init(self):
-        """Async init to open connection with projector."""
+    @property
+    def is_open(self):
+        return self._isOpen and self._writer is not None and not self._writer.is_closing()
+
+    async def open(self):
+        """Open the socket and do the ESC/VP.net handshake."""
+        self.close()
         try:
-            with async_timeout.timeout(10):
+            async with async_timeout.timeout(CONNECT_TIMEOUT):
                 self._reader, self._writer = await asyncio.open_connection(
-                    host=self._host, port=self._port, loop=self._loop
+                    host=self._host, port=self._port
                 )
                 self._writer.write(ESCVPNET_HELLO_COMMAND.encode())
-                response = await self._reader.read(16)
-                if response[0:10].decode() == ESCVPNETNAME and response[14] == 32:
+                response = await self._reader.readexactly(HELLO_RESPONSE_LENGTH)
+                if (
+                    response[0:10].decode() == ESCVPNETNAME
+                    and response[14] == HELLO_STATUS_OK
+                ):
                     self._isOpen = True
-                    _LOGGER.info("Connection open")
-                    return
-                else:
-                    _LOGGER.info("Cannot open connection to Epson")
+                    _LOGGER.info("Connection open to %s", self._host)
+                    return True
+                _LOGGER.info("Cannot open connection to Epson")
         except asyncio.TimeoutError:
             _LOGGER.error("Timeout error")
+        except asyncio.IncompleteReadError:
+            _LOGGER.error("Connection closed during handshake")
         except ConnectionRefusedError:
             _LOGGER.error("Connection refused Error")
         except OSError as err:
             _LOGGER.error("No route to host? %s", err)
+        self.close()
+        return False
 
     def close(self):
-        if self._isOpen:
+        if self._writer is not None:
             self._writer.close()
+        self._reader = None
+        self._writer = None
+        self._isOpen = False
+
+    async def request(self, command, timeout):
+        """
+        Send one command and return the response up to the ':' prompt.
+
+        Returns None if the projector could not be reached.
+        """
+        if self._queue is None:
+            self._queue = asyncio.Lock()
+        async with self._queue:
+            # one retry on a fresh connection if the persistent socket went stale
+            for attempt in range(2):
+                if not self.is_open and not await self.open():
+                    return None
+                try:
+                    async with async_timeout.timeout(timeout):
+                        self._writer.write(command.encode())
+                        await self._writer.drain()
+                        response = await self._reader.readuntil(COLON.encode())
+                    return response.decode().replace(CR_COLON, "")
+                except asyncio.TimeoutError:
+                    # a late response would be read by the next request, start again
+                    _LOGGER.error("Timeout error during request %r", command)
+                    self.close()
+                    return None
+                except (asyncio.IncompleteReadError, ConnectionError, OSError) as err:
+                    _LOGGER.info("Connection to %s lost: %s", self._host, err)
+                    self.close()
+        return None
+
+    async def request_many(self, commands, timeout):
+        """
+        Pipeline several commands: write them all, then read one response each.
+
+        Returns the responses in order, or None if the projector could not
+        be reached.
+        """
+        if self._queue is None:
+            self._queue = asyncio.Lock()
+        async with self._queue:
+            for attempt in range(2):
+                if not self.is_open and not await self.open():
+                    return None
+                try:
+                    async with async_timeout.timeout(timeout):
+                        self._writer.write("".join(commands).encode())
+                        await self._writer.drain()
+                        responses = []
+                        for _ in commands:
+                            response = await self._reader.readuntil(COLON.encode())
+                            responses.append(response.decode().replace(CR_COLON, ""))
+                    return responses
+                except asyncio.TimeoutError:
+                    _LOGGER.error("Timeout error during pipelined request %r", commands)
+                    self.close()
+                    return None
+                except (asyncio.IncompleteReadError, ConnectionError, OSError) as err:
+                    _LOGGER.info("Connection to %s lost: %s", self._host, err)
+                    self.close()
+        return None
+
+
+class ProjectorTcp:
+    """
+    Epson TCP connector
+    """
+
+    def __init__(self, host, port=3629):
+        """
+        Epson TCP connector
+
+        :param str host:    IP address of Projector
+        :param int port:    Port to connect to. Default 3629.
+        """
+        self._host = host
+        self._port = port
+        self._connection = get_connection(host, port)
+        self._loop = asyncio.get_running_loop()
+
+    @property
+    def _isOpen(self):
+        return self._connection.is_open
+
+    async def async_init(self):
+        """Async init to open connection with projector."""
+        if not self._connection.is_open:
+            await self._connection.open()
+
+    def close(self):
+        self._connection.close()
 
     async def get_property(self, command, timeout, bytes_to_read=16):
         """Get property state from device."""
@@ -72,6 +201,22 @@ class ProjectorTcp:
             timeout=timeout, command=command + GET_CR, bytes_to_read=bytes_to_read
         )
         _LOGGER.debug("Response is %s", response)
+        return self._parse_property(command, response)
+
+    async def get_properties(self, commands, timeout):
+        """Get several properties in one pipelined request, values in order."""
+        responses = await self._connection.request_many(
+            [command + GET_CR for command in commands], timeout
+        )
+        if responses is None:
+            return [False] * len(commands)
+        return [
+            self._parse_property(command, response.rstrip(CR))
+            for command, response in zip(commands, responses)
+        ]
+
+    def _parse_property(self, command, response):
+        """Value from a "CMD=value" response, False if there is none."""
         if not response:
             return False
         try:
@@ -91,34 +236,37 @@ class ProjectorTcp:
         response = await self.send_request(timeout=timeout, command=command + CR)
         return response
 
-    async def send_request(self, timeout, command, bytes_to_read=16):
-        """Send TCP request to Epson."""
-        if self._isOpen is False:
-            await self.async_init()
-        if self._isOpen and command:
-            bytes_to_read = bytes_to_read if bytes_to_read else 16
-            with async_timeout.timeout(timeout):
-                self._writer.write(command.encode())
-                response = await self._reader.read(bytes_to_read)
-                response = response.decode().replace(CR_COLON, "")
-                if response == ERROR:
-                    return False
-                return response
+    async def send_request(self, timeout, command, bytes_to_read=None):
+        """
+        Send TCP request to Epson.
+
+        Responses are framed on the ':' prompt, bytes_to_read is only
+        kept for compatibility.
+        """
+        if not command:
+            return None
+        response = await self._connection.request(command, timeout)
+        if response is None:
+            return None
+        response = response.rstrip(CR)
+        if response == ERROR:
+            return False
+        return response
 
     async def get_serial(self):
         """Send TCP request for serial to Epson."""
-        if not self._serial:
+        if not self._connection.serial:
             try:
-                with async_timeout.timeout(10):
+                async with async_timeout.timeout(10):
                     power_on = await self.get_property(POWER, get_timeout(POWER))
                     if power_on == EPSON_CODES[POWER]:
                         reader, writer = await asyncio.open_connection(
-                            host=self._host, port=TCP_SERIAL_PORT, loop=self._loop
+                            host=self._host, port=TCP_SERIAL_PORT
                         )
                         _LOGGER.debug("Asking for serial number.")
                         writer.write(SERIAL_BYTE)
                         response = await reader.read(32)
-                        self._serial = response[24:].decode()
+                        self._connection.serial = response[24:].decode()
                         writer.close()
                     else:
                         _LOGGER.error("Is projector turned on?")
@@ -126,4 +274,4 @@ class ProjectorTcp:
                 _LOGGER.error(
                     "Timeout error receiving SERIAL of projector. Is projector turned on?"
                 )
-        return self._serial
+        return self._connection.serial
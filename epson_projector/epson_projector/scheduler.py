@@ -0,0 +1,148 @@
+"""Queued command scheduler for Epson projector module."""
+import logging
+
+import asyncio
+
+from .const import BUSY, INV_SOURCES, POWER, SOURCE, TURN_OFF, TURN_ON
+from .lock import Lock
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def command_group(command):
+    """
+    Group of commands that supersede each other.
+
+    A newer power or source command replaces an older one that has not
+    been sent yet, other commands only replace an identical one.
+    """
+    if command in (TURN_ON, TURN_OFF):
+        return POWER
+    if command in INV_SOURCES or command.startswith(SOURCE):
+        return SOURCE
+    return command
+
+
+class _PendingCommand:
+    def __init__(self, command, send, future):
+        self.command = command
+        self.send = send
+        self.future = future
+
+
+class CommandScheduler:
+    """
+    Per projector command queue.
+
+    Commands wait in order until the lock window of the previous one
+    (TIMEOUT_TIMES) has expired instead of being rejected. Pending
+    commands are collapsed: a repeated command, or a newer power/source
+    command, takes the place of the one still waiting and every caller
+    gets the result of the command that was actually sent. Property reads
+    made while the projector is busy are answered from the last value
+    read, if there is one.
+    """
+
+    def __init__(self, ready=None):
+        """
+        Init scheduler for one projector.
+
+        :param ready:   Coroutine function awaited before each command is sent,
+                        e.g. to wait for a power transition to finish
+        """
+        self._ready = ready
+        self._lock = Lock()
+        self._pending = []
+        self._worker = None
+        self._values = {}
+
+    @property
+    def queue_depth(self):
+        """Number of commands waiting to be sent."""
+        return len(self._pending)
+
+    def is_busy(self):
+        """True while a command is in its lock window or commands are queued."""
+        return self._lock.checkLock() or bool(self._pending)
+
+    def wait_time(self):
+        """
+        Seconds a command submitted now waits before it is sent.
+
+        The rest of the current lock window plus the window of every
+        command queued ahead of it, not counting a power transition.
+        """
+        return self._lock.remaining() + sum(self._lock.window(pending.command) for pending in self._pending)
+
+    def last_value(self, command):
+        """Last value read for a property, or BUSY if there is none."""
+        return self._values.get(command, BUSY)
+
+    def release(self):
+        """End the current lock window, queued commands are sent right away."""
+        self._lock.release()
+
+    async def submit(self, command, send):
+        """
+        Queue a command and wait for its response.
+
+        :param str command:     Command to send
+        :param send:            Coroutine function sending the command
+        """
+        group = command_group(command)
+        for pending in self._pending:
+            if command_group(pending.command) == group:
+                _LOGGER.debug("Command %s replaces queued %s", command, pending.command)
+                pending.command = command
+                pending.send = send
+                future = pending.future
+                break
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._pending.append(_PendingCommand(command, send, future))
+
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._run())
+
+        # the command is still sent if this caller gives up waiting
+        return await asyncio.shield(future)
+
+    async def read(self, command, read):
+        """
+        Read a property, or its last value while the projector is busy.
+
+        :param str command:     Property to read
+        :param read:            Coroutine function reading the property
+        """
+        if self.is_busy():
+            return self.last_value(command)
+        value = await read()
+        self.remember(command, value)
+        return value
+
+    def remember(self, command, value):
+        """Keep a value read outside read() for answers while busy."""
+        if value and value != BUSY:
+            self._values[command] = value
+
+    async def _run(self):
+        while self._pending:
+            if self._ready is not None:
+                await self._ready()
+            remaining = self._lock.remaining()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+                continue
+
+            pending = self._pending.pop(0)
+            group = command_group(pending.command)
+            self._values.pop(group, None)
+            self._lock.setLock(pending.command)
+            try:
+                response = await pending.send()
+            except Exception as err:
+                if not pending.future.done():
+                    pending.future.set_exception(err)
+                continue
+            if not pending.future.done():
+                pending.future.set_result(response)
@@ -0,0 +1,443 @@
+"""
+Mock Epson projector for testing and benchmarking without hardware.
+
+Serves the three transports the library and the API talk to, backed by one
+simulated projector state:
+
+  HTTP    cgi-bin/json_query and cgi-bin/directsend (ESC/VP21 over the web
+          control page), /lighting/api/v01/pj/* with digest auth and
+          /api/v01/contentmgr/remote/power/* as used by the API
+  TCP     ESC/VP.net on a configurable port, plus the serial number port
+  SERIAL  a pty pair, the slave path is used as the serial device
+
+Delays are modelled on real projectors: a fixed processing latency per
+request, a warm-up period after power on, cool-down after power off and
+9600 baud on the serial line.
+
+Run standalone:
+
+    python mock_projector.py --http-port 8080 --tcp-port 3629 --serial
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import secrets
+import threading
+import time
+
+from aiohttp import web
+
+_LOGGER = logging.getLogger(__name__)
+
+POWER_OFF = "04"
+POWER_ON = "01"
+POWER_WARMING = "02"
+POWER_COOLING = "03"
+
+SOURCES = {"30": "HDMI1", "A0": "HDMI2", "10": "PC", "53": "LAN"}
+SOURCE_KEYS = {"4D": "30", "40": "A0", "44": "10", "53": "53"}
+PJ_SOURCES = ["HDMI", "SD Player", "LAN", "Spotlight"]
+
+ESCVPNET_HELLO_REPLY = b"ESC/VP.net\x10\x03\x00\x00\x20\x00"
+
+SERIAL_BAUDRATE = 9600
+
+
+class MockProjectorState:
+    """Simulated projector shared by every transport."""
+
+    def __init__(
+        self,
+        warmup_time=20.0,
+        cooldown_time=10.0,
+        latency=0.04,
+        serial_number="X4JK8300123",
+        power=POWER_OFF,
+    ):
+        """
+        Simulated projector state.
+
+        :param warmup_time:     Seconds between PWR ON and the projector being on
+        :param cooldown_time:   Seconds between PWR OFF and the projector being off
+        :param latency:         Seconds each request takes to process
+        :param power:           Power state to start in
+        """
+        self.warmup_time = warmup_time
+        self.cooldown_time = cooldown_time
+        self.latency = latency
+        self.serial_number = serial_number
+
+        self._power = power
+        self._transition_end = 0
+        self.source = "30"
+        self.pj_source = PJ_SOURCES[0]
+        self.volume = 10
+        self.mute = "OFF"
+        self.cmode = "07"
+
+        # counters so tests and benchmarks can check what reached the projector
+        self.requests = 0
+        self.commands = []
+
+    @property
+    def power(self):
+        """Current power state, finishing a warm-up/cool-down once its time is up."""
+        if self._power in (POWER_WARMING, POWER_COOLING) and time.time() >= self._transition_end:
+            self._power = POWER_ON if self._power == POWER_WARMING else POWER_OFF
+        return self._power
+
+    def power_on(self):
+        if self.power in (POWER_OFF, POWER_COOLING):
+            self._power = POWER_WARMING
+            self._transition_end = time.time() + self.warmup_time
+
+    def power_off(self):
+        if self.power in (POWER_ON, POWER_WARMING):
+            self._power = POWER_COOLING
+            self._transition_end = time.time() + self.cooldown_time
+
+    @property
+    def is_on(self):
+        return self.power == POWER_ON
+
+    def escvp(self, command):
+        """
+        Answer one ESC/VP21 command (without the trailing CR).
+
+        Returns the reply text without the ':' prompt, "" for an accepted
+        command and "ERR" for a rejected one.
+        """
+        self.requests += 1
+        command = command.strip()
+        if not command:
+            return ""
+
+        if command.endswith("?"):
+            name = command[:-1]
+            if name == "PWR":
+                return f"PWR={self.power}"
+            if not self.is_on:
+                return "ERR"
+            values = {
+                "SOURCE": self.source,
+                "VOL": str(self.volume * 12),
+                "MUTE": self.mute,
+                "CMODE": self.cmode,
+                "SNO": self.serial_number,
+                "LAMP": "1234",
+            }
+            if name not in values:
+                return "ERR"
+            return f"{name}={values[name]}"
+
+        self.commands.append(command)
+        name, _, value = command.partition(" ")
+        if command == "PWR ON":
+            self.power_on()
+            return ""
+        if command == "PWR OFF":
+            self.power_off()
+            return ""
+        if not self.is_on:
+            return "ERR"
+        if name == "SOURCE" and value in SOURCES:
+            self.source = value
+        elif name == "MUTE" and value in ("ON", "OFF"):
+            self.mute = value
+        elif name == "CMODE" and value:
+            self.cmode = value
+        elif name == "VOL" and value in ("INC", "DEC"):
+            self.volume = max(0, min(20, self.volume + (1 if value == "INC" else -1)))
+        elif name == "KEY" and value:
+            return self._key(value)
+        else:
+            return "ERR"
+        return ""
+
+    def _key(self, code):
+        # remote control key codes used by EPSON_KEY_COMMANDS
+        if code == "3B":
+            # the web page sends the power key twice to switch off, the
+            # second press lands during cool-down and is ignored
+            if self.power == POWER_OFF:
+                self.power_on()
+            elif self.power in (POWER_ON, POWER_WARMING):
+                self.power_off()
+        elif code in SOURCE_KEYS and self.is_on:
+            self.source = SOURCE_KEYS[code]
+        elif code == "56":
+            self.volume = min(20, self.volume + 1)
+        elif code == "57":
+            self.volume = max(0, self.volume - 1)
+        elif code == "D8":
+            self.mute = "OFF" if self.mute == "ON" else "ON"
+        return ""
+
+
+# ===================================================
+# HTTP
+# ===================================================
+class DigestAuth:
+    """Minimal RFC 2617 digest (MD5, qop=auth) checker with nonce counting."""
+
+    def __init__(self, username, password, realm="Epson Projector"):
+        self.username = username
+        self.password = password
+        self.realm = realm
+        # nonce -> last nc seen, a nonce may be reused with an increasing nc
+        self.nonces = {}
+        self.challenges = 0
+
+    def challenge(self):
+        self.challenges += 1
+        nonce = secrets.token_hex(16)
+        self.nonces[nonce] = 0
+        return web.Response(
+            status=401,
+            headers={
+                "WWW-Authenticate": f'Digest realm="{self.realm}", nonce="{nonce}", qop="auth", algorithm=MD5'
+            },
+        )
+
+    def check(self, request):
+        header = request.headers.get("Authorization", "")
+        if not header.startswith("Digest "):
+            return False
+        fields = {}
+        for part in header[len("Digest "):].split(","):
+            key, _, value = part.strip().partition("=")
+            fields[key] = value.strip('"')
+
+        nonce = fields.get("nonce")
+        if fields.get("username") != self.username or nonce not in self.nonces:
+            return False
+        nc = int(fields.get("nc", "0"), 16)
+        if nc <= self.nonces[nonce]:
+            return False
+        self.nonces[nonce] = nc
+
+        def md5(text):
+            return hashlib.md5(text.encode()).hexdigest()
+
+        ha1 = md5(f"{self.username}:{self.realm}:{self.password}")
+        ha2 = md5(f"{request.method}:{fields.get('uri')}")
+        expected = md5(f"{ha1}:{nonce}:{fields.get('nc')}:{fields.get('cnonce')}:{fields.get('qop')}:{ha2}")
+        return fields.get("response") == expected
+
+
+def create_http_app(state, username="EPSONWEB", password="admin"):
+    """aiohttp application serving the projector web interfaces."""
+    auth = DigestAuth(username, password)
+    app = web.Application()
+    app["auth"] = auth
+
+    async def delay():
+        await asyncio.sleep(state.latency)
+
+    async def json_query(request):
+        await delay()
+        query = request.query.get("jsoncallback", "")
+        reply = state.escvp(query)
+        if reply == "ERR":
+            return web.json_response({"projector": {"feature": {"reply": "ERR"}}})
+        value = reply.partition("=")[2]
+        return web.json_response({"projector": {"feature": {"reply": value}}})
+
+    async def directsend(request):
+        await delay()
+        for key, value in request.query.items():
+            state.escvp(f"{key} {value}")
+        return web.Response(text="")
+
+    def digest(handler):
+        async def checked(request):
+            if not auth.check(request):
+                return auth.challenge()
+            await delay()
+            return await handler(request)
+
+        return checked
+
+    async def pj(request):
+        field = request.match_info["field"]
+        if request.method == "GET":
+            if field == "sources":
+                return web.json_response({"sources": PJ_SOURCES})
+            if field == "power":
+                return web.json_response({"power": "ON" if state.is_on else "OFF"})
+            values = {"source": state.pj_source, "volume": state.volume, "mute": state.mute}
+            if field not in values:
+                raise web.HTTPNotFound()
+            return web.json_response({field: values[field]})
+
+        data = await request.json()
+        value = data.get(field)
+        state.requests += 1
+        state.commands.append(f"{field} {value}")
+        if field == "power":
+            state.power_on() if str(value).upper() == "ON" else state.power_off()
+        elif field == "source" and value in PJ_SOURCES:
+            state.pj_source = value
+        elif field == "mute":
+            state.mute = str(value).upper()
+        elif field == "volume" and value in ("INC", "DEC"):
+            if value == "INC" and state.volume >= 20:
+                return web.json_response({"limit": "upper"})
+            if value == "DEC" and state.volume <= 0:
+                return web.json_response({"limit": "lower"})
+            state.volume += 1 if value == "INC" else -1
+        else:
+            raise web.HTTPBadRequest()
+        return web.json_response({})
+
+    async def contentmgr_power(request):
+        state.requests += 1
+        state.power_on() if request.match_info["state"] == "on" else state.power_off()
+        return web.json_response({})
+
+    app.router.add_get("/cgi-bin/json_query", json_query)
+    app.router.add_get("/cgi-bin/directsend", directsend)
+    app.router.add_route("*", "/lighting/api/v01/pj/{field}", digest(pj))
+    app.router.add_get("/api/v01/contentmgr/remote/power/{state}", digest(contentmgr_power))
+    return app
+
+
+async def start_http(state, host="127.0.0.1", port=8080, **kwargs):
+    """Start the HTTP mock, returns the aiohttp AppRunner (call cleanup() to stop)."""
+    runner = web.AppRunner(create_http_app(state, **kwargs))
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    _LOGGER.info("HTTP mock listening on %s:%s", host, port)
+    return runner
+
+
+# ===================================================
+# TCP (ESC/VP.net)
+# ===================================================
+async def start_tcp(state, host="127.0.0.1", port=3629, serial_port=None):
+    """
+    Start the ESC/VP.net mock (and optionally the serial number port).
+
+    Returns the list of asyncio servers.
+    """
+
+    async def handle(reader, writer):
+        try:
+            hello = await reader.readexactly(16)
+            if not hello.startswith(b"ESC/VP.net"):
+                writer.close()
+                return
+            writer.write(ESCVPNET_HELLO_REPLY)
+            while True:
+                line = await reader.readuntil(b"\r")
+                await asyncio.sleep(state.latency)
+                reply = state.escvp(line.decode())
+                writer.write((reply + "\r:" if reply else ":").encode())
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_serial_number(reader, writer):
+        await reader.read(16)
+        writer.write(b"\x00" * 24 + state.serial_number.encode()[:8])
+        await writer.drain()
+        writer.close()
+
+    servers = [await asyncio.start_server(handle, host, port)]
+    if serial_port:
+        servers.append(await asyncio.start_server(handle_serial_number, host, serial_port))
+    _LOGGER.info("ESC/VP.net mock listening on %s:%s", host, port)
+    return servers
+
+
+# ===================================================
+# Serial (pty)
+# ===================================================
+class SerialMock:
+    """Projector on the master side of a pty, slave_path is the serial device."""
+
+    def __init__(self, state, baudrate=SERIAL_BAUDRATE):
+        import pty
+        import tty
+
+        self.state = state
+        self.baudrate = baudrate
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._master)
+        tty.setraw(self._slave)
+        self.slave_path = os.ttyname(self._slave)
+        self._running = False
+
+    def _write(self, data):
+        # 10 bits per byte on the line (start, 8 data, stop)
+        time.sleep(len(data) * 10 / self.baudrate)
+        os.write(self._master, data)
+
+    def _serve(self):
+        buffer = b""
+        while self._running:
+            try:
+                buffer += os.read(self._master, 1024)
+            except OSError:
+                return
+            while b"\r" in buffer:
+                line, buffer = buffer.split(b"\r", 1)
+                time.sleep(self.state.latency)
+                reply = self.state.escvp(line.decode())
+                self._write((reply + "\r:" if reply else ":").encode())
+
+    def start(self):
+        self._running = True
+        threading.Thread(target=self._serve, daemon=True).start()
+        _LOGGER.info("Serial mock on %s", self.slave_path)
+        return self.slave_path
+
+    def stop(self):
+        self._running = False
+        os.close(self._master)
+        os.close(self._slave)
+
+
+async def main(args):
+    # one simulated projector per address, e.g. 127.0.0.1,127.0.0.2 on Linux loopback
+    states = []
+    for host in args.host.split(","):
+        state = MockProjectorState(
+            warmup_time=args.warmup,
+            cooldown_time=args.cooldown,
+            latency=args.latency,
+            power=POWER_ON if args.on else POWER_OFF,
+        )
+        await start_http(state, host, args.http_port, username=args.username, password=args.password)
+        await start_tcp(state, host, args.tcp_port, args.serial_number_port)
+        states.append(state)
+        print(f"mock projector running, http {host}:{args.http_port}, tcp {host}:{args.tcp_port}")
+    if args.serial:
+        print("serial device:", SerialMock(states[0]).start())
+    while True:
+        await asyncio.sleep(3600)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock Epson projector")
+    parser.add_argument("--host", default="127.0.0.1", help="comma separated, one projector each")
+    parser.add_argument("--http-port", type=int, default=8080)
+    parser.add_argument("--tcp-port", type=int, default=3629)
+    parser.add_argument("--serial-number-port", type=int, default=None)
+    parser.add_argument("--serial", action="store_true", help="also start a pty serial device")
+    parser.add_argument("--username", default="EPSONWEB")
+    parser.add_argument("--password", default="admin")
+    parser.add_argument("--latency", type=float, default=0.04)
+    parser.add_argument("--warmup", type=float, default=20.0)
+    parser.add_argument("--cooldown", type=float, default=10.0)
+    parser.add_argument("--on", action="store_true", help="start powered on")
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.get_event_loop().run_until_complete(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -4,6 +4,7 @@ from epson_projector.const import POWER, PWR_ON, PWR_OFF
 import asyncio
 import aiohttp
 import logging
+import os
 import time
 
 _LOGGER = logging.getLogger(__name__)
@@ -27,7 +28,9 @@ init = "02"
 off = "04"
 error = "ERR"
 
-host = "192.168.128.18"
+# point at mock_projector.py with EPSON_HOST=127.0.0.1 EPSON_PORT=8080
+host = os.environ.get("EPSON_HOST", "192.168.128.18")
+port = int(os.environ.get("EPSON_PORT", 80))
 
 #"PWR ON": [("KEY", "3B")],
 
@@ -36,7 +39,8 @@ async def run(websession):
     projector = epson.Projector(
         host=host,
         websession=websession,
-        type="http"
+        type="http",
+        port=port
     )
     
     power_state = await projector.get_property(POWER)
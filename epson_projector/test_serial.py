@@ -2,6 +2,7 @@ import asyncio
 import epson_projector as epson
 from epson_projector.const import (POWER, PWR_ON, PWR_OFF)
 import logging
+import os
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -19,7 +20,7 @@ async def main_serial():
 
 
 async def run():
-    projector = epson.Projector(host='/dev/ttyUSB0',
+    projector = epson.Projector(host=os.environ.get('EPSON_SERIAL', '/dev/ttyUSB0'),
                                 type='serial',
                                 timeout_scale=2.0)
     data = await projector.get_power()
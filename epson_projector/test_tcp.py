@@ -1,5 +1,6 @@
 import asyncio
 import epson_projector as epson
+import os
 from epson_projector.const import (POWER, PWR_OFF, VOLUME)
 
 
@@ -9,8 +10,9 @@ async def main_tcp():
 
 
 async def run():
-    projector = epson.Projector(host='192.168.11.37',
-                                type='tcp')
+    projector = epson.Projector(host=os.environ.get('EPSON_HOST', '192.168.11.37'),
+                                type='tcp',
+                                port=int(os.environ.get('EPSON_PORT', 3629)))
     data = await projector.get_power()
     print(data)
     # data2 = await projector.get_property(VOLUME)
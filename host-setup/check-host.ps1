@@ -97,6 +97,10 @@ ShowStatus "Is Auto-Login enabled?" $autoLoginStatus
 $nircmdInstalled = (Test-Path "C:\NirCmd\nircmd.exe" -PathType Leaf)
 ShowStatus "Is NirCmd installed?" $nircmdInstalled
 
+# Check if the host agent logon task is registered
+$agentInstalled = $null -ne (Get-ScheduledTask -TaskName "InnovationHubHostAgent" -ErrorAction SilentlyContinue)
+ShowStatus "Is the host agent installed?" $agentInstalled
+
 <# # Check if the screen turns off time is set to "Never" when plugged in
 $monitorTimeoutSettings = powercfg -q SCHEME_CURRENT | Select-String "Monitor (Plugged In)"
 $screenNeverTurnsOff = $monitorTimeoutSettings -match "Never"
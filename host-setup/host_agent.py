@@ -0,0 +1,304 @@
+# Innovation Hub API - host agent
+#
+# Runs in the logged on user's desktop session (install-host.ps1 registers it as a
+# scheduled task at logon) and keeps one authenticated connection open to the API.
+# The API has to prove it knows the token too, and every message after the handshake
+# is signed, so nobody else on the network can send this agent commands.
+# The API sends typed commands over it - launch, kill, nircmd, volume, media - which
+# run here straight away, instead of starting psexec over ssh for every action.
+#
+# Protocol: see container2/api/host_agents.py.  Standard library only (the hosts run
+# Python 3.7), and it runs on Linux too, where nircmd is replaced by amixer/playerctl,
+# so the API side can be tested against it without a Windows machine:
+#
+#   AGENT_TOKEN=secret python host_agent.py --server 127.0.0.1 --port 7070 --host 127.0.0.1
+#
+# The token is read from AGENT_TOKEN or from --token-file, never from the command
+# line, where any user on the host could read it from the process list.
+
+import argparse
+import getpass
+import hashlib
+import hmac
+import json
+import os
+import platform
+import shlex
+import signal
+import socket
+import subprocess
+import threading
+import time
+
+AGENT_VERSION = 2
+
+PROTOCOL_VERSION = 2
+
+WINDOWS = platform.system() == 'Windows'
+
+NIRCMD = r'C:\NirCmd\nircmd.exe'
+
+# windows virtual key codes sent with nircmd sendkeypress, playerctl/amixer on linux
+MEDIA_KEYS = {
+    'play_pause': ('0xB3', ['playerctl', 'play-pause']),
+    'next': ('0xB0', ['playerctl', 'next']),
+    'previous': ('0xB1', ['playerctl', 'previous']),
+    'stop': ('0xB2', ['playerctl', 'stop']),
+    'mute': ('0xAD', ['amixer', '-q', 'sset', 'Master', 'toggle']),
+    'volume_down': ('0xAE', ['amixer', '-q', 'sset', 'Master', '5%-']),
+    'volume_up': ('0xAF', ['amixer', '-q', 'sset', 'Master', '5%+']),
+}
+
+
+def run(args, timeout=10):
+    # run a short command, raising with its output if it fails
+    completed = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=timeout)
+    output = completed.stdout.decode(errors='replace').strip()
+    if completed.returncode != 0:
+        raise RuntimeError(output or f'command exited with {completed.returncode}')
+    return output
+
+
+def command_line(program, arguments):
+    # arguments as a list, or as a string written the way it would be typed on the host;
+    # windows programs parse their own command line, so a string is passed on untouched
+    if arguments is None or arguments == '':
+        return [program]
+    if isinstance(arguments, list):
+        return [program] + [str(argument) for argument in arguments]
+    if WINDOWS:
+        return f'"{program}" {arguments}'
+    return [program] + shlex.split(arguments)
+
+
+# =========================================================================
+#  Commands - each takes the request args and returns a json-able result
+# =========================================================================
+
+def command_ping(args):
+    return {'time': time.time()}
+
+
+def command_launch(args):
+    # start a program in this session, e.g. {"path": "chrome.exe", "args": ["--kiosk", url]}
+    if not args.get('path'):
+        raise ValueError('path is required')
+
+    kwargs = {'cwd': args.get('cwd') or None,
+              'stdin': subprocess.DEVNULL, 'stdout': subprocess.DEVNULL, 'stderr': subprocess.DEVNULL}
+    if WINDOWS:
+        # keep the program running when the agent restarts
+        kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.DETACHED_PROCESS
+    else:
+        kwargs['start_new_session'] = True
+
+    process = subprocess.Popen(command_line(args['path'], args.get('args')), **kwargs)
+    return {'pid': process.pid}
+
+
+def command_kill(args):
+    # {"pid": 1234} or {"image": "chrome.exe"}
+    if args.get('pid'):
+        pid = int(args['pid'])
+        if WINDOWS:
+            run(['taskkill', '/PID', str(pid), '/T', '/F'])
+        else:
+            os.kill(pid, signal.SIGTERM)
+        return {'killed': pid}
+    elif args.get('image'):
+        if WINDOWS:
+            run(['taskkill', '/IM', args['image'], '/F'])
+        else:
+            run(['pkill', '-x', args['image']])
+        return {'killed': args['image']}
+    raise ValueError('pid or image is required')
+
+
+def command_nircmd(args):
+    # {"args": "monitor off"}
+    if not WINDOWS:
+        raise RuntimeError('nircmd is only available on windows hosts')
+    return {'output': run(command_line(args.get('nircmd') or NIRCMD, args.get('args')))}
+
+
+def command_volume(args):
+    # {"level": 0-100} and/or {"mute": true|false}
+    if 'level' not in args and 'mute' not in args:
+        raise ValueError('level or mute is required')
+
+    if 'level' in args:
+        level = max(0, min(100, int(args['level'])))
+        if WINDOWS:
+            run([NIRCMD, 'setsysvolume', str(round(level * 655.35))])
+        else:
+            run(['amixer', '-q', 'sset', 'Master', f'{level}%'])
+    if 'mute' in args:
+        mute = str(args['mute']).lower() in ('1', 'true', 'on', 'yes')
+        if WINDOWS:
+            run([NIRCMD, 'mutesysvolume', '1' if mute else '0'])
+        else:
+            run(['amixer', '-q', 'sset', 'Master', 'mute' if mute else 'unmute'])
+    return {key: args[key] for key in ('level', 'mute') if key in args}
+
+
+def command_media(args):
+    # {"action": "play_pause" | "next" | "previous" | "stop" | "mute" | "volume_up" | "volume_down"}
+    action = args.get('action')
+    if action not in MEDIA_KEYS:
+        raise ValueError(f'action must be one of {", ".join(MEDIA_KEYS)}')
+
+    key, linux_command = MEDIA_KEYS[action]
+    if WINDOWS:
+        run([NIRCMD, 'sendkeypress', key])
+    else:
+        run(linux_command)
+    return {'action': action}
+
+
+COMMANDS = {
+    'ping': command_ping,
+    'launch': command_launch,
+    'kill': command_kill,
+    'nircmd': command_nircmd,
+    'volume': command_volume,
+    'media': command_media,
+}
+
+
+# =========================================================================
+#  Connection
+# =========================================================================
+
+def sign(key, *parts):
+    # hmac_sha256 over the json encoded parts, as in container2/api/host_agents.py
+    return hmac.new(key.encode(), json.dumps(parts).encode(), hashlib.sha256).hexdigest()
+
+
+def matches(mac, expected):
+    return hmac.compare_digest(str(mac).encode(), expected.encode())
+
+
+class MessageAuth:
+    # signs and checks the messages of one connection after the handshake
+    def __init__(self, key, local, remote):
+        self.key = key
+        self.local = local
+        self.remote = remote
+
+        self._sent = 0
+        self._received = 0
+
+    def seal(self, message):
+        # callers serialise seal() and the write, so seq goes out in order
+        self._sent += 1
+        payload = json.dumps(dict(message, seq=self._sent))
+        return f'{sign(self.key, self.local, payload)} {payload}\n'.encode()
+
+    def open(self, line):
+        mac, _, payload = line.decode(errors='replace').strip().partition(' ')
+        if not matches(mac, sign(self.key, self.remote, payload)):
+            raise ValueError('bad message signature')
+        message = json.loads(payload)
+        if message.get('seq') != self._received + 1:
+            raise ValueError('message out of sequence')
+        self._received += 1
+        return message
+
+
+class HostAgent:
+    def __init__(self, server, port, token, host, reconnect_delay=5):
+        self.server = server
+        self.port = port
+        self.token = token
+        self.host = host
+        self.reconnect_delay = reconnect_delay
+
+        self._write_lock = threading.Lock()
+
+    def send(self, sock, auth, message):
+        with self._write_lock:
+            sock.sendall(auth.seal(message))
+
+    def handle(self, sock, auth, request):
+        # run one command on its own thread so a slow one never holds up the rest
+        command = COMMANDS.get(request.get('command'))
+        try:
+            if command is None:
+                raise ValueError(f"unknown command {request.get('command')}")
+            response = {'ok': True, 'result': command(request.get('args') or {})}
+        except Exception as e:
+            response = {'ok': False, 'error': str(e) or type(e).__name__}
+        response.update(type='response', id=request.get('id'))
+        try:
+            self.send(sock, auth, response)
+        except OSError:
+            pass
+
+    def session(self):
+        # one connection: authenticate, then answer requests until it drops
+        sock = socket.create_connection((self.server, self.port), timeout=10)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        reader = sock.makefile('rb')
+        try:
+            challenge = json.loads(reader.readline())
+            if challenge.get('version') != PROTOCOL_VERSION:
+                raise RuntimeError(f"server speaks protocol {challenge.get('version')}, agent {PROTOCOL_VERSION}")
+            server_nonce, nonce = challenge['nonce'], os.urandom(16).hex()
+
+            hello = {'type': 'hello', 'host': self.host, 'user': getpass.getuser(), 'platform': platform.system(),
+                     'agent_version': AGENT_VERSION, 'nonce': nonce,
+                     'mac': sign(self.token, 'hello', server_nonce, nonce, self.host)}
+            sock.sendall((json.dumps(hello) + '\n').encode())
+
+            answer = json.loads(reader.readline())
+            if answer.get('type') != 'welcome':
+                raise RuntimeError(answer.get('error') or 'not accepted')
+            if not matches(answer.get('mac', ''), sign(self.token, 'welcome', server_nonce, nonce, self.host)):
+                raise RuntimeError('server did not prove it knows the token')
+            auth = MessageAuth(sign(self.token, 'session', server_nonce, nonce, self.host), 'agent', 'server')
+            print(f'connected to {self.server}:{self.port} as {self.host}', flush=True)
+
+            # requests only arrive when the api has work, the server pings to keep it alive;
+            # a message that fails its signature or sequence check ends the session
+            sock.settimeout(None)
+            for line in iter(reader.readline, b''):
+                request = auth.open(line)
+                if request.get('type') == 'request':
+                    threading.Thread(target=self.handle, args=(sock, auth, request), daemon=True).start()
+        finally:
+            sock.close()
+
+    def run_forever(self):
+        while True:
+            try:
+                self.session()
+                print('connection closed', flush=True)
+            except Exception as e:
+                print(f'connection to {self.server}:{self.port} failed: {e}', flush=True)
+            time.sleep(self.reconnect_delay)
+
+
+def local_address(server, port):
+    # the address this host uses to reach the api, matching its hosts table entry
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.connect((server, port))
+        return sock.getsockname()[0]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Innovation Hub API host agent')
+    parser.add_argument('--server', required=True, help='API server address')
+    parser.add_argument('--port', type=int, default=7070, help='API agent port')
+    parser.add_argument('--token-file', help='file holding the shared AGENT_TOKEN (or set AGENT_TOKEN)')
+    parser.add_argument('--host', help='host address as registered in the API (default: local address towards the server)')
+    args = parser.parse_args()
+
+    token = os.environ.get('AGENT_TOKEN')
+    if args.token_file:
+        with open(args.token_file) as file:
+            token = file.read().strip()
+    if not token:
+        parser.error('--token-file or AGENT_TOKEN is required')
+
+    agent = HostAgent(args.server, args.port, token, args.host or local_address(args.server, args.port))
+    agent.run_forever()
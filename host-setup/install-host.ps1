@@ -611,6 +611,43 @@ if ($response -eq 'YES' -or $response -eq 'yes') {
 
     $stepsStatus += [PSCustomObject]@{Step = "Moved browser-youtube.py to destinationDirectory"; Success = $step12Success}
 
+    # Step 13: Install the host agent, started in the user's session at logon
+    # (leave the API token empty to skip, desktop actions then keep using ssh/psexec)
+    $agentServer = Read-Host "API server address for the host agent (e.g. 192.168.3.10)"
+    $agentToken = Read-Host "Host agent token (AGENT_TOKEN of the API, leave empty to skip)"
+    if ($agentToken) {
+        $step13Success = $true
+        try {
+	    $FullUsername = [System.Security.Principal.WindowsIdentity]::GetCurrent().Name
+	    $Username = ($FullUsername -split '\\')[1]
+
+	    # Copy the agent next to browser-youtube.py
+	    $agentPath = "C:\Users\$Username\Documents\host_agent.py"
+	    Copy-Item -Path (Join-Path ($originalWorkingDirectory) "host_agent.py") -Destination $agentPath
+
+	    # the token goes in a file only this user, SYSTEM and administrators can read, not on the
+	    # task's command line where any user on the host could see it in the process list
+	    $tokenDirectory = "C:\Users\$Username\AppData\Local\InnovationHub"
+	    $tokenPath = Join-Path $tokenDirectory "host_agent.token"
+	    New-Item -ItemType Directory -Path $tokenDirectory -Force | Out-Null
+	    Set-Content -Path $tokenPath -Value $agentToken -NoNewline
+	    icacls $tokenPath /inheritance:r /grant:r "$($FullUsername):(R)" "*S-1-5-18:(F)" "*S-1-5-32-544:(F)" | Out-Null
+	    if ($LASTEXITCODE -ne 0) { throw "Could not restrict access to $tokenPath" }
+
+	    # pythonw runs it without a console window, the task restarts it if it stops
+	    $pythonwPath = "C:\Users\$Username\AppData\Local\Programs\Python\Python37\pythonw.exe"
+	    $action = New-ScheduledTaskAction -Execute $pythonwPath -Argument "`"$agentPath`" --server $agentServer --token-file `"$tokenPath`""
+	    $trigger = New-ScheduledTaskTrigger -AtLogOn -User $FullUsername
+	    $settings = New-ScheduledTaskSettingsSet -RestartCount 999 -RestartInterval (New-TimeSpan -Minutes 1) -ExecutionTimeLimit (New-TimeSpan -Seconds 0)
+	    $principal = New-ScheduledTaskPrincipal -UserId $FullUsername -LogonType Interactive
+	    Register-ScheduledTask -TaskName "InnovationHubHostAgent" -Action $action -Trigger $trigger -Settings $settings -Principal $principal -Force | Out-Null
+        } catch {
+	    $step13Success = $false
+        }
+        ConfirmStepSuccess "Install host agent" $step13Success
+        $stepsStatus += [PSCustomObject]@{Step = "Install host agent"; Success = $step13Success}
+    }
+
     # Display status of each step
     Write-Host
     Write-Host "RESULT"
@@ -217,6 +217,23 @@ if ($response -eq 'YES' -or $response -eq 'yes') {
 	#ConfirmStepSuccess "Enable UAC" $step6Success
 	# Add the status to the undoStepsStatus list for the "Remove Registry" step
 	$undoStepsStatus += [PSCustomObject]@{Step = "Enable UAC"; Success = $step6Success}
+
+	# Step 7: Remove the host agent logon task, if it was installed
+	$step7Success = $true
+	try {
+		if (Get-ScheduledTask -TaskName "InnovationHubHostAgent" -ErrorAction SilentlyContinue) {
+			Stop-ScheduledTask -TaskName "InnovationHubHostAgent"
+			Unregister-ScheduledTask -TaskName "InnovationHubHostAgent" -Confirm:$false
+		}
+		# and the token file the task read
+		$tokenDirectory = Join-Path $env:LOCALAPPDATA "InnovationHub"
+		if (Test-Path $tokenDirectory) {
+			Remove-Item -Path $tokenDirectory -Recurse -Force
+		}
+	} catch {
+		$step7Success = $false
+	}
+	$undoStepsStatus += [PSCustomObject]@{Step = "Remove host agent"; Success = $step7Success}
 	
 	# Display status of each undo step
         Write-Host